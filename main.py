@@ -11,6 +11,9 @@ OBJETIVO GENERAL:
 ETAPAS DEL PROCESO:
     ETAPA 0 (Configuración): Carga de configuración desde src/config.py
     ETAPA 1 (Scraping): Búsqueda de oportunidades en portales web
+    ETAPA 1.2 (Sin cambios): Descarte de oportunidades ya guardadas con el
+              mismo contenido (src/dedupe_store.py)
+    ETAPA 1.5 (Filtro local): Score de relevancia sin API (src/relevance.py)
     ETAPA 2 (Análisis): Evaluación con IA (Gemini) de cada oportunidad
     ETAPA 3 (Almacenamiento): Guardado de resultados en CSV/Google Sheets
 
@@ -22,9 +25,11 @@ COMPONENTES PRINCIPALES:
 FLUJO DE EJECUCIÓN:
     1. Inicialización de componentes
     2. Scraping de portales activos (Group 1)
-    3. Análisis con IA de cada oportunidad detectada
-    4. Almacenamiento de resultados en results_stage1.csv
-    5. Registro de ejecución en historial_ejecuciones.txt
+    2.5 Descarte de oportunidades sin cambios desde la última ejecución
+    3. Score local de relevancia: solo las relevantes van a Gemini
+    4. Análisis con IA de cada oportunidad relevante
+    5. Almacenamiento de resultados en results_stage1.csv
+    6. Registro de ejecución en historial_ejecuciones.txt
 
 ARCHIVOS DE SALIDA:
     - results_stage1.csv: Resultados del análisis
@@ -40,6 +45,7 @@ import logging.config
 from src.scraper import Scraper
 from src.analyzer import Analyzer
 from src.sheets_manager import SheetsManager
+from src.relevance import filter_opportunities
 
 # ============================================================================
 # CONFIGURACIÓN DEL SISTEMA DE LOGGING
@@ -59,6 +65,7 @@ from logging.handlers import RotatingFileHandler
 
 # Importar configuración de logging desde config.py
 from src.config import LOG_LEVEL, LOG_ROTATION_SIZE_MB, LOG_BACKUP_COUNT
+from src.config import RELEVANCE_GATE_ENABLED, RELEVANCE_MIN_LOCAL_SCORE
 
 # Crear directorio logs/ si no existe
 os.makedirs('logs', exist_ok=True)
@@ -138,8 +145,11 @@ def main():
     
     MANEJO DE ERRORES:
         - Try/Except captura cualquier error crítico
-        - Finally asegura que el programa espere antes de cerrar
+        - Finally cierra Analyzer y SheetsManager (métricas y último lote
+          de Google Sheets, también si hubo un error) y espera antes de cerrar
     """
+    analyzer = None
+    sheets = None
     try:
         logger.info("="*50)
         logger.info("INICIO DE EJECUCION MIA V4.0 Stage 1")
@@ -166,6 +176,35 @@ def main():
         raw_ops = scraper.search_all()
         logger.info(f"Se encontraron {len(raw_ops)} oportunidades potenciales.")
         
+        # ------------------------------------------------------------------------
+        # PASO 1.2: OPORTUNIDADES SIN CAMBIOS
+        # ------------------------------------------------------------------------
+        # OBJETIVO: No volver a analizar lo ya guardado. Una oportunidad es
+        #           portal + N° de licitación (o URL) y se descarta solo si
+        #           su contenido no cambió: la página de un portal con otras
+        #           publicaciones o una licitación con otro estado pasan
+        # ------------------------------------------------------------------------
+        raw_ops, unchanged = sheets.filter_unchanged(raw_ops)
+        if unchanged:
+            logger.info(f"Sin cambios: {len(unchanged)} oportunidades ya guardadas, "
+                        f"{len(raw_ops)} nuevas o con cambios")
+        
+        # ------------------------------------------------------------------------
+        # PASO 1.5: FILTRO LOCAL DE RELEVANCIA
+        # ------------------------------------------------------------------------
+        # OBJETIVO: Puntuar cada oportunidad (0-100) con las keywords de los
+        #           rubros, sin API. Las que no superan RELEVANCE_MIN_LOCAL_SCORE
+        #           no se envían a Gemini (un trigger genérico como
+        #           "provisión de" no alcanza si nada habla de agua/efluentes)
+        # ------------------------------------------------------------------------
+        threshold = RELEVANCE_MIN_LOCAL_SCORE if RELEVANCE_GATE_ENABLED else 0
+        raw_ops, discarded = filter_opportunities(raw_ops, threshold=threshold)
+        for op in discarded:
+            logger.info(f"Descartada por score local {op['local_score']}: {op['url']}")
+        if discarded:
+            logger.info(f"Filtro local: {len(discarded)} oportunidades descartadas, "
+                        f"{len(raw_ops)} se envían a Gemini")
+        
         # ------------------------------------------------------------------------
         # PASO 2: ANÁLISIS CON INTELIGENCIA ARTIFICIAL
         # ------------------------------------------------------------------------
@@ -175,42 +214,81 @@ def main():
         #           - Generar resumen técnico en español
         # ENTRADA: Texto completo de cada oportunidad + keywords detectadas
         # SALIDA: Análisis estructurado en formato JSON
+        # CONCURRENCIA: GEMINI_MAX_CONCURRENCY requests en vuelo; los
+        #               resultados llegan en el orden de raw_ops
         # ------------------------------------------------------------------------
         logger.info("\n>>> PASO 2: Análisis con Gemini")
         if not raw_ops:
             logger.info("No hay oportunidades para analizar.")
+        else:
+            logger.info(f"Análisis concurrente: hasta {analyzer.max_concurrency} requests en paralelo")
         
-        for op in raw_ops:
-            logger.info(f"Analizando oportunidad: {op['url']}")
-            analysis = analyzer.analyze_opportunity(
-                op['full_text'],
-                matched_keywords=op.get('matched_keywords', [])
-            )
-            
-            if analysis:
-                # --------------------------------------------------------------------
-                # COMBINACIÓN DE DATOS: Scraping + Análisis IA
-                # --------------------------------------------------------------------
-                # Fusiona la información del scraping (portal, URL, keywords)
-                # con el análisis de Gemini (rubro, score, resumen)
-                # --------------------------------------------------------------------
-                row_data = {
-                    "Portal": op['portal'],                                              # Origen de la oportunidad
-                    "MIA_URL": op['url'],                                                # Link directo
-                    "MIA_Keywords_Detectadas": ", ".join(op.get('matched_keywords', [])), # Triggers encontrados
-                    "MIA_Rubro": analysis.get("MIA_Rubro"),                             # Clasificación IA
-                    "MIA_Score_IA": analysis.get("MIA_Score_IA"),                       # Relevancia 0-100
-                    "MIA_Resumen_Tecnico": analysis.get("MIA_Resumen_Tecnico")          # Resumen en español
-                }
+        # Las filas se escriben por lotes (un solo open del CSV); al salir
+        # del bloque se escribe lo pendiente, también si hay un error
+        with sheets.buffered_writer():
+            for op, analysis in analyzer.analyze_many(raw_ops):
+                if analysis:
+                    # --------------------------------------------------------------------
+                    # COMBINACIÓN DE DATOS: Scraping + Análisis IA
+                    # --------------------------------------------------------------------
+                    # Fusiona la información del scraping (portal, URL, keywords)
+                    # con el análisis de Gemini (rubro, score, resumen)
+                    # --------------------------------------------------------------------
+                    row_data = {
+                        "Portal": op['portal'],                                              # Origen de la oportunidad
+                        "MIA_URL": op['url'],                                                # Link directo
+                        "MIA_Keywords_Detectadas": ", ".join(op.get('matched_keywords', [])), # Triggers encontrados
+                        "MIA_Rubro": analysis.get("MIA_Rubro"),                             # Clasificación IA
+                        "MIA_Score_IA": analysis.get("MIA_Score_IA"),                       # Relevancia 0-100
+                        "MIA_Score_Local": op.get("local_score"),                           # Score local 0-100
+                        "MIA_Tier": analysis.get("MIA_Tier"),                               # triage / completo
+                        "MIA_Modelo": analysis.get("MIA_Modelo"),                           # Modelo de Gemini
+                        "MIA_Resumen_Tecnico": analysis.get("MIA_Resumen_Tecnico"),         # Resumen en español
+                        "MIA_Link_al_Pliego": analysis.get("MIA_Link_al_Pliego"),           # Solo historial SQLite
+                        "MIA_Empresa_Asignada": analysis.get("MIA_Empresa_Asignada"),       # Solo historial SQLite
+                        "MIA_Preguntas_Tecnicas": analysis.get("MIA_Preguntas_Tecnicas"),   # Solo historial SQLite
+                        "MIA_ID_Licitacion": op.get("numero_licitacion"),                   # N° de licitación
+                        "MIA_Hash_Contenido": op.get("content_hash")                        # Hash del texto (duplicados)
+                    }
                 
-                logger.info(f"Oportunidad Analizada: {row_data['MIA_Rubro']} - Score: {row_data['MIA_Score_IA']}")
+                    logger.info(f"Oportunidad Analizada: {row_data['MIA_Rubro']} - Score: {row_data['MIA_Score_IA']} "
+                                f"(local: {row_data['MIA_Score_Local']}, {row_data['MIA_Tier']})")
+                    if analysis.get("_near_duplicate"):
+                        logger.info(
+                            f"   Casi-duplicado de un análisis previo "
+                            f"({analysis['_near_duplicate']['distance']} bits de diferencia)"
+                        )
                 
-                # --------------------------------------------------------------------
-                # PASO 3: ALMACENAMIENTO DE RESULTADOS
-                # --------------------------------------------------------------------
-                # Guarda cada oportunidad analizada en results_stage1.csv
-                # --------------------------------------------------------------------
-                sheets.add_row(row_data)
+                    # --------------------------------------------------------------------
+                    # PASO 3: ALMACENAMIENTO DE RESULTADOS
+                    # --------------------------------------------------------------------
+                    # Guarda cada oportunidad analizada en results_stage1.csv
+                    # (en buffer; se escribe por lotes)
+                    # --------------------------------------------------------------------
+                    sheets.add_row(row_data)
+                else:
+                    # ----------------------------------------------------------------
+                    # ANÁLISIS FALLIDO: descartar validadores HTTP de la página
+                    # ----------------------------------------------------------------
+                    # Así la próxima ejecución no recibe un 304 y la vuelve a analizar
+                    # ----------------------------------------------------------------
+                    scraper.http.invalidate(op['url'])
+        
+        # ------------------------------------------------------------------------
+        # VALIDADORES HTTP (ETag / Last-Modified) DE LAS PÁGINAS DESCARGADAS
+        # ------------------------------------------------------------------------
+        # Se guardan recién con los resultados escritos: si la ejecución se
+        # corta antes (error, cierre del proceso) no se guardan, y la próxima
+        # no recibe un 304 que omita oportunidades nunca escritas. Con filas
+        # sin escribir se descartan todos (lo ya guardado lo omite el índice
+        # de duplicados antes de Gemini)
+        # ------------------------------------------------------------------------
+        if sheets.failed_rows:
+            discarded_pages = scraper.http.discard_validators()
+            logger.warning(f"{sheets.failed_rows} filas sin escribir: validadores HTTP de "
+                           f"{discarded_pages} páginas descartados")
+        else:
+            scraper.http.commit_validators()
         
         logger.info("\n>>> PROCESO COMPLETADO EXITOSAMENTE. Verifique results_stage1.csv")
 
@@ -221,6 +299,16 @@ def main():
         # Captura cualquier error no previsto y lo registra con stack trace completo
         logger.exception("OCURRIO UN ERROR CRITICO DURANTE LA EJECUCION:")
     finally:
+        # Métricas de Gemini: flush final + resumen logs/gemini_metrics.json
+        # Google Sheets: último lote pendiente (lo no enviado queda en el spool)
+        for component in (analyzer, sheets):
+            if component is None:
+                continue
+            try:
+                component.close()
+            except Exception:
+                logger.exception(f"Error cerrando {type(component).__name__}:")
+        
         # Asegura que el programa no se cierre automáticamente para permitir
         # al usuario revisar los mensajes en consola
         logger.info("="*50)
@@ -0,0 +1,249 @@
+"""
+================================================================================
+MIA V4.0 - CACHÉ PERSISTENTE DE ANÁLISIS (analysis_cache.py)
+================================================================================
+
+OBJETIVO GENERAL:
+    Guardar los análisis de Gemini en disco para reutilizarlos ENTRE
+    ejecuciones. main.py corre una vez y termina, por lo que una caché en
+    memoria nunca da hits de un día para el otro.
+
+CARACTERÍSTICAS:
+    - SQLite en modo WAL: varios procesos y threads pueden leer y escribir
+      la misma caché (busy_timeout para esperar locks en vez de fallar)
+    - Una conexión por thread
+    - TTL: entradas más viejas que GEMINI_CACHE_TTL_HOURS se ignoran y borran
+    - Desalojo LRU por tamaño: si la caché supera GEMINI_CACHE_MAX_MB se
+      borran las entradas usadas hace más tiempo
+    - Compresión zlib opcional de las respuestas
+
+USO:
+    cache = AnalysisCache()
+    cache.set(key, {"MIA_Rubro": ...}, tokens=1200)
+    cache.get(key)   # dict o None
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Caché Persistente
+================================================================================
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+# Respuestas más chicas que esto no se comprimen (no vale la pena)
+_MIN_COMPRESS_BYTES = 256
+
+# Cada cuántas escrituras se verifica el tamaño total para desalojar
+_EVICT_EVERY = 25
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    compressed INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL,
+    tokens INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_last_access ON analyses(last_access);
+CREATE INDEX IF NOT EXISTS idx_analyses_created_at ON analyses(created_at);
+"""
+
+
+class AnalysisCache:
+    """
+    Caché clave -> análisis (dict) persistida en SQLite.
+
+    Compatible con el uso anterior del dict en memoria para len(cache)
+    y `key in cache`.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, ttl_hours: Optional[float] = None,
+                 max_mb: Optional[float] = None, compress: Optional[bool] = None):
+        """
+        PARÁMETROS (default: config.py):
+            db_path (str): Archivo SQLite (GEMINI_CACHE_FILE)
+            ttl_hours (float): Vida de una entrada (GEMINI_CACHE_TTL_HOURS)
+            max_mb (float): Tamaño máximo de las respuestas guardadas
+                            (GEMINI_CACHE_MAX_MB, 0 = sin límite)
+            compress (bool): Comprimir respuestas con zlib (GEMINI_CACHE_COMPRESS)
+        """
+        from src.config import (
+            GEMINI_CACHE_FILE, GEMINI_CACHE_TTL_HOURS, GEMINI_CACHE_MAX_MB, GEMINI_CACHE_COMPRESS
+        )
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path or GEMINI_CACHE_FILE
+        self.ttl_seconds = (ttl_hours if ttl_hours is not None else GEMINI_CACHE_TTL_HOURS) * 3600
+        self.max_bytes = int((max_mb if max_mb is not None else GEMINI_CACHE_MAX_MB) * 1024 * 1024)
+        self.compress = GEMINI_CACHE_COMPRESS if compress is None else compress
+
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(self.db_path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+        self.purge_expired()
+
+    # ========================================================================
+    # CONEXIÓN
+    # ========================================================================
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión SQLite del thread actual (se crea en el primer uso)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def close(self) -> None:
+        """Cierra la conexión del thread actual."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ========================================================================
+    # LECTURA Y ESCRITURA
+    # ========================================================================
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Retorna el análisis guardado para la clave, o None si no existe
+        o expiró (las entradas expiradas se borran).
+        """
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value, compressed, created_at FROM analyses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, compressed, created_at = row
+        now = time.time()
+        if self.ttl_seconds and now - created_at > self.ttl_seconds:
+            with conn:
+                conn.execute("DELETE FROM analyses WHERE key = ?", (key,))
+            self.logger.debug(f"Caché expirado para key: {key[:16]}")
+            return None
+
+        try:
+            if compressed:
+                value = zlib.decompress(value)
+            data = json.loads(value.decode('utf-8'))
+        except (zlib.error, ValueError) as e:
+            self.logger.warning(f"Entrada de caché corrupta ({key[:16]}): {e}")
+            with conn:
+                conn.execute("DELETE FROM analyses WHERE key = ?", (key,))
+            return None
+
+        with conn:
+            conn.execute("UPDATE analyses SET last_access = ? WHERE key = ?", (now, key))
+        return data
+
+    def age_seconds(self, key: str) -> Optional[float]:
+        """Antigüedad de una entrada en segundos (None si no existe)."""
+        row = self._connection().execute(
+            "SELECT created_at FROM analyses WHERE key = ?", (key,)
+        ).fetchone()
+        return time.time() - row[0] if row else None
+
+    def set(self, key: str, data: Dict[str, Any], tokens: int = 0) -> None:
+        """Guarda (o reemplaza) el análisis de una clave."""
+        value = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        compressed = 0
+        if self.compress and len(value) >= _MIN_COMPRESS_BYTES:
+            value = zlib.compress(value, 6)
+            compressed = 1
+
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO analyses (key, value, compressed, size, tokens, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), compressed, len(value), int(tokens or 0), now, now)
+            )
+
+        with self._writes_lock:
+            self._writes += 1
+            check = self._writes % _EVICT_EVERY == 1
+        if check:
+            self.evict()
+
+    def delete(self, key: str) -> None:
+        """Borra una entrada."""
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM analyses WHERE key = ?", (key,))
+
+    # ========================================================================
+    # MANTENIMIENTO
+    # ========================================================================
+    def purge_expired(self) -> int:
+        """Borra las entradas expiradas. Retorna cuántas se borraron."""
+        if not self.ttl_seconds:
+            return 0
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                "DELETE FROM analyses WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+        if cursor.rowcount:
+            self.logger.debug(f"Caché: {cursor.rowcount} entradas expiradas borradas")
+        return cursor.rowcount
+
+    def evict(self) -> int:
+        """
+        Desalojo LRU: si el tamaño total supera max_bytes, borra las entradas
+        con acceso más antiguo hasta quedar en el 90% del límite.
+
+        RETORNO:
+            int: Entradas borradas
+        """
+        if not self.max_bytes:
+            return 0
+        conn = self._connection()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM analyses").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+
+        target = total - int(self.max_bytes * 0.9)
+        freed, keys = 0, []
+        cursor = conn.execute("SELECT key, size FROM analyses ORDER BY last_access")
+        for key, size in cursor:
+            keys.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        cursor.close()
+        with conn:
+            conn.executemany("DELETE FROM analyses WHERE key = ?", keys)
+        self.logger.info(f"Caché de análisis: {len(keys)} entradas desalojadas (LRU, {freed} bytes)")
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """Cantidad de entradas, bytes y tokens guardados."""
+        entries, size, tokens = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(tokens), 0) FROM analyses"
+        ).fetchone()
+        return {"entries": entries, "bytes": size, "tokens": tokens}
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+
+    def __contains__(self, key: str) -> bool:
+        return self._connection().execute(
+            "SELECT 1 FROM analyses WHERE key = ?", (key,)
+        ).fetchone() is not None
@@ -29,10 +29,12 @@ SALIDA (JSON):
     - MIA_Link_al_Pliego: URL del pliego si se encuentra
     - MIA_Empresa_Asignada: Sugerencia de empresa (Water Tech/Eco Tech)
     - MIA_Preguntas_Tecnicas: Preguntas para evaluar la oportunidad
+    - MIA_Tier / MIA_Modelo: Nivel de análisis (triage/completo) y modelo
 
 CONFIGURACIÓN REQUERIDA:
     - .env: GEMINI_API_KEY (clave de API de Google)
-    - config.py: GEMINI_MODEL (modelo a utilizar)
+    - config.py: GEMINI_MODEL (modelo a utilizar); en modo cascada
+      GEMINI_TRIAGE_MODEL y GEMINI_FULL_MODEL
     - config/prompts.json: Plantilla de prompt en español
 
 DEPENDENCIAS:
@@ -48,13 +50,32 @@ import google.generativeai as genai
 import os
 import json
 import logging
-import time
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Versión del esquema de claves de caché. Cambiarla invalida todas las
+# entradas guardadas (ej: si cambia la forma de construir el prompt).
+CACHE_KEY_SCHEMA = "v2"
+
+# Caracteres del texto de la oportunidad que se envían a Gemini
+MAX_PROMPT_TEXT_CHARS = 10000
+
+# Límites superiores de los histogramas por modelo (gemini_metrics.json)
+LATENCY_BUCKETS_MS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+PROMPT_TOKEN_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+
+def _bucket_label(value, bounds):
+    """Etiqueta del bucket de histograma de un valor ('<=500', '>32000')."""
+    for bound in bounds:
+        if value <= bound:
+            return f"<={bound}"
+    return f">{bounds[-1]}"
+
 # ============================================================================
 # CLASE ANALYZER - MOTOR DE ANÁLISIS CON INTELIGENCIA ARTIFICIAL
 # ============================================================================
@@ -79,7 +100,7 @@ class Analyzer:
             2. Carga API key desde config.py (que la lee de .env)
             3. Configura cliente de Gemini API
             4. Carga plantilla de prompt desde config/prompts.json
-            5. Carga configuración de retry attempts
+            5. Carga configuración de retry attempts y cuota RPM/TPM
         
         VALIDACIÓN:
             Si no hay API key, registra warning pero no falla
@@ -89,38 +110,82 @@ class Analyzer:
         from src.config import (
             GEMINI_API_KEY, GEMINI_MODEL, GEMINI_RETRY_ATTEMPTS,
             GEMINI_ENABLE_CACHE, GEMINI_CACHE_TTL_HOURS,
-            GEMINI_COST_PER_1K_TOKENS, GEMINI_METRICS_FILE
+            GEMINI_COST_PER_1K_TOKENS, GEMINI_METRICS_FILE,
+            GEMINI_COST_PER_1K_OUTPUT_TOKENS, GEMINI_COST_PER_1K_CACHED_TOKENS,
+            NEAR_DUP_ENABLED, NEAR_DUP_MODE, NEAR_DUP_MIN_CHARS,
+            GEMINI_MAX_CONCURRENCY,
+            GEMINI_BATCH_ENABLED, GEMINI_BATCH_SIZE, GEMINI_BATCH_MAX_CHARS,
+            CONTEXT_BUILDER_ENABLED, GEMINI_STRUCTURED_OUTPUT,
+            GEMINI_CASCADE_ENABLED, GEMINI_TRIAGE_MODEL, GEMINI_FULL_MODEL, MIN_RELEVANCE_SCORE
         )
         
         self.api_key = GEMINI_API_KEY
+        # Modo cascada: triage barato primero, análisis completo (quizás en
+        # un modelo más capaz) solo para score >= MIN_RELEVANCE_SCORE
+        self.cascade_enabled = GEMINI_CASCADE_ENABLED
+        self.triage_model_name = GEMINI_TRIAGE_MODEL
+        self.min_relevance_score = MIN_RELEVANCE_SCORE
+        self.model_name = GEMINI_FULL_MODEL if self.cascade_enabled else GEMINI_MODEL
         self.retry_attempts = GEMINI_RETRY_ATTEMPTS
         self.enable_cache = GEMINI_ENABLE_CACHE
         self.cache_ttl_hours = GEMINI_CACHE_TTL_HOURS
-        self.cost_per_1k_tokens = GEMINI_COST_PER_1K_TOKENS
+        self.cost_per_1k_tokens = GEMINI_COST_PER_1K_TOKENS          # Tokens de entrada
+        self.cost_per_1k_output_tokens = GEMINI_COST_PER_1K_OUTPUT_TOKENS
+        self.cost_per_1k_cached_tokens = GEMINI_COST_PER_1K_CACHED_TOKENS
         self.metrics_file = GEMINI_METRICS_FILE
         
-        # Inicializar caché en memoria
-        self.cache = {}  # {hash: {"response": data, "timestamp": datetime, "tokens": int}}
-        
-        # Inicializar métricas
-        self.metrics = {
-            "total_requests": 0,
-            "cache_hits": 0,
-            "cache_misses": 0,
-            "total_tokens": 0,
-            "total_cost_usd": 0.0,
-            "requests_by_date": {}
-        }
-        self._load_metrics()
+        # Caché persistente (SQLite): los análisis sobreviven entre ejecuciones
+        from src.analysis_cache import AnalysisCache
+        self.cache = AnalysisCache(ttl_hours=self.cache_ttl_hours)
+        
+        # Índice de casi-duplicados (SimHash): páginas con cambios triviales
+        # reutilizan (o marcan) el análisis previo
+        self.near_dup_mode = NEAR_DUP_MODE
+        self.near_dup_min_chars = NEAR_DUP_MIN_CHARS
+        self.near_dup_index = None
+        if NEAR_DUP_ENABLED and self.enable_cache:
+            from src.near_duplicate import NearDuplicateIndex
+            self.near_dup_index = NearDuplicateIndex(retention_hours=self.cache_ttl_hours)
+        
+        # Análisis concurrente: requests en vuelo + cuota RPM/TPM del modelo,
+        # compartida por todos los workers (gemini_client.py)
+        self.max_concurrency = GEMINI_MAX_CONCURRENCY
+        from src.gemini_client import GeminiClient
+        self.gemini = GeminiClient(max_attempts=self.retry_attempts, burst=self.max_concurrency)
+        
+        # Salida JSON con esquema (structured_output.py)
+        self.structured_output = GEMINI_STRUCTURED_OUTPUT
+        
+        # Contexto: ventanas alrededor de las keywords (context_builder.py)
+        self.context_builder_enabled = CONTEXT_BUILDER_ENABLED
+        
+        # Análisis por lotes de oportunidades cortas
+        self.batch_enabled = GEMINI_BATCH_ENABLED
+        self.batch_size = GEMINI_BATCH_SIZE
+        self.batch_max_chars = GEMINI_BATCH_MAX_CHARS
+        
+        # Métricas: acumulador en memoria con flush periódico a un log SQLite
+        # append-only (metrics_store.py). self.metrics son los totales
+        # (historial + esta ejecución) con el formato de gemini_metrics.json
+        from src.metrics_store import MetricsStore
+        self.metrics_store = MetricsStore(snapshot_path=self.metrics_file)
+        self.metrics = self.metrics_store.totals
         
         if self.api_key:
             # Configurar cliente de Gemini con la API key
             genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel(GEMINI_MODEL)
+            self.model = genai.GenerativeModel(self.model_name)
+            self.triage_model = genai.GenerativeModel(self.triage_model_name) if self.cascade_enabled else None
         else:
             self.logger.warning("GEMINI_API_KEY not found in .env. Analyzer will fail or mock.")
         
-        # Cargar plantilla de prompt desde archivo JSON
+        # Cargar plantillas de prompt desde archivo JSON (define prompt_version
+        # y batch_prompt_template; sin plantilla de lotes no se agrupa)
+        self.prompt_version = "fallback"
+        self.batch_prompt_template = None
+        self.batch_prompt_version = None
+        self.triage_prompt_template = None
+        self.triage_prompt_version = None
         self.prompt_template = self._load_prompt_template()
 
     # ========================================================================
@@ -139,7 +204,9 @@ class Analyzer:
                 "analysis_prompt": {
                     "template": "Texto del prompt con {placeholders}",
                     "variables": {...}
-                }
+                },
+                "batch_analysis_prompt": {...},  # Opcional (ver analyze_batch)
+                "triage_prompt": {...}           # Opcional (modo cascada)
             }
         
         RETORNO:
@@ -153,6 +220,16 @@ class Analyzer:
             prompt_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', 'prompts.json')
             with open(prompt_path, 'r', encoding='utf-8') as f:
                 config = json.load(f)
+                # La versión de la plantilla forma parte de la clave de caché
+                self.prompt_version = str(config['analysis_prompt'].get('version', 'sin-version'))
+                batch = config.get('batch_analysis_prompt')
+                if batch:
+                    self.batch_prompt_template = batch['template']
+                    self.batch_prompt_version = str(batch.get('version', 'sin-version'))
+                triage = config.get('triage_prompt')
+                if triage:
+                    self.triage_prompt_template = triage['template']
+                    self.triage_prompt_version = str(triage.get('version', 'sin-version'))
                 return config['analysis_prompt']['template']
         except Exception as e:
             self.logger.error(f"Error loading prompt template: {e}")
@@ -167,26 +244,68 @@ Texto: {text_content}"""
     # MÉTODOS DE CACHÉ Y MÉTRICAS
     # ========================================================================
     
-    def _generate_cache_key(self, text_content):
+    def _build_prompt(self, text_content, matched_keywords=None, page_text=None):
+        """
+        Construye el prompt EXACTO que se envía a Gemini.
+        
+        PARÁMETROS:
+            text_content (str): Texto completo de la oportunidad
+            matched_keywords (list): Triggers detectados
+            page_text (str): Salida de _prepare_text si ya se calculó
+        
+        RETORNO:
+            String con la plantilla completada. El texto es el contexto de
+            _prepare_text (a lo sumo MAX_PROMPT_TEXT_CHARS caracteres)
+        """
+        keywords_str = ", ".join(matched_keywords) if matched_keywords else "N/A"
+        if page_text is None:
+            page_text = self._prepare_text(text_content, matched_keywords)
+        return self.prompt_template.format(
+            matched_keywords=keywords_str,
+            text_content=page_text
+        )
+
+    def _prepare_text(self, text_content, matched_keywords=None):
+        """
+        Selecciona el texto de la oportunidad que se envía a Gemini.
+        
+        Con CONTEXT_BUILDER_ENABLED, las páginas largas se reducen a
+        ventanas alrededor de los triggers detectados (sin boilerplate);
+        si no, se truncan a los primeros MAX_PROMPT_TEXT_CHARS caracteres.
+        """
+        if not self.context_builder_enabled:
+            return text_content[:MAX_PROMPT_TEXT_CHARS]
+        from src.context_builder import build_context
+        context = build_context(text_content, matched_keywords)
+        if len(context) < len(text_content):
+            self.logger.debug(f"Contexto por keywords: {len(text_content)} -> {len(context)} caracteres")
+        return context[:MAX_PROMPT_TEXT_CHARS]
+
+    def _generate_cache_key(self, prompt, model_name=None, prompt_version=None):
         """
-        Genera una clave de caché única basada en el contenido del texto.
+        Genera la clave de caché de un prompt.
         
         OBJETIVO:
-            Crear un hash único para cada texto analizado, permitiendo
-            detectar textos duplicados y reutilizar análisis previos
+            Reutilizar un análisis solo si Gemini recibiría exactamente la
+            misma consulta: mismo modelo, misma versión de plantilla
+            (config/prompts.json) y mismo prompt final (texto truncado +
+            keywords). Cambiar el modelo o la versión de la plantilla
+            invalida las entradas anteriores.
         
         PARÁMETROS:
-            text_content (str): Texto a analizar
+            prompt (str): Prompt completo (ver _build_prompt)
+            model_name, prompt_version (str): Default: los del análisis
+                                              completo (triage y lotes usan los suyos)
         
         RETORNO:
-            String con hash SHA-256 del texto (primeros 16 caracteres)
-        """
-        # Normalizar texto (minúsculas, sin espacios extra)
-        normalized = text_content.lower().strip()
-        # Generar hash SHA-256
-        hash_object = hashlib.sha256(normalized.encode('utf-8'))
-        # Retornar primeros 16 caracteres del hash
-        return hash_object.hexdigest()[:16]
+            String con hash SHA-256 completo (64 caracteres hex)
+        """
+        hash_object = hashlib.sha256()
+        for part in (CACHE_KEY_SCHEMA, model_name or self.model_name,
+                     prompt_version or self.prompt_version, prompt):
+            hash_object.update(part.encode('utf-8'))
+            hash_object.update(b'\x00')  # Separador: evita colisiones por concatenación
+        return hash_object.hexdigest()
     
     def _check_cache(self, cache_key):
         """
@@ -194,7 +313,8 @@ Texto: {text_content}"""
         
         OBJETIVO:
             Evitar llamadas redundantes a Gemini API reutilizando
-            análisis previos de textos idénticos
+            análisis previos de textos idénticos, también de ejecuciones
+            anteriores (caché persistente, ver analysis_cache.py)
         
         PARÁMETROS:
             cache_key (str): Clave de caché generada por _generate_cache_key
@@ -205,22 +325,15 @@ Texto: {text_content}"""
         if not self.enable_cache:
             return None
         
-        if cache_key not in self.cache:
-            return None
-        
-        cached_item = self.cache[cache_key]
-        
-        # Verificar si el caché ha expirado
-        cache_age = datetime.now() - cached_item["timestamp"]
-        if cache_age > timedelta(hours=self.cache_ttl_hours):
-            # Caché expirado, eliminarlo
-            del self.cache[cache_key]
-            self.logger.debug(f"Caché expirado para key: {cache_key}")
+        # La caché descarta (y borra) las entradas expiradas según el TTL
+        response = self.cache.get(cache_key)
+        if response is None:
             return None
         
         # Caché válido
-        self.logger.info(f"Cache HIT para key: {cache_key} (edad: {cache_age})")
-        return cached_item["response"]
+        cache_age = timedelta(seconds=int(self.cache.age_seconds(cache_key) or 0))
+        self.logger.info(f"Cache HIT para key: {cache_key[:16]} (edad: {cache_age})")
+        return response
     
     def _save_to_cache(self, cache_key, response_data, tokens_used):
         """
@@ -234,44 +347,56 @@ Texto: {text_content}"""
         if not self.enable_cache:
             return
         
-        self.cache[cache_key] = {
-            "response": response_data,
-            "timestamp": datetime.now(),
-            "tokens": tokens_used
-        }
+        self.cache.set(cache_key, response_data, tokens=tokens_used)
         self.logger.debug(f"Guardado en caché: {cache_key}")
     
-    def _load_metrics(self):
+    def _check_near_duplicate(self, fingerprint, cache_key):
         """
-        Carga métricas de uso de API desde archivo JSON.
+        Busca un análisis previo de un documento casi idéntico.
         
-        OBJETIVO:
-            Mantener un registro persistente del uso de Gemini API
-            para tracking de costos y optimización
+        PARÁMETROS:
+            fingerprint (int): SimHash del texto de la página (sin plantilla)
+            cache_key (str): Clave exacta del prompt actual (se excluye)
+        
+        RETORNO:
+            Tupla (análisis, match) si hay un casi-duplicado con análisis
+            vigente en caché, None si no. match = {'cache_key', 'distance', ...}
         """
-        try:
-            if os.path.exists(self.metrics_file):
-                with open(self.metrics_file, 'r', encoding='utf-8') as f:
-                    loaded_metrics = json.load(f)
-                    # Actualizar métricas con datos cargados
-                    self.metrics.update(loaded_metrics)
-                    self.logger.debug(f"Métricas cargadas: {self.metrics['total_requests']} requests")
-        except Exception as e:
-            self.logger.warning(f"No se pudieron cargar métricas: {e}")
+        if self.near_dup_index is None:
+            return None
+        
+        match = self.near_dup_index.find(fingerprint, self._cache_scope(), exclude_key=cache_key)
+        if match is None:
+            return None
+        
+        analysis = self.cache.get(match["cache_key"])
+        if analysis is None:
+            # El análisis original expiró o fue desalojado
+            return None
+        
+        self.logger.info(
+            f"Casi-duplicado detectado ({match['distance']} bits de diferencia) "
+            f"con análisis previo {match['cache_key'][:16]}"
+        )
+        return analysis, match
     
-    def _save_metrics(self):
+    def _cache_scope(self):
+        """Ámbito de reutilización: mismo modelo y misma versión de plantilla."""
+        return f"{self.model_name}|{self.prompt_version}"
+    
+    def flush_metrics(self):
+        """Escribe las métricas en buffer (metrics_store.py)."""
+        self.metrics_store.flush()
+    
+    def close(self):
         """
-        Guarda métricas de uso de API en archivo JSON.
+        Cierra el Analyzer al final de la ejecución.
+        
+        ACCIONES:
+            Flush de métricas, compactación de días anteriores y resumen
+            gemini_metrics.json (también ocurre al salir del intérprete)
         """
-        try:
-            # Crear directorio logs/ si no existe
-            os.makedirs(os.path.dirname(self.metrics_file), exist_ok=True)
-            
-            with open(self.metrics_file, 'w', encoding='utf-8') as f:
-                json.dump(self.metrics, f, indent=2, ensure_ascii=False)
-                self.logger.debug("Métricas guardadas")
-        except Exception as e:
-            self.logger.error(f"Error guardando métricas: {e}")
+        self.metrics_store.close()
     
     def _estimate_tokens(self, text):
         """
@@ -290,53 +415,120 @@ Texto: {text_content}"""
         # Estimación: 1 token ≈ 4 caracteres
         return len(text) // 4
     
-    def _update_metrics(self, tokens_used, from_cache=False):
+    def _new_usage(self, model_name=None):
+        """Acumulador de uso real de una consulta (sumado entre reintentos)."""
+        return {
+            "model": model_name or self.model_name,
+            "calls": 0,             # Respuestas recibidas (cada una se factura)
+            "prompt_tokens": 0,
+            "output_tokens": 0,
+            "cached_tokens": 0,
+            "latency_ms": 0.0,
+            "estimated": False,     # True si faltó usage_metadata
+            "samples": []           # (latencia_ms, prompt_tokens) por respuesta
+        }
+    
+    def _generate(self, prompt, usage, schema=None, model=None):
         """
-        Actualiza métricas de uso de API.
+        Envía un prompt a Gemini y registra el uso real de la respuesta.
+        
+        OBJETIVO:
+            Contabilizar tokens de entrada, salida y cacheados desde
+            response.usage_metadata, y la latencia medida de la llamada.
+            Si la respuesta no trae usage_metadata se estima (~4 caracteres
+            por token) y se marca usage['estimated'].
         
         PARÁMETROS:
-            tokens_used (int): Número de tokens utilizados
-            from_cache (bool): Si la respuesta vino del caché
-        """
-        today = datetime.now().strftime('%Y-%m-%d')
+            prompt (str): Prompt completo
+            usage (dict): Acumulador de _new_usage (se actualiza acá, también
+                          si después falla el parseo: la respuesta se factura)
+            schema (dict): Esquema JSON de la respuesta (structured_output.py);
+                           se envía si GEMINI_STRUCTURED_OUTPUT está activo
+            model: Modelo a usar (default: self.model; el triage pasa el suyo)
         
-        # Actualizar contadores generales
-        self.metrics["total_requests"] += 1
+        RETORNO:
+            str: Texto de la respuesta
+        """
+        kwargs = {}
+        if schema is not None and self.structured_output:
+            from src.structured_output import generation_config
+            kwargs["generation_config"] = generation_config(schema)
+        # Dentro de la cuota RPM/TPM, con reintentos según el tipo de error
+        response, latency_ms = self.gemini.generate(
+            model or self.model, prompt, estimated_tokens=self._estimate_tokens(prompt), **kwargs
+        )
+        text = response.text
         
-        if from_cache:
-            self.metrics["cache_hits"] += 1
+        meta = getattr(response, 'usage_metadata', None)
+        prompt_tokens = getattr(meta, 'prompt_token_count', None)
+        if prompt_tokens is None:
+            usage["estimated"] = True
+            prompt_tokens = self._estimate_tokens(prompt)
+            output_tokens = self._estimate_tokens(text or "")
+            cached_tokens = 0
         else:
-            self.metrics["cache_misses"] += 1
-            self.metrics["total_tokens"] += tokens_used
-            
-            # Calcular costo
-            cost = (tokens_used / 1000) * self.cost_per_1k_tokens
-            self.metrics["total_cost_usd"] += cost
-        
-        # Actualizar métricas por fecha
-        if today not in self.metrics["requests_by_date"]:
-            self.metrics["requests_by_date"][today] = {
-                "requests": 0,
-                "cache_hits": 0,
-                "tokens": 0,
-                "cost_usd": 0.0
-            }
+            output_tokens = getattr(meta, 'candidates_token_count', 0) or 0
+            cached_tokens = getattr(meta, 'cached_content_token_count', 0) or 0
         
-        self.metrics["requests_by_date"][today]["requests"] += 1
+        usage["calls"] += 1
+        usage["prompt_tokens"] += prompt_tokens
+        usage["output_tokens"] += output_tokens
+        usage["cached_tokens"] += cached_tokens
+        usage["latency_ms"] += latency_ms
+        usage["samples"].append((latency_ms, prompt_tokens))
+        return text
+    
+    def _usage_cost(self, usage):
+        """Costo en USD de un uso real (entrada, entrada cacheada y salida)."""
+        uncached = usage["prompt_tokens"] - usage["cached_tokens"]
+        return (uncached * self.cost_per_1k_tokens
+                + usage["cached_tokens"] * self.cost_per_1k_cached_tokens
+                + usage["output_tokens"] * self.cost_per_1k_output_tokens) / 1000
+    
+    def _update_metrics(self, tokens_used, from_cache=False, usage=None, model_name=None):
+        """
+        Actualiza métricas de uso de API.
+        
+        PARÁMETROS:
+            tokens_used (int): Tokens estimados (solo si no hay usage)
+            from_cache (bool): Si la respuesta vino del caché
+            usage (dict): Uso real de _generate (tokens, latencia); con
+                          usage, el costo separa entrada / salida / caché
+            model_name (str): Modelo al que se atribuye el evento sin usage
+                              (default: el del análisis completo)
         
+        NOTA:
+            El evento se acumula en memoria; el disco se escribe por lotes
+            (MetricsStore.flush), no en cada request.
+        """
+        from src.metrics_store import empty_rollup
+        event = empty_rollup()
+        event["requests"] = 1
         if from_cache:
-            self.metrics["requests_by_date"][today]["cache_hits"] += 1
+            event["cache_hits"] = 1
+        elif usage is not None:
+            event["metered"] = 1
+            event["tokens"] = usage["prompt_tokens"] + usage["output_tokens"]
+            event["cost_usd"] = self._usage_cost(usage)
+            event["estimated_requests"] = int(usage["estimated"])
+            event["latency_ms"] = usage["latency_ms"]
+            for key in ("calls", "prompt_tokens", "output_tokens", "cached_tokens"):
+                event[key] = usage[key]
+            for latency_ms, prompt_tokens in usage["samples"]:
+                latency = _bucket_label(latency_ms, LATENCY_BUCKETS_MS)
+                size = _bucket_label(prompt_tokens, PROMPT_TOKEN_BUCKETS)
+                event["latency_ms_histogram"][latency] = event["latency_ms_histogram"].get(latency, 0) + 1
+                event["prompt_tokens_histogram"][size] = event["prompt_tokens_histogram"].get(size, 0) + 1
         else:
-            self.metrics["requests_by_date"][today]["tokens"] += tokens_used
-            cost = (tokens_used / 1000) * self.cost_per_1k_tokens
-            self.metrics["requests_by_date"][today]["cost_usd"] += cost
+            event["tokens"] = tokens_used
+            event["cost_usd"] = (tokens_used / 1000) * self.cost_per_1k_tokens
         
-        # Guardar métricas
-        self._save_metrics()
+        self.metrics_store.record(usage["model"] if usage is not None else model_name or self.model_name, event)
         
-        # Log de métricas
-        cache_rate = (self.metrics["cache_hits"] / self.metrics["total_requests"] * 100) if self.metrics["total_requests"] > 0 else 0
-        self.logger.info(f"Métricas API - Total: {self.metrics['total_requests']} | "
+        # Log de métricas (lectura sin lock: solo informativa)
+        total = self.metrics["total_requests"]
+        cache_rate = (self.metrics["cache_hits"] / total * 100) if total > 0 else 0
+        self.logger.info(f"Métricas API - Total: {total} | "
                         f"Cache: {cache_rate:.1f}% | "
                         f"Tokens: {self.metrics['total_tokens']} | "
                         f"Costo: ${self.metrics['total_cost_usd']:.4f}")
@@ -405,65 +597,30 @@ Texto: {text_content}"""
         return True
 
     # ========================================================================
-    # MÉTODO PRIVADO: RETRY CON BACKOFF EXPONENCIAL
+    # MÉTODO PRIVADO: LLAMADA A GEMINI CON MANEJO DE ERRORES
     # ========================================================================
-    def _retry_with_backoff(self, func, *args, **kwargs):
+    def _call_gemini(self, func, *args, **kwargs):
         """
-        Ejecuta una función con retry y backoff exponencial.
+        Ejecuta una llamada a Gemini y convierte una falla definitiva en None.
         
         OBJETIVO:
-            Manejar errores transitorios de API (rate limit, network errors)
-            con reintentos inteligentes
-        
-        ESTRATEGIA:
-            - Intento 1: Inmediato
-            - Intento 2: Espera 1 segundo
-            - Intento 3: Espera 2 segundos
-            - Intento 4: Espera 4 segundos
-            - etc. (backoff exponencial: 2^(attempt-1))
+            Los reintentos, la cuota y las pausas ante 429 los maneja
+            GeminiClient (gemini_client.py) según el tipo de excepción de
+            google.api_core; acá solo se registra el error final
         
         PARÁMETROS:
             func: Función a ejecutar
             *args, **kwargs: Argumentos para la función
         
         RETORNO:
-            Resultado de la función si tiene éxito, None si todos los intentos fallan
+            Resultado de la función si tiene éxito, None si falla
         """
-        for attempt in range(1, self.retry_attempts + 1):
-            try:
-                # Intentar ejecutar la función
-                return func(*args, **kwargs)
-            
-            except Exception as e:
-                error_msg = str(e).lower()
-                
-                # Detectar tipos específicos de errores
-                is_rate_limit = 'rate limit' in error_msg or 'quota' in error_msg
-                is_network = 'connection' in error_msg or 'timeout' in error_msg
-                is_api_error = 'api' in error_msg or '429' in error_msg or '503' in error_msg
-                
-                # Si es el último intento, no reintentar
-                if attempt == self.retry_attempts:
-                    self.logger.error(f"Fallo después de {self.retry_attempts} intentos: {e}")
-                    return None
-                
-                # Calcular tiempo de espera (backoff exponencial)
-                wait_time = 2 ** (attempt - 1)  # 1s, 2s, 4s, 8s...
-                
-                # Log del reintento
-                if is_rate_limit:
-                    self.logger.warning(f"Rate limit detectado. Reintentando en {wait_time}s (intento {attempt}/{self.retry_attempts})")
-                elif is_network:
-                    self.logger.warning(f"Error de red. Reintentando en {wait_time}s (intento {attempt}/{self.retry_attempts})")
-                elif is_api_error:
-                    self.logger.warning(f"Error de API. Reintentando en {wait_time}s (intento {attempt}/{self.retry_attempts})")
-                else:
-                    self.logger.warning(f"Error: {e}. Reintentando en {wait_time}s (intento {attempt}/{self.retry_attempts})")
-                
-                # Esperar antes del siguiente intento
-                time.sleep(wait_time)
-        
-        return None
+        from src.gemini_client import classify_error
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            self.logger.error(f"Fallo de Gemini API ({classify_error(e)}, {type(e).__name__}): {e}")
+            return None
 
 
     # ========================================================================
@@ -473,93 +630,197 @@ Texto: {text_content}"""
         """
         Analiza una oportunidad usando Gemini AI.
         
+        PARÁMETROS:
+            text_content (str): Texto completo de la oportunidad
+            matched_keywords (list): Lista de triggers detectados
+        
+        MODO CASCADA (GEMINI_CASCADE_ENABLED):
+            1. Triage (triage_prompt, GEMINI_TRIAGE_MODEL): solo rubro + score
+            2. Score < MIN_RELEVANCE_SCORE: se retorna el triage, sin resumen
+            3. Si no (o si el triage falla): análisis completo (_analyze_full)
+               en GEMINI_FULL_MODEL
+        
+        RETORNO:
+            Diccionario con análisis o None. Incluye 'MIA_Tier' ('triage' o
+            'completo') y 'MIA_Modelo' (modelo que produjo el análisis)
+        """
+        if self.cascade_enabled and self.triage_prompt_template and self.api_key:
+            triage = self._triage(text_content, matched_keywords)
+            if triage is not None and triage["MIA_Score_IA"] < self.min_relevance_score:
+                self.logger.info(f"Triage: score {triage['MIA_Score_IA']} < {self.min_relevance_score:g}, "
+                                 f"sin análisis completo")
+                return self._tag(triage, "triage", self.triage_model_name)
+        analysis = self._analyze_full(text_content, matched_keywords)
+        return self._tag(analysis, "completo", self.model_name)
+    
+    def _tag(self, analysis, tier, model_name):
+        """Agrega nivel de análisis y modelo (columnas MIA_Tier / MIA_Modelo)."""
+        if analysis is None:
+            return None
+        return {"MIA_Resumen_Tecnico": "", **analysis, "MIA_Tier": tier, "MIA_Modelo": model_name}
+    
+    def _triage(self, text_content, matched_keywords=None):
+        """
+        Triage del modo cascada: rubro y score con un prompt corto en el
+        modelo más económico. Usa la caché como el análisis completo.
+        
+        RETORNO:
+            {'MIA_Rubro', 'MIA_Score_IA'} o None si falla (el llamador
+            hace el análisis completo)
+        """
+        from src.structured_output import (
+            triage_schema, normalize_analysis, parse_response, ResponseFormatError
+        )
+        keywords_str = ", ".join(matched_keywords) if matched_keywords else "N/A"
+        prompt = self.triage_prompt_template.format(
+            matched_keywords=keywords_str,
+            text_content=self._prepare_text(text_content, matched_keywords)
+        )
+        cache_key = self._generate_cache_key(prompt, self.triage_model_name, f"triage-{self.triage_prompt_version}")
+        cached_response = self._check_cache(cache_key)
+        if cached_response is not None:
+            self._update_metrics(self._estimate_tokens(prompt), from_cache=True,
+                                 model_name=self.triage_model_name)
+            return cached_response
+        
+        usage = self._new_usage(self.triage_model_name)
+        response_text = self._call_gemini(
+            lambda: self._generate(prompt, usage, triage_schema(), model=self.triage_model)
+        )
+        self._update_metrics(0, from_cache=False, usage=usage)
+        if response_text is None:
+            return None
+        try:
+            data = normalize_analysis(parse_response(response_text)[0])
+        except ResponseFormatError as e:
+            self.logger.warning(f"Triage ilegible ({e.kind}), se hace el análisis completo")
+            return None
+        if (not isinstance(data, dict) or not isinstance(data.get("MIA_Score_IA"), int)
+                or not str(data.get("MIA_Rubro") or "").strip()):
+            self.logger.warning("Triage incompleto, se hace el análisis completo")
+            return None
+        triage = {"MIA_Rubro": data["MIA_Rubro"], "MIA_Score_IA": data["MIA_Score_IA"]}
+        self._save_to_cache(cache_key, triage, usage["prompt_tokens"] + usage["output_tokens"])
+        return triage
+    
+    def _analyze_full(self, text_content, matched_keywords=None):
+        """
+        Análisis completo (analysis_prompt) de una oportunidad.
+        
         PARÁMETROS:
             text_content (str): Texto completo de la oportunidad
             matched_keywords (list): Lista de triggers detectados
         
         PROCESO:
             1. Valida que exista API key
-            2. Formatea las keywords para el prompt
-            3. Construye prompt usando la plantilla
-            4. Envía a Gemini API con retry automático
-            5. Limpia y parsea respuesta JSON
-            6. Valida estructura de la respuesta
+            2. Construye el prompt final (plantilla + keywords + texto)
+            3. Busca el análisis en caché (clave: modelo + versión + prompt)
+               y, si no está, un casi-duplicado en el índice SimHash
+            4. Envía a Gemini API (JSON con esquema) dentro de la cuota
+               RPM/TPM, con reintento solo ante errores de API / red
+            5. Lee el JSON localmente, reparándolo si hace falta; una
+               respuesta irreparable NO se reenvía
+            6. Normaliza tipos y valida estructura de la respuesta (una vez)
         
         MEJORAS IMPLEMENTADAS (Fase 1):
-            - Retry con backoff exponencial para errores de API
+            - Reintentos por tipo de error y cuota compartida (GeminiClient)
             - Validación de estructura JSON de respuesta
             - Mejor manejo de errores con logging detallado
         
         RETORNO:
-            Diccionario con análisis (si éxito) o None (si error)
+            Diccionario con análisis (si éxito) o None (si error).
+            Si el texto es casi-duplicado de uno ya analizado incluye
+            '_near_duplicate': {'distance': bits, 'of': clave original}
         """
         if not self.api_key:
             self.logger.error("Cannot analyze: No API Key.")
             return None
 
+        # --------------------------------------------------------------------
+        # PREPARACIÓN DEL PROMPT
+        # --------------------------------------------------------------------
+        # Plantilla + keywords + texto truncado: exactamente lo que se envía
+        # --------------------------------------------------------------------
+        page_text = self._prepare_text(text_content, matched_keywords)
+        prompt = self._build_prompt(text_content, matched_keywords, page_text)
+
         # --------------------------------------------------------------------
         # VERIFICAR CACHÉ
         # --------------------------------------------------------------------
-        # Generar clave de caché basada en el contenido
+        # La clave cubre modelo + versión de plantilla + prompt final
         # --------------------------------------------------------------------
-        cache_key = self._generate_cache_key(text_content)
+        cache_key = self._generate_cache_key(prompt)
         
         # Verificar si existe en caché
         cached_response = self._check_cache(cache_key)
         if cached_response is not None:
             # Respuesta encontrada en caché
-            tokens_estimated = self._estimate_tokens(text_content)
+            tokens_estimated = self._estimate_tokens(prompt)
             self._update_metrics(tokens_estimated, from_cache=True)
             return cached_response
-
+        
         # --------------------------------------------------------------------
-        # PREPARACIÓN DEL PROMPT
+        # VERIFICAR CASI-DUPLICADOS
         # --------------------------------------------------------------------
-        # Convierte lista de keywords en string para incluir en el prompt
+        # Página con cambios triviales (fecha, contador, banner) respecto de
+        # una ya analizada: se reutiliza (reuse) o se marca (flag). La huella
+        # es solo del texto: la plantilla fija dominaría el SimHash y haría
+        # parecidas páginas sin relación
         # --------------------------------------------------------------------
-        keywords_str = ", ".join(matched_keywords) if matched_keywords else "N/A"
-        
-        # Construir prompt usando plantilla con variables
-        truncated_text = text_content[:10000]  # Truncar a 10k caracteres
-        prompt = self.prompt_template.format(
-            matched_keywords=keywords_str,
-            text_content=truncated_text
-        )
+        fingerprint = None
+        near_duplicate = None
+        if self.near_dup_index is not None and len(page_text) >= self.near_dup_min_chars:
+            from src.near_duplicate import simhash
+            fingerprint = simhash(page_text)
+            near = self._check_near_duplicate(fingerprint, cache_key)
+            if near is not None:
+                previous, match = near
+                near_duplicate = {"distance": match["distance"], "of": match["cache_key"]}
+                if self.near_dup_mode == "reuse":
+                    # Próxima vez: hit exacto. La huella NO se indexa, así
+                    # cambios acumulados no se alejan del documento original.
+                    self._save_to_cache(cache_key, previous, 0)
+                    self._update_metrics(self._estimate_tokens(prompt), from_cache=True)
+                    return {**previous, "_near_duplicate": near_duplicate}
         
-        # Estimar tokens para métricas
-        tokens_estimated = self._estimate_tokens(prompt + truncated_text)
+        # Uso real (tokens de usage_metadata + latencia), sumado entre reintentos
+        usage = self._new_usage()
         
         # --------------------------------------------------------------------
         # FUNCIÓN INTERNA PARA LLAMADA A GEMINI
         # --------------------------------------------------------------------
-        # Esta función se ejecutará con retry automático
+        # GeminiClient reintenta errores transitorios. Solo la llamada:
+        # una respuesta recibida (válida o no) ya se pagó y no se reintenta
         # --------------------------------------------------------------------
+        from src.structured_output import (
+            analysis_schema, normalize_analysis, parse_response, ResponseFormatError
+        )
+        
         def call_gemini_api():
             """Función interna para llamar a Gemini API"""
-            response = self.model.generate_content(prompt)
-            
-            # Limpiar respuesta (remover markdown ```json```)
-            text = response.text.replace("```json", "").replace("```", "").strip()
-            
-            if not text:
-                raise ValueError("Gemini returned empty response")
-            
-            # Parsear JSON
-            return json.loads(text)
+            return self._generate(prompt, usage, analysis_schema())
         
         # --------------------------------------------------------------------
-        # LLAMADA A GEMINI CON RETRY AUTOMÁTICO
+        # LLAMADA A GEMINI (CUOTA + REINTENTOS EN GEMINICLIENT)
         # --------------------------------------------------------------------
         try:
-            # Usar retry_with_backoff para manejar errores transitorios
-            analysis_data = self._retry_with_backoff(call_gemini_api)
+            # Cuota, pausas ante 429 y reintentos: GeminiClient
+            response_text = self._call_gemini(call_gemini_api)
             
-            if analysis_data is None:
+            if response_text is None:
                 self.logger.error("Gemini API call failed after all retry attempts")
-                # Actualizar métricas de fallo
-                self._update_metrics(tokens_estimated, from_cache=False)
+                # Actualizar métricas de fallo (solo se factura lo recibido)
+                self._update_metrics(0, from_cache=False, usage=usage)
                 return None
             
+            # ----------------------------------------------------------------
+            # LECTURA DEL JSON (reparación local, sin reenviar el prompt)
+            # ----------------------------------------------------------------
+            analysis_data, repair = parse_response(response_text)
+            if repair:
+                self.logger.warning(f"Respuesta de Gemini reparada localmente ({repair})")
+            analysis_data = normalize_analysis(analysis_data)
+            
             # ----------------------------------------------------------------
             # VALIDACIÓN DE RESPUESTA
             # ----------------------------------------------------------------
@@ -567,14 +828,18 @@ Texto: {text_content}"""
                 self.logger.error("Gemini response failed validation")
                 self.logger.debug(f"Invalid response: {json.dumps(analysis_data, indent=2)}")
                 # Actualizar métricas de fallo
-                self._update_metrics(tokens_estimated, from_cache=False)
+                self._update_metrics(0, from_cache=False, usage=usage)
                 return None
             
             # ----------------------------------------------------------------
             # GUARDAR EN CACHÉ Y ACTUALIZAR MÉTRICAS
             # ----------------------------------------------------------------
-            self._save_to_cache(cache_key, analysis_data, tokens_estimated)
-            self._update_metrics(tokens_estimated, from_cache=False)
+            self._save_to_cache(cache_key, analysis_data, usage["prompt_tokens"] + usage["output_tokens"])
+            if fingerprint is not None and self.enable_cache:
+                self.near_dup_index.add(fingerprint, self._cache_scope(), cache_key)
+            self._update_metrics(0, from_cache=False, usage=usage)
+            if near_duplicate is not None:
+                analysis_data = {**analysis_data, "_near_duplicate": near_duplicate}
             
             # Respuesta válida
             self.logger.debug(f"Analysis successful: {analysis_data.get('MIA_Rubro')} - Score: {analysis_data.get('MIA_Score_IA')}")
@@ -583,13 +848,242 @@ Texto: {text_content}"""
         # ====================================================================
         # MANEJO DE ERRORES
         # ====================================================================
-        except json.JSONDecodeError as e:
-            # Error: Gemini no retornó JSON válido
-            self.logger.error(f"Gemini response is not valid JSON: {e}")
-            self._update_metrics(tokens_estimated, from_cache=False)
+        except ResponseFormatError as e:
+            # Error: Gemini no retornó JSON válido (ni reparable)
+            self.logger.error(f"Gemini response is not valid JSON ({e.kind}), no se reintenta: {e}")
+            self._update_metrics(0, from_cache=False, usage=usage)
             return None
         except Exception as e:
             # Cualquier otro error no manejado
             self.logger.error(f"Unexpected error in analysis: {e}")
-            self._update_metrics(tokens_estimated, from_cache=False)
+            self._update_metrics(0, from_cache=False, usage=usage)
             return None
+
+    # ========================================================================
+    # MÉTODO PRINCIPAL: ANALIZAR UN LOTE DE OPORTUNIDADES CORTAS
+    # ========================================================================
+    def analyze_batch(self, opportunities):
+        """
+        Analiza varias oportunidades cortas en UNA consulta a Gemini.
+        
+        OBJETIVO:
+            Las instrucciones fijas de la plantilla se pagan una vez por
+            lote y no una vez por oportunidad. Pensado para portales con
+            muchas filas cortas (ej: tabla de licitaciones de AySA).
+        
+        PARÁMETROS:
+            opportunities (list): Oportunidades (dicts con 'full_text' y
+                                  'matched_keywords')
+        
+        PROCESO:
+            1. Busca cada oportunidad en caché: primero con la clave del
+               análisis individual y después con la del lote (versión de
+               batch_analysis_prompt, ver _batch_cache_key)
+            2. Las restantes se envían con batch_analysis_prompt; Gemini
+               responde un array JSON con un objeto por 'id'
+            3. El array se lee localmente (parse_response, con reparación)
+               y cada objeto se normaliza y valida con
+               _validate_analysis_response
+            4. Las oportunidades que faltan o no validan se reanalizan de a
+               una con analyze_opportunity
+        
+        RETORNO:
+            Lista de análisis (dict o None), alineada con opportunities.
+            Los análisis del lote son completos (MIA_Tier = 'completo')
+        """
+        if not self.api_key:
+            self.logger.error("Cannot analyze: No API Key.")
+            return [None] * len(opportunities)
+        
+        results = [None] * len(opportunities)
+        pending = []
+        for index, op in enumerate(opportunities):
+            prompt = self._build_prompt(op['full_text'], op.get('matched_keywords'))
+            cache_key = self._batch_cache_key(prompt)
+            cached_response = self._check_cache(self._generate_cache_key(prompt))
+            if cached_response is None:
+                cached_response = self._check_cache(cache_key)
+            if cached_response is not None:
+                self._update_metrics(self._estimate_tokens(prompt), from_cache=True)
+                results[index] = cached_response
+            else:
+                pending.append((index, op, cache_key))
+        
+        fallback = pending
+        if len(pending) > 1 and self.batch_prompt_template:
+            fallback = self._analyze_pending_batch(pending, results)
+            if fallback:
+                self.logger.warning(
+                    f"Lote: {len(fallback)}/{len(pending)} oportunidades sin análisis válido, "
+                    f"se reanalizan individualmente"
+                )
+        
+        for index, op, _ in fallback:
+            results[index] = self.analyze_opportunity(
+                op['full_text'],
+                matched_keywords=op.get('matched_keywords', [])
+            )
+        return [result if result is None or "MIA_Tier" in result
+                else self._tag(result, "completo", self.model_name) for result in results]
+    
+    def _batch_cache_key(self, prompt):
+        """
+        Clave de caché de un análisis hecho en lote.
+        
+        El resultado depende de batch_analysis_prompt y no de la plantilla
+        individual: la clave lleva la versión de la plantilla de lote, así
+        cambiarla invalida los análisis de lote anteriores.
+        
+        PARÁMETROS:
+            prompt (str): Prompt individual de la oportunidad (_build_prompt)
+        """
+        return self._generate_cache_key(prompt, prompt_version=f"batch-{self.batch_prompt_version}")
+    
+    def _analyze_pending_batch(self, pending, results):
+        """
+        Envía las oportunidades pendientes en un solo prompt de lote.
+        
+        PARÁMETROS:
+            pending (list): Tuplas (índice, oportunidad, clave de caché del
+                            lote, ver _batch_cache_key)
+            results (list): Resultados de analyze_batch (se completan acá)
+        
+        RETORNO:
+            Lista de pendientes sin análisis válido (para el fallback)
+        """
+        items = [
+            {
+                "id": str(number),
+                "keywords": ", ".join(op.get('matched_keywords') or []) or "N/A",
+                "texto": op['full_text'][:MAX_PROMPT_TEXT_CHARS]
+            }
+            for number, (_, op, _) in enumerate(pending, start=1)
+        ]
+        prompt = self.batch_prompt_template.format(
+            items=json.dumps(items, ensure_ascii=False, indent=1)
+        )
+        usage = self._new_usage()
+        self.logger.info(f"Analizando lote de {len(pending)} oportunidades en una consulta")
+        
+        from src.structured_output import (
+            batch_schema, normalize_analysis, parse_response, ResponseFormatError
+        )
+        
+        def call_gemini_batch():
+            """Función interna para llamar a Gemini API con el lote"""
+            return self._generate(prompt, usage, batch_schema())
+        
+        response_text = self._call_gemini(call_gemini_batch)
+        self._update_metrics(0, from_cache=False, usage=usage)
+        if response_text is None:
+            self.logger.error("Gemini API batch call failed after all retry attempts")
+            return pending
+        
+        try:
+            data, repair = parse_response(response_text)
+        except ResponseFormatError as e:
+            # Lote ilegible: las oportunidades pasan al análisis individual
+            self.logger.error(f"Respuesta del lote no es JSON válido ({e.kind}): {e}")
+            return pending
+        if repair:
+            self.logger.warning(f"Respuesta del lote reparada localmente ({repair})")
+        if isinstance(data, dict):
+            # Algunas respuestas envuelven el array: {"resultados": [...]}
+            data = next((v for v in data.values() if isinstance(v, list)), [data])
+        if not isinstance(data, list):
+            self.logger.error("La respuesta del lote no es un array JSON")
+            return pending
+        
+        by_id = {str(element.get("id")): element for element in data if isinstance(element, dict)}
+        tokens_per_item = (usage["prompt_tokens"] + usage["output_tokens"]) // len(pending)
+        failed = []
+        for number, (index, op, cache_key) in enumerate(pending, start=1):
+            element = by_id.get(str(number))
+            analysis = None
+            if element is not None:
+                analysis = normalize_analysis({k: v for k, v in element.items() if k != "id"})
+            if analysis is None or not self._validate_analysis_response(analysis):
+                failed.append((index, op, cache_key))
+                continue
+            self._save_to_cache(cache_key, analysis, tokens_per_item)
+            results[index] = analysis
+        return failed
+
+    # ========================================================================
+    # MÉTODO PRINCIPAL: ANALIZAR VARIAS OPORTUNIDADES EN PARALELO
+    # ========================================================================
+    def analyze_many(self, opportunities, max_workers=None):
+        """
+        Analiza varias oportunidades con requests concurrentes a Gemini.
+        
+        OBJETIVO:
+            Cada análisis espera la latencia de red (y las pausas por cuota);
+            con N requests en vuelo, 200 oportunidades tardan ~ latencia x
+            (200 / N) en vez de la suma de 200 round trips
+        
+        PARÁMETROS:
+            opportunities (list): Oportunidades del scraper (dicts con
+                                  'url', 'full_text', 'matched_keywords')
+            max_workers (int): Requests en vuelo (default: GEMINI_MAX_CONCURRENCY)
+        
+        CONCURRENCIA:
+            - GeminiClient reparte la cuota RPM/TPM entre los workers
+            - métricas y caché son seguros entre threads
+        
+        LOTES:
+            Con GEMINI_BATCH_ENABLED, las oportunidades de hasta
+            GEMINI_BATCH_MAX_CHARS caracteres se agrupan de a
+            GEMINI_BATCH_SIZE en una sola consulta (ver analyze_batch).
+            En modo cascada no hay lotes: cada oportunidad pasa primero
+            por el triage
+        
+        RETORNO:
+            Generador de (oportunidad, análisis o None), en el orden de entrada
+        """
+        tasks = self._plan_tasks(opportunities)
+        workers = max(1, min(max_workers or self.max_concurrency, len(tasks) or 1))
+        
+        def run(indexes):
+            if len(indexes) == 1:
+                op = opportunities[indexes[0]]
+                self.logger.info(f"Analizando oportunidad: {op['url']}")
+                return {indexes[0]: self.analyze_opportunity(
+                    op['full_text'],
+                    matched_keywords=op.get('matched_keywords', [])
+                )}
+            return dict(zip(indexes, self.analyze_batch([opportunities[i] for i in indexes])))
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gemini") as executor:
+            futures = {}
+            for indexes in tasks:
+                future = executor.submit(run, indexes)
+                for index in indexes:
+                    futures[index] = future
+            for index, op in enumerate(opportunities):
+                yield op, futures[index].result()[index]
+    
+    def _plan_tasks(self, opportunities):
+        """
+        Agrupa las oportunidades en consultas: lotes de textos cortos e
+        índices individuales para el resto, ordenados por primera aparición.
+        
+        En modo cascada no se arman lotes: el lote usa la plantilla completa
+        en GEMINI_FULL_MODEL y se saltearía el triage económico.
+        
+        RETORNO:
+            Lista de listas de índices (una lista por consulta a Gemini)
+        """
+        cascade = self.cascade_enabled and self.triage_prompt_template
+        batching = (self.batch_enabled and self.batch_prompt_template and self.batch_size > 1
+                    and not cascade)
+        tasks, batch = [], []
+        for index, op in enumerate(opportunities):
+            if batching and len(op.get('full_text') or '') <= self.batch_max_chars:
+                if not batch:
+                    tasks.append(batch)
+                batch.append(index)
+                if len(batch) == self.batch_size:
+                    batch = []
+            else:
+                tasks.append([index])
+        return tasks
@@ -0,0 +1,198 @@
+"""
+================================================================================
+MIA V4.0 - CIRCUIT BREAKER POR PORTAL (circuit_breaker.py)
+================================================================================
+
+OBJETIVO GENERAL:
+    Evitar que un portal caído consuma reintentos y esperas en CADA
+    ejecución. El estado de salud de cada portal se guarda entre
+    ejecuciones y un portal con fallas repetidas se deja de consultar
+    durante un período de enfriamiento.
+
+ESTADOS:
+    - closed: Portal sano, se escanea normalmente (con reintentos)
+    - open: Demasiadas fallas consecutivas; no se escanea hasta que
+            termine el enfriamiento (open_until)
+    - half_open: Terminó el enfriamiento; se envía UN solo request de
+                 prueba (sin reintentos):
+                 * éxito -> closed
+                 * falla -> open otra vez, con enfriamiento duplicado
+                   (hasta CIRCUIT_BREAKER_MAX_COOLDOWN)
+
+PERSISTENCIA:
+    JSON en CIRCUIT_BREAKER_FILE (default: data/portal_health.json),
+    escrito de forma atómica al final de cada search_all().
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Circuit Breaker
+================================================================================
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breakers de todos los portales, persistidos en disco.
+
+    USO:
+        breaker = CircuitBreaker()
+        state = breaker.allow("comprar.gob.ar")   # closed / half_open / open
+        if state != OPEN:
+            ... escanear (un solo intento si state == HALF_OPEN) ...
+            breaker.record_success(...) o breaker.record_failure(..., error)
+        breaker.save()
+    """
+
+    def __init__(self, state_file: Optional[str] = None, failure_threshold: Optional[int] = None,
+                 cooldown_seconds: Optional[float] = None, max_cooldown_seconds: Optional[float] = None):
+        """
+        PARÁMETROS (default: config.py):
+            state_file (str): Archivo JSON con el estado de los portales
+            failure_threshold (int): Fallas consecutivas que abren el circuito
+            cooldown_seconds (float): Enfriamiento inicial de un circuito abierto
+            max_cooldown_seconds (float): Enfriamiento máximo tras pruebas fallidas
+        """
+        from src.config import (
+            CIRCUIT_BREAKER_FILE, CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+            CIRCUIT_BREAKER_COOLDOWN, CIRCUIT_BREAKER_MAX_COOLDOWN
+        )
+        self.logger = logging.getLogger(__name__)
+        self.state_file = state_file or CIRCUIT_BREAKER_FILE
+        self.failure_threshold = failure_threshold or CIRCUIT_BREAKER_FAILURE_THRESHOLD
+        self.cooldown_seconds = cooldown_seconds or CIRCUIT_BREAKER_COOLDOWN
+        self.max_cooldown_seconds = max(max_cooldown_seconds or CIRCUIT_BREAKER_MAX_COOLDOWN,
+                                        self.cooldown_seconds)
+        self._lock = threading.Lock()
+        self.portals: Dict[str, Dict[str, Any]] = self._load()
+
+    # ========================================================================
+    # PERSISTENCIA
+    # ========================================================================
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """Carga el estado guardado (vacío si no existe o está corrupto)."""
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data.get("portals", {}) if isinstance(data, dict) else {}
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"No se pudo leer el estado de portales ({self.state_file}): {e}")
+            return {}
+
+    def save(self) -> None:
+        """Guarda el estado de forma atómica (archivo temporal + rename)."""
+        with self._lock:
+            payload = json.dumps(
+                {"updated_at": datetime.now().isoformat(timespec='seconds'), "portals": self.portals},
+                ensure_ascii=False, indent=2
+            )
+        directory = os.path.dirname(os.path.abspath(self.state_file))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".portal_health_")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.state_file)
+        except OSError as e:
+            self.logger.warning(f"No se pudo guardar el estado de portales: {e}")
+
+    # ========================================================================
+    # TRANSICIONES
+    # ========================================================================
+    def _entry(self, portal: str) -> Dict[str, Any]:
+        entry = self.portals.get(portal)
+        if entry is None:
+            entry = {
+                "state": CLOSED,
+                "failures": 0,             # Fallas consecutivas
+                "cooldown": 0,             # Enfriamiento vigente (segundos)
+                "open_until": None,        # Epoch hasta el que no se consulta
+                "last_error": None,
+                "last_success": None
+            }
+            self.portals[portal] = entry
+        return entry
+
+    def allow(self, portal: str) -> str:
+        """
+        Indica si se puede escanear el portal ahora.
+
+        RETORNO:
+            'closed' (escanear normalmente), 'half_open' (un solo request de
+            prueba) u 'open' (omitir hasta open_until)
+        """
+        with self._lock:
+            entry = self._entry(portal)
+            if entry["state"] == OPEN and time.time() >= (entry["open_until"] or 0):
+                entry["state"] = HALF_OPEN
+                self.logger.info(f"[CIRCUIT] {portal}: enfriamiento terminado, request de prueba")
+            return entry["state"]
+
+    def record_success(self, portal: str) -> None:
+        """Registra un escaneo exitoso (cierra el circuito)."""
+        with self._lock:
+            entry = self._entry(portal)
+            if entry["state"] != CLOSED:
+                self.logger.info(f"[CIRCUIT] {portal}: portal recuperado, circuito cerrado")
+            entry.update({
+                "state": CLOSED,
+                "failures": 0,
+                "cooldown": 0,
+                "open_until": None,
+                "last_success": datetime.now().isoformat(timespec='seconds')
+            })
+
+    def record_failure(self, portal: str, error: Optional[str] = None) -> None:
+        """
+        Registra un escaneo fallido.
+
+        - closed: suma una falla; al llegar a failure_threshold se abre
+        - half_open: la prueba falló; se reabre con enfriamiento duplicado
+        """
+        with self._lock:
+            entry = self._entry(portal)
+            entry["failures"] += 1
+            entry["last_error"] = error
+
+            if entry["state"] == HALF_OPEN:
+                cooldown = min(entry["cooldown"] * 2 or self.cooldown_seconds, self.max_cooldown_seconds)
+            elif entry["failures"] >= self.failure_threshold:
+                cooldown = self.cooldown_seconds
+            else:
+                return
+
+            entry["state"] = OPEN
+            entry["cooldown"] = cooldown
+            entry["open_until"] = time.time() + cooldown
+            self.logger.warning(
+                f"[CIRCUIT] {portal}: circuito abierto por {cooldown / 60:.0f} min "
+                f"({entry['failures']} fallas consecutivas). Último error: {error}"
+            )
+
+    # ========================================================================
+    # CONSULTA
+    # ========================================================================
+    def describe(self, portal: str) -> str:
+        """Descripción corta del estado para el resumen de ejecución."""
+        with self._lock:
+            entry = self.portals.get(portal)
+            if not entry or entry["state"] == CLOSED:
+                failures = entry["failures"] if entry else 0
+                return f"closed ({failures} fallas)" if failures else "closed"
+            if entry["state"] == OPEN:
+                until = datetime.fromtimestamp(entry["open_until"]).strftime('%Y-%m-%d %H:%M')
+                return f"open hasta {until}"
+            return entry["state"]
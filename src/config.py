@@ -51,6 +51,7 @@ VERSIÓN: 4.0 - Stage 1
 
 
 import os
+import json
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -90,14 +91,204 @@ JSON_LOGS = os.getenv("JSON_LOGS", "false").lower() == "true"
 #                        Usa backoff exponencial: 1s, 2s, 4s, etc.
 # GEMINI_ENABLE_CACHE: Habilitar caché de respuestas de Gemini (reduce costos)
 # GEMINI_CACHE_TTL_HOURS: Tiempo de vida del caché en horas
-# GEMINI_COST_PER_1K_TOKENS: Costo aproximado por 1000 tokens (USD)
-# GEMINI_METRICS_FILE: Archivo para guardar métricas de uso de API
+# GEMINI_COST_PER_1K_TOKENS: Costo por 1000 tokens de ENTRADA (USD)
+# GEMINI_COST_PER_1K_OUTPUT_TOKENS: Costo por 1000 tokens de salida (USD)
+# GEMINI_COST_PER_1K_CACHED_TOKENS: Costo por 1000 tokens de entrada servidos
+#                                   desde la caché de contexto de Gemini
+#                                   (default: 25% del costo de entrada)
+# GEMINI_METRICS_FILE: Resumen JSON de métricas de uso de API (se escribe al
+#                      cerrar la ejecución)
+# GEMINI_METRICS_DB: Log SQLite append-only de métricas (src/metrics_store.py)
+# GEMINI_METRICS_FLUSH_EVERY: Requests acumulados en memoria antes de escribir
+# GEMINI_METRICS_FLUSH_SECONDS: Segundos máximos entre escrituras de métricas
+# GEMINI_CACHE_FILE: Base SQLite de la caché persistente de análisis
+#                    (src/analysis_cache.py, compartible entre procesos)
+# GEMINI_CACHE_MAX_MB: Tamaño máximo de la caché (desalojo LRU, 0 = sin límite)
+# GEMINI_CACHE_COMPRESS: Comprimir respuestas guardadas con zlib
 # ============================================================================
 GEMINI_RETRY_ATTEMPTS = int(os.getenv("GEMINI_RETRY_ATTEMPTS", "3"))
 GEMINI_ENABLE_CACHE = os.getenv("GEMINI_ENABLE_CACHE", "true").lower() == "true"
 GEMINI_CACHE_TTL_HOURS = int(os.getenv("GEMINI_CACHE_TTL_HOURS", "24"))
 GEMINI_COST_PER_1K_TOKENS = float(os.getenv("GEMINI_COST_PER_1K_TOKENS", "0.00015"))  # Flash model
+GEMINI_COST_PER_1K_OUTPUT_TOKENS = float(os.getenv("GEMINI_COST_PER_1K_OUTPUT_TOKENS", "0.0006"))
+GEMINI_COST_PER_1K_CACHED_TOKENS = float(
+    os.getenv("GEMINI_COST_PER_1K_CACHED_TOKENS", str(GEMINI_COST_PER_1K_TOKENS * 0.25))
+)
 GEMINI_METRICS_FILE = os.getenv("GEMINI_METRICS_FILE", "logs/gemini_metrics.json")
+GEMINI_METRICS_DB = os.getenv("GEMINI_METRICS_DB", "logs/gemini_metrics.db")
+GEMINI_METRICS_FLUSH_EVERY = int(os.getenv("GEMINI_METRICS_FLUSH_EVERY", "20"))
+GEMINI_METRICS_FLUSH_SECONDS = float(os.getenv("GEMINI_METRICS_FLUSH_SECONDS", "30"))
+GEMINI_CACHE_FILE = os.getenv("GEMINI_CACHE_FILE", "data/analysis_cache.db")
+GEMINI_CACHE_MAX_MB = float(os.getenv("GEMINI_CACHE_MAX_MB", "256"))
+GEMINI_CACHE_COMPRESS = os.getenv("GEMINI_CACHE_COMPRESS", "true").lower() == "true"
+
+# ============================================================================
+# CONTEXTO ENVIADO A GEMINI (src/context_builder.py)
+# ============================================================================
+# CONTEXT_BUILDER_ENABLED: Enviar ventanas alrededor de las keywords en vez
+#                          de los primeros 10.000 caracteres
+# CONTEXT_WINDOW_CHARS: Caracteres de contexto a cada lado de una aparición
+# CONTEXT_MAX_TOKENS: Presupuesto de texto por oportunidad (~4 caracteres
+#                     por token); textos más cortos se envían completos
+# CONTEXT_HEAD_CHARS: Inicio de la página que se envía siempre (título,
+#                     objeto de la contratación)
+# ============================================================================
+CONTEXT_BUILDER_ENABLED = os.getenv("CONTEXT_BUILDER_ENABLED", "true").lower() == "true"
+CONTEXT_WINDOW_CHARS = int(os.getenv("CONTEXT_WINDOW_CHARS", "600"))
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "2000"))
+CONTEXT_HEAD_CHARS = int(os.getenv("CONTEXT_HEAD_CHARS", "800"))
+
+# ============================================================================
+# ANÁLISIS CONCURRENTE (Analyzer.analyze_many)
+# ============================================================================
+# GEMINI_MAX_CONCURRENCY: Requests a Gemini en vuelo al mismo tiempo
+#                         (1 = análisis secuencial)
+# GEMINI_REQUESTS_PER_MINUTE: Cuota de requests por minuto del modelo
+#                             (0 = sin límite local)
+# GEMINI_TOKENS_PER_MINUTE: Cuota de tokens por minuto del modelo (entrada +
+#                           salida, 0 = sin límite local). Ambas cuotas se
+#                           reparten entre los workers (src/gemini_client.py)
+# ============================================================================
+GEMINI_MAX_CONCURRENCY = max(1, int(os.getenv("GEMINI_MAX_CONCURRENCY", "4")))
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+GEMINI_TOKENS_PER_MINUTE = float(os.getenv("GEMINI_TOKENS_PER_MINUTE", "1000000"))
+
+# ============================================================================
+# ANÁLISIS POR LOTES (batch_analysis_prompt en config/prompts.json)
+# ============================================================================
+# GEMINI_BATCH_ENABLED: Agrupar oportunidades cortas en una sola consulta
+# GEMINI_BATCH_SIZE: Oportunidades por consulta
+# GEMINI_BATCH_MAX_CHARS: Textos de hasta esta longitud se agrupan
+#                         (ej: filas de tablas de licitaciones); los más
+#                         largos se analizan de a uno
+# Con GEMINI_CASCADE_ENABLED no se arman lotes (cada oportunidad pasa
+# primero por el triage)
+# ============================================================================
+GEMINI_BATCH_ENABLED = os.getenv("GEMINI_BATCH_ENABLED", "true").lower() == "true"
+GEMINI_BATCH_SIZE = max(1, int(os.getenv("GEMINI_BATCH_SIZE", "10")))
+GEMINI_BATCH_MAX_CHARS = int(os.getenv("GEMINI_BATCH_MAX_CHARS", "1500"))
+
+# ============================================================================
+# SALIDA JSON ESTRUCTURADA (src/structured_output.py)
+# ============================================================================
+# GEMINI_STRUCTURED_OUTPUT: Pedir JSON con esquema (response_mime_type +
+#                           response_schema de los campos MIA_*). Las
+#                           respuestas se leen y reparan localmente; un JSON
+#                           irreparable no se reintenta
+# ============================================================================
+GEMINI_STRUCTURED_OUTPUT = os.getenv("GEMINI_STRUCTURED_OUTPUT", "true").lower() == "true"
+
+# ============================================================================
+# ANÁLISIS EN CASCADA (triage_prompt en config/prompts.json)
+# ============================================================================
+# GEMINI_CASCADE_ENABLED: Triage barato (solo rubro + score) antes del
+#                         análisis completo
+# GEMINI_TRIAGE_MODEL: Modelo del triage (el más económico)
+# GEMINI_FULL_MODEL: Modelo del análisis completo en modo cascada
+#                    (default: GEMINI_MODEL)
+# MIN_RELEVANCE_SCORE: Score de triage mínimo para el análisis completo
+#                      (resumen técnico, preguntas)
+# ============================================================================
+GEMINI_CASCADE_ENABLED = os.getenv("GEMINI_CASCADE_ENABLED", "false").lower() == "true"
+GEMINI_TRIAGE_MODEL = os.getenv("GEMINI_TRIAGE_MODEL", "gemini-flash-lite-latest")
+GEMINI_FULL_MODEL = os.getenv("GEMINI_FULL_MODEL", GEMINI_MODEL)
+MIN_RELEVANCE_SCORE = float(os.getenv("MIN_RELEVANCE_SCORE", "40"))
+
+# ============================================================================
+# DETECCIÓN DE CASI-DUPLICADOS (src/near_duplicate.py)
+# ============================================================================
+# NEAR_DUP_ENABLED: Buscar análisis previos de textos casi idénticos (SimHash)
+# NEAR_DUP_MAX_DISTANCE: Bits distintos tolerados entre huellas (0-3;
+#                        0 = solo cambios que no alteran la huella)
+# NEAR_DUP_MODE: reuse = reutilizar el análisis previo sin llamar a Gemini
+#                flag  = analizar igual y marcar el resultado como duplicado
+# NEAR_DUP_MIN_CHARS: Textos más cortos no se comparan (huella poco confiable)
+# ============================================================================
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "true").lower() == "true"
+NEAR_DUP_MAX_DISTANCE = int(os.getenv("NEAR_DUP_MAX_DISTANCE", "3"))
+NEAR_DUP_MODE = os.getenv("NEAR_DUP_MODE", "reuse").lower()
+NEAR_DUP_MIN_CHARS = int(os.getenv("NEAR_DUP_MIN_CHARS", "500"))
+
+# ============================================================================
+# CONFIGURACIÓN DEL CLIENTE HTTP COMPARTIDO (src/http_client.py)
+# ============================================================================
+# HTTP_POOL_CONNECTIONS: Cantidad de hosts con pool de conexiones propio
+# HTTP_POOL_MAXSIZE: Conexiones keep-alive reutilizables por host
+# HTTP_CONNECT_TIMEOUT: Timeout de conexión TCP/TLS en segundos
+# HTTP_READ_TIMEOUT: Timeout de lectura en segundos (default: SCRAPER_TIMEOUT)
+# HTTP_USER_AGENT: User-Agent único para Scraper y PortalSearchers
+# HTTP_CACHE_ENABLED: GET condicional (ETag/Last-Modified) con caché en disco
+# HTTP_CACHE_DIR: Directorio de la caché de páginas (src/page_cache.py)
+# HTML_PARSER_BACKEND: auto | lxml | html.parser (src/html_extractor.py)
+# HTTP_STREAMING: Descargas en streaming con límite de bytes y prefiltro de
+#                 triggers (páginas sin triggers no se parsean)
+# HTTP_MAX_BYTES: Máximo de bytes leídos por página (el resto se descarta)
+# HTTP_ALLOWED_CONTENT_TYPES: Tipos MIME descargados (otros se omiten)
+# HTTP_CHUNK_SIZE: Tamaño de chunk de lectura en bytes
+# ============================================================================
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "20"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "4"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", os.getenv("SCRAPER_TIMEOUT", "15")))
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() == "true"
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", "data/http_cache")
+HTML_PARSER_BACKEND = os.getenv("HTML_PARSER_BACKEND", "auto").lower()
+HTTP_STREAMING = os.getenv("HTTP_STREAMING", "true").lower() == "true"
+HTTP_MAX_BYTES = int(os.getenv("HTTP_MAX_BYTES", str(5 * 1024 * 1024)))
+HTTP_ALLOWED_CONTENT_TYPES = tuple(
+    t.strip().lower() for t in os.getenv(
+        "HTTP_ALLOWED_CONTENT_TYPES",
+        "text/html,application/xhtml+xml,text/plain,text/xml,application/xml"
+    ).split(",") if t.strip()
+)
+HTTP_CHUNK_SIZE = int(os.getenv("HTTP_CHUNK_SIZE", "65536"))
+HTTP_USER_AGENT = os.getenv(
+    "HTTP_USER_AGENT",
+    os.getenv(
+        "SCRAPER_USER_AGENT",
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+    )
+)
+
+# ============================================================================
+# RATE LIMITING ADAPTATIVO POR HOST (src/rate_limiter.py)
+# ============================================================================
+# RATE_LIMIT_ENABLED: Aplica el límite de requests/seg en el HttpClient
+# RATE_LIMIT_DEFAULT_RPS: Requests/seg de un host sin límite propio en PORTALS
+#                         (default: 1 / SCRAPER_DELAY_SECONDS)
+# RATE_LIMIT_DEFAULT_BURST: Requests seguidos permitidos sin esperar
+# RATE_LIMIT_MIN_RPS: Tasa mínima tras sucesivos 429/503
+# RATE_LIMIT_BACKOFF_FACTOR: Multiplicador de la tasa ante 429/503
+# RATE_LIMIT_RECOVERY_STEP: Requests/seg recuperados por cada respuesta sana
+# RATE_LIMIT_MAX_RETRY_AFTER: Tope (segundos) para la pausa de Retry-After
+# ============================================================================
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_DEFAULT_RPS = float(os.getenv(
+    "RATE_LIMIT_DEFAULT_RPS",
+    str(1.0 / max(float(os.getenv("SCRAPER_DELAY_SECONDS", "2")), 0.01))
+))
+RATE_LIMIT_DEFAULT_BURST = int(os.getenv("RATE_LIMIT_DEFAULT_BURST", "1"))
+RATE_LIMIT_MIN_RPS = float(os.getenv("RATE_LIMIT_MIN_RPS", "0.05"))
+RATE_LIMIT_BACKOFF_FACTOR = float(os.getenv("RATE_LIMIT_BACKOFF_FACTOR", "0.5"))
+RATE_LIMIT_RECOVERY_STEP = float(os.getenv("RATE_LIMIT_RECOVERY_STEP", "0.05"))
+RATE_LIMIT_MAX_RETRY_AFTER = float(os.getenv("RATE_LIMIT_MAX_RETRY_AFTER", "120"))
+
+# ============================================================================
+# CIRCUIT BREAKER POR PORTAL (src/circuit_breaker.py)
+# ============================================================================
+# CIRCUIT_BREAKER_ENABLED: Omitir portales caídos entre ejecuciones
+# CIRCUIT_BREAKER_FILE: Estado de salud persistido de cada portal
+# CIRCUIT_BREAKER_FAILURE_THRESHOLD: Escaneos fallidos seguidos que abren el circuito
+# CIRCUIT_BREAKER_COOLDOWN: Segundos sin consultar un portal con circuito abierto
+# CIRCUIT_BREAKER_MAX_COOLDOWN: Tope del enfriamiento (se duplica con cada
+#                               prueba fallida)
+# ============================================================================
+CIRCUIT_BREAKER_ENABLED = os.getenv("CIRCUIT_BREAKER_ENABLED", "true").lower() == "true"
+CIRCUIT_BREAKER_FILE = os.getenv("CIRCUIT_BREAKER_FILE", "data/portal_health.json")
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_BREAKER_FAILURE_THRESHOLD", "3"))
+CIRCUIT_BREAKER_COOLDOWN = float(os.getenv("CIRCUIT_BREAKER_COOLDOWN", "3600"))
+CIRCUIT_BREAKER_MAX_COOLDOWN = float(os.getenv("CIRCUIT_BREAKER_MAX_COOLDOWN", "86400"))
 
 # ============================================================================
 # PORTALS - LISTA DE PORTALES DE COMPRAS PÚBLICAS
@@ -112,6 +303,9 @@ GEMINI_METRICS_FILE = os.getenv("GEMINI_METRICS_FILE", "logs/gemini_metrics.json
 #     - search_method: Método de búsqueda (Google Dork/Direct/etc.)
 #     - enabled: True para escanear, False para omitir
 #     - notes: Notas adicionales sobre el portal
+#     - requests_per_second (opcional): Tasa máxima para el host del portal
+#     - burst (opcional): Requests seguidos permitidos para ese host
+#       (sin estos campos se usan RATE_LIMIT_DEFAULT_RPS / _BURST)
 #
 # ESTADO ACTUAL (Stage 1):
 #     Solo GROUP 1 está activo (3 portales principales de Argentina)
@@ -1020,3 +1214,56 @@ SEARCH_KEYWORDS = [
 #       "Medidor de pH"
 #     ]
 # }
+
+# ============================================================================
+# RUBRO_KEYWORDS - KEYWORDS POR RUBRO DESDE config/keywords.json
+# ============================================================================
+# OBJETIVO:
+#     Cargar las listas de keywords de los 8 rubros que migration.py genera
+#     en config/keywords.json (clave "rubros"). Las usa el matcher de
+#     keywords (src/keyword_matcher.py) junto con TRIGGERS y SEARCH_KEYWORDS.
+#
+# FORMATO:
+#     {"Rubro 1: Purificación - Ingeniería": ["Planta Potabilizadora (PTAP)", ...], ...}
+#
+# Si el archivo no existe, RUBRO_KEYWORDS queda vacío y solo se usan
+# TRIGGERS y SEARCH_KEYWORDS.
+# ============================================================================
+KEYWORDS_FILE = os.getenv(
+    "KEYWORDS_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "keywords.json")
+)
+
+RUBRO_KEYWORDS = {}
+if os.path.exists(KEYWORDS_FILE):
+    try:
+        with open(KEYWORDS_FILE, "r", encoding="utf-8") as _f:
+            RUBRO_KEYWORDS = json.load(_f).get("rubros", {}) or {}
+    except (OSError, ValueError):
+        RUBRO_KEYWORDS = {}
+
+# ============================================================================
+# SCORE LOCAL DE RELEVANCIA (src/relevance.py)
+# ============================================================================
+# OBJETIVO:
+#     Puntuar cada oportunidad (0-100) con las keywords de los rubros ANTES
+#     de enviarla a Gemini. Solo las que superan el umbral consumen API.
+#
+# RELEVANCE_GATE_ENABLED: Activar el filtro previo a Gemini
+# RELEVANCE_MIN_LOCAL_SCORE: Score local mínimo para enviar a Gemini
+# RELEVANCE_SATURATION: Suma de pesos que lleva el score a ~63 (más alto =
+#                       hacen falta más términos para un score alto)
+# RELEVANCE_BASE_TERMS: Términos del dominio que puntúan siempre, además
+#                       de las keywords de rubros (config/keywords.json)
+# ============================================================================
+RELEVANCE_GATE_ENABLED = os.getenv("RELEVANCE_GATE_ENABLED", "true").lower() == "true"
+RELEVANCE_MIN_LOCAL_SCORE = float(os.getenv("RELEVANCE_MIN_LOCAL_SCORE", "20"))
+RELEVANCE_SATURATION = float(os.getenv("RELEVANCE_SATURATION", "4"))
+RELEVANCE_BASE_TERMS = [
+    "agua potable", "tratamiento de agua", "potabilizadora", "potabilización",
+    "purificación de agua", "ósmosis inversa", "desalinización", "ablandador",
+    "efluentes", "efluente", "líquidos cloacales", "desagües cloacales",
+    "aguas residuales", "planta depuradora", "tratamiento de efluentes",
+    "barros activados", "lodos", "cloro", "cloración", "hipoclorito", "filtración",
+    "red de agua", "perforación", "cisterna", "tanque de agua", "bomba sumergible"
+]
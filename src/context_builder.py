@@ -0,0 +1,228 @@
+"""
+================================================================================
+MIA V4.0 - CONSTRUCTOR DE CONTEXTO PARA GEMINI (context_builder.py)
+================================================================================
+
+OBJETIVO GENERAL:
+    Elegir QUÉ parte de una página se envía a Gemini. Truncar a los
+    primeros 10.000 caracteres manda sobre todo menús y encabezados, y
+    cualquier trigger que aparezca más adelante nunca llega al modelo.
+
+FUNCIONAMIENTO:
+    1. Textos que entran en el presupuesto se envían completos
+    2. Se ubican todas las apariciones de las keywords detectadas
+       (matcher Aho-Corasick, posiciones válidas en el texto original)
+    3. Se toma una ventana de CONTEXT_WINDOW_CHARS alrededor de cada
+       aparición, ajustada a límites de palabra, y se fusionan las
+       ventanas superpuestas
+    4. Se descartan líneas de boilerplate (menús, cookies, copyright,
+       líneas repetidas) que no contengan keywords. Una línea corta
+       seguida de texto se conserva: es un título, no un menú
+    5. Se llena el presupuesto (CONTEXT_MAX_TOKENS): primero el inicio de
+       la página (título/objeto), luego una ventana por keyword distinta y
+       después las ventanas con más apariciones. Las ventanas elegidas se
+       envían en el orden del documento, separadas por "[...]"
+
+    Sin apariciones (ej: keywords del título del portal) se envía el
+    inicio del texto limpio hasta el presupuesto.
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Contexto por Keywords
+================================================================================
+"""
+
+import re
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+from src.keyword_matcher import matcher_for, normalize_keyword, normalize_text
+
+# Separador entre fragmentos no contiguos
+GAP_MARKER = "\n[...]\n"
+
+# Líneas típicas de navegación / pie de página (texto normalizado)
+_BOILERPLATE_RE = re.compile(
+    r'cookies?|derechos reservados|copyright|©|iniciar sesion|cerrar sesion|'
+    r'politica de privacidad|terminos y condiciones|mapa del sitio|'
+    r'seguinos|siguenos|redes sociales|newsletter|suscribite|'
+    r'ir al contenido|volver arriba|saltar al contenido'
+)
+
+# Líneas de menú: pocas palabras, sin números ni puntuación de oración,
+# en bloque con otras líneas cortas (una sola antes del texto es un título)
+_MENU_MAX_WORDS = 4
+
+# Una línea repetida esta cantidad de veces se considera plantilla del sitio
+_REPEATED_LINE_MIN = 3
+
+
+# ============================================================================
+# BOILERPLATE
+# ============================================================================
+def _boilerplate_lines(lines: List[str], keywords: Iterable[str] = ()) -> List[bool]:
+    """
+    Marca las líneas de boilerplate. Una línea con keywords nunca se descarta.
+
+    RETORNO:
+        Lista de bool alineada con lines (True = descartar)
+    """
+    normalized = [normalize_text(line).strip() for line in lines]
+    patterns = [normalize_keyword(kw) for kw in keywords or []]
+    patterns = [p for p in patterns if p]
+    repeated = Counter(line for line in normalized if line)
+    kinds = []
+    for line in normalized:
+        if not line:
+            kinds.append(None)
+        elif any(p in line for p in patterns):
+            kinds.append("content")
+        elif _BOILERPLATE_RE.search(line) or repeated[line] >= _REPEATED_LINE_MIN:
+            kinds.append("boilerplate")
+        elif len(line.split()) <= _MENU_MAX_WORDS and not re.search(r'[\d.:;]', line):
+            kinds.append("short")
+        else:
+            kinds.append("content")
+
+    # Una línea corta seguida de contenido es un título (nombre de la
+    # licitación, sección del pliego); seguida de otra línea corta o de
+    # boilerplate, un ítem de menú
+    flags = [False] * len(lines)
+    next_kind = None
+    for i in range(len(lines) - 1, -1, -1):
+        kind = kinds[i]
+        if kind is None:
+            flags[i] = True
+            continue
+        flags[i] = kind == "boilerplate" or (kind == "short" and next_kind != "content")
+        next_kind = kind
+    return flags
+
+
+def clean_text(text: str, keywords: Iterable[str] = ()) -> str:
+    """Texto sin líneas de boilerplate (se conservan las que tienen keywords)."""
+    lines = text.split('\n')
+    return '\n'.join(line for line, drop in zip(lines, _boilerplate_lines(lines, keywords)) if not drop)
+
+
+# ============================================================================
+# VENTANAS ALREDEDOR DE LAS KEYWORDS
+# ============================================================================
+def _expand_to_words(text: str, start: int, end: int) -> Tuple[int, int]:
+    """Extiende (start, end) para no cortar palabras."""
+    while start > 0 and not text[start - 1].isspace():
+        start -= 1
+    while end < len(text) and not text[end].isspace():
+        end += 1
+    return start, end
+
+
+def find_windows(text: str, keywords: Iterable[str], window_chars: int) -> List[dict]:
+    """
+    Ventanas de contexto alrededor de cada aparición de las keywords,
+    fusionadas si se superponen.
+
+    PARÁMETROS:
+        text (str): Texto completo
+        keywords (iterable): Keywords a ubicar
+        window_chars (int): Caracteres a cada lado de la aparición
+
+    RETORNO:
+        Lista de {'start', 'end', 'hits', 'keywords'} en orden del documento
+    """
+    keywords = [kw for kw in keywords or [] if kw]
+    if not keywords:
+        return []
+    match = matcher_for(keywords).search(text)
+    hits = sorted(
+        (start, end, keyword)
+        for keyword, positions in match.positions.items()
+        for start, end in positions
+    )
+
+    windows: List[dict] = []
+    for start, end, keyword in hits:
+        w_start, w_end = _expand_to_words(text, max(0, start - window_chars), min(len(text), end + window_chars))
+        if windows and w_start <= windows[-1]["end"]:
+            last = windows[-1]
+            last["end"] = max(last["end"], w_end)
+            last["hits"] += 1
+            last["keywords"].add(keyword)
+        else:
+            windows.append({"start": w_start, "end": w_end, "hits": 1, "keywords": {keyword}})
+    return windows
+
+
+# ============================================================================
+# CONSTRUCCIÓN DEL CONTEXTO
+# ============================================================================
+def build_context(text: str, keywords: Optional[Iterable[str]] = None,
+                  window_chars: Optional[int] = None, max_chars: Optional[int] = None,
+                  head_chars: Optional[int] = None) -> str:
+    """
+    Construye el texto que se envía a Gemini para una oportunidad.
+
+    PARÁMETROS (default: config.py):
+        text (str): Texto completo de la página
+        keywords (iterable): Triggers detectados (matched_keywords)
+        window_chars (int): Contexto a cada lado de una aparición
+                            (CONTEXT_WINDOW_CHARS)
+        max_chars (int): Presupuesto en caracteres
+                         (CONTEXT_MAX_TOKENS x 4 caracteres por token)
+        head_chars (int): Caracteres del inicio de la página que se
+                          incluyen siempre (CONTEXT_HEAD_CHARS)
+
+    RETORNO:
+        str: Contexto de a lo sumo max_chars caracteres
+    """
+    from src.config import CONTEXT_WINDOW_CHARS, CONTEXT_MAX_TOKENS, CONTEXT_HEAD_CHARS
+    window_chars = CONTEXT_WINDOW_CHARS if window_chars is None else window_chars
+    max_chars = CONTEXT_MAX_TOKENS * 4 if max_chars is None else max_chars
+    head_chars = CONTEXT_HEAD_CHARS if head_chars is None else head_chars
+
+    text = text or ""
+    if len(text) <= max_chars:
+        return text
+
+    keywords = list(keywords or [])
+    windows = find_windows(text, keywords, window_chars)
+    if not windows:
+        return clean_text(text, keywords)[:max_chars]
+
+    # Fragmentos limpios: inicio de la página + una entrada por ventana
+    head_end = _expand_to_words(text, 0, head_chars)[1] if head_chars else 0
+    head = clean_text(text[:head_end], keywords) if head_end else ""
+    fragments = []
+    for window in windows:
+        start = max(window["start"], head_end)
+        if start >= window["end"]:
+            continue  # Ventana contenida en el inicio
+        fragment = clean_text(text[start:window["end"]], keywords)
+        if fragment:
+            fragments.append({**window, "start": start, "text": fragment})
+
+    # Prioridad: una ventana por keyword no vista, luego más apariciones
+    budget = max_chars - len(head)
+    selected, seen = [], set()
+    for fragment in sorted(fragments, key=lambda f: (-len(f["keywords"]), -f["hits"], f["start"])):
+        if fragment["keywords"] - seen:
+            selected.append(fragment)
+            seen |= fragment["keywords"]
+    for fragment in sorted(fragments, key=lambda f: (-f["hits"], f["start"])):
+        if fragment not in selected:
+            selected.append(fragment)
+
+    chosen = []
+    for fragment in selected:
+        cost = len(fragment["text"]) + len(GAP_MARKER)
+        if cost <= budget:
+            chosen.append(fragment)
+            budget -= cost
+        elif not chosen and budget > len(GAP_MARKER):
+            # Ni la primera ventana entra completa: recortarla al presupuesto
+            chosen.append({**fragment, "text": fragment["text"][:budget - len(GAP_MARKER)]})
+            budget = 0
+    chosen.sort(key=lambda f: f["start"])
+
+    parts = [head] if head else []
+    parts.extend(fragment["text"] for fragment in chosen)
+    return GAP_MARKER.join(parts)[:max_chars]
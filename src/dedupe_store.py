@@ -0,0 +1,315 @@
+"""
+================================================================================
+MIA V4.0 - ÍNDICE PERSISTENTE DE OPORTUNIDADES PROCESADAS (dedupe_store.py)
+================================================================================
+
+OBJETIVO GENERAL:
+    Detectar duplicados entre ejecuciones sin leer todo results_stage1.csv
+    al iniciar, y sin confundir "misma URL" con "misma oportunidad".
+
+CLAVE DE UNA OPORTUNIDAD (item_key):
+    portal + N° de licitación (numero_licitacion), o portal + URL si el
+    portal no informa un número. La URL sola no alcanza: los buscadores
+    del grupo 1 y Scraper.scan_portal reportan siempre la página del
+    portal, y AySA usa una URL de listado compartida cuando la fila no
+    tiene link de detalle.
+
+HASH DE CONTENIDO (content_hash):
+    sha256 del texto normalizado (minúsculas, espacios colapsados, sin
+    horas hh:mm[:ss]). Una clave ya vista con otro hash es un CAMBIO
+    (nuevo estado de la licitación, página con otras publicaciones) y
+    pasa; solo se descarta lo que no cambió. El hash nuevo reemplaza al
+    anterior (upsert).
+
+FUNCIONAMIENTO:
+    1. Las claves se guardan en SQLite (clave primaria indexada): cada
+       consulta es una búsqueda en el índice, sin cargar el historial en
+       memoria
+    2. El índice recuerda hasta qué byte del CSV ya leyó. Al iniciar solo
+       se leen las filas agregadas después (por MIA o a mano); si el CSV
+       no cambió no se lee nada
+    3. Si el CSV se achicó, se reemplazó o se borró, el índice se
+       reconstruye desde el CSV (el CSV es la fuente de verdad: columnas
+       Portal, MIA_ID_Licitacion, MIA_URL y MIA_Hash_Contenido)
+    4. Las claves de Google Sheets se agregan al iniciar (sheets_sink.py)
+
+CARACTERÍSTICAS:
+    - SQLite en modo WAL, una conexión por thread (como analysis_cache.py)
+    - Tabla WITHOUT ROWID: la clave es la clave primaria, sin índice extra
+    - ':memory:' como db_path: índice temporal (fallback de SheetsManager)
+
+USO:
+    store = DedupeStore("results_stage1.dedupe.db", csv_path="results_stage1.csv")
+    key, digest = opportunity_identity(op)      # o row_identity(fila)
+    store.status(key, digest)      # 'new' / 'changed' / 'unchanged'
+    store.add(key, digest)
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Índice de Duplicados
+================================================================================
+"""
+
+import csv
+import hashlib
+import io
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# Versión del formato de las claves: si cambia, el índice se reconstruye
+_KEY_VERSION = "2"
+
+# Bytes del CSV (antes de la posición leída) que identifican el archivo
+_TAIL_BYTES = 64
+
+# Filas por INSERT al reconstruir desde el CSV
+_BATCH_SIZE = 5000
+
+# Horas del día en el texto (relojes y "actualizado a las ..." de los portales)
+_TIME_RE = re.compile(r'\b\d{1,2}:\d{2}(?::\d{2})?\b')
+_SPACES_RE = re.compile(r'\s+')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen_items (
+    key TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL DEFAULT '',
+    source TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dedupe_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Un hash vacío (fila de un CSV viejo, sin MIA_Hash_Contenido) no borra el conocido
+_UPSERT = ("INSERT INTO seen_items (key, content_hash, source) VALUES (?, ?, ?) "
+           "ON CONFLICT(key) DO UPDATE SET source = excluded.source, content_hash = "
+           "CASE WHEN excluded.content_hash != '' THEN excluded.content_hash ELSE seen_items.content_hash END")
+
+
+# ============================================================================
+# CLAVES Y HASH DE CONTENIDO
+# ============================================================================
+def item_key(portal: Optional[str], url: Optional[str] = None, tender_id: Optional[str] = None) -> str:
+    """
+    Clave de una oportunidad: portal + N° de licitación, o portal + URL.
+
+    RETORNO:
+        str: Clave ('' si no hay ni número ni URL)
+    """
+    portal = (portal or '').strip().casefold()
+    tender_id = _SPACES_RE.sub(' ', str(tender_id or '')).strip().casefold()
+    if tender_id:
+        return f"{portal}|id:{tender_id}"
+    url = (url or '').strip()
+    return f"{portal}|url:{url}" if url else ''
+
+
+def content_hash(text: Optional[str]) -> str:
+    """
+    Hash del texto normalizado ('' si no hay texto).
+
+    NORMALIZACIÓN:
+        minúsculas, sin horas hh:mm[:ss], espacios colapsados
+    """
+    if not text:
+        return ''
+    normalized = _SPACES_RE.sub(' ', _TIME_RE.sub(' ', str(text).casefold())).strip()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:32]
+
+
+def opportunity_identity(op: Dict[str, Any]) -> Tuple[str, str]:
+    """(clave, hash) de una oportunidad del scraper (antes del análisis)."""
+    key = item_key(op.get('portal'), op.get('url'), op.get('numero_licitacion'))
+    return key, content_hash(op.get('full_text') or op.get('content_snippet'))
+
+
+def row_identity(row: Dict[str, Any]) -> Tuple[str, str]:
+    """(clave, hash) de una fila de salida (columnas de SheetsManager)."""
+    key = item_key(row.get('Portal'), row.get('MIA_URL'), row.get('MIA_ID_Licitacion'))
+    return key, str(row.get('MIA_Hash_Contenido') or '')
+
+
+# ============================================================================
+# CLASE DEDUPESTORE
+# ============================================================================
+class DedupeStore:
+    """
+    Índice persistente clave -> hash de las oportunidades ya escritas.
+
+    Reemplaza el set de URLs en memoria de SheetsManager.
+    """
+
+    def __init__(self, db_path: str, csv_path: Optional[str] = None):
+        """
+        PARÁMETROS:
+            db_path (str): Archivo SQLite del índice
+            csv_path (str): CSV de resultados a mantener sincronizado
+        """
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        self.csv_path = csv_path
+        self._local = threading.local()
+
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+
+        # Filas del CSV leídas en la última sincronización
+        self.synced_rows = self.sync_csv() if csv_path else 0
+
+    # ========================================================================
+    # CONEXIÓN
+    # ========================================================================
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión SQLite del thread actual (se crea en el primer uso)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def close(self) -> None:
+        """Cierra la conexión del thread actual."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ========================================================================
+    # CONSULTA Y REGISTRO
+    # ========================================================================
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM seen_items").fetchone()[0]
+
+    def status(self, key: str, digest: str = '') -> str:
+        """
+        Estado de una oportunidad respecto de lo ya escrito.
+
+        RETORNO:
+            'new' (clave no vista), 'changed' (vista con otro contenido) o
+            'unchanged'. Sin hash (filas viejas o sin texto) la clave basta
+        """
+        if not key:
+            return 'new'
+        row = self._connection().execute(
+            "SELECT content_hash FROM seen_items WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return 'new'
+        return 'changed' if digest and row[0] != digest else 'unchanged'
+
+    def add(self, key: str, digest: str = '', source: str = "mia") -> None:
+        """Registra una oportunidad (upsert: el hash nuevo reemplaza al anterior)."""
+        if not key:
+            return
+        conn = self._connection()
+        with conn:
+            conn.execute(_UPSERT, (key, digest or '', source))
+
+    def update(self, items: Iterable[Tuple[str, str]], source: str = "mia") -> None:
+        """Registra varias (clave, hash) en una transacción."""
+        self._upsert(self._connection(), [(key, digest or '', source) for key, digest in items if key])
+
+    # ========================================================================
+    # SINCRONIZACIÓN CON EL CSV
+    # ========================================================================
+    def _meta(self, conn: sqlite3.Connection, key: str) -> Optional[str]:
+        row = conn.execute("SELECT value FROM dedupe_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _upsert(conn: sqlite3.Connection, rows) -> None:
+        """Upsert de (clave, hash, origen) en una transacción."""
+        if rows:
+            with conn:
+                conn.executemany(_UPSERT, rows)
+
+    @staticmethod
+    def _clear(conn: sqlite3.Connection) -> None:
+        """Vacía el índice (se reconstruye desde el CSV)."""
+        with conn:
+            conn.execute("DELETE FROM seen_items")
+            conn.execute("DELETE FROM dedupe_meta")
+
+    @staticmethod
+    def _tail(f, offset: int) -> str:
+        """Últimos bytes antes de offset (identifican el contenido ya leído)."""
+        start = max(0, offset - _TAIL_BYTES)
+        f.seek(start)
+        return f.read(offset - start).hex()
+
+    def sync_csv(self) -> int:
+        """
+        Agrega al índice las filas del CSV que todavía no leyó.
+
+        PROCESO:
+            1. Si el CSV es el mismo y no creció: nada que leer
+            2. Si creció: lee desde el último byte leído
+            3. Si se achicó, cambió lo ya leído, no existe o cambió el
+               formato de las claves: reconstruye
+            4. Las filas se aplican en orden: el último estado de cada
+               clave queda en el índice
+
+        RETORNO:
+            int: Filas del CSV leídas
+        """
+        conn = self._connection()
+        path = os.path.abspath(self.csv_path)
+        offset = int(self._meta(conn, "csv_offset") or 0)
+        same_file = (self._meta(conn, "csv_path") == path
+                     and self._meta(conn, "key_version") == _KEY_VERSION)
+
+        if not os.path.exists(self.csv_path):
+            if offset:
+                self.logger.info("CSV de resultados no encontrado: se vacía el índice de duplicados")
+                self._clear(conn)
+            return 0
+
+        with open(self.csv_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if same_file and offset and offset <= size and self._tail(f, offset) == self._meta(conn, "csv_tail"):
+                if offset == size:
+                    return 0
+                start = offset
+            else:
+                start = 0
+                if offset or not same_file:
+                    self.logger.info("El CSV de resultados cambió: reconstruyendo índice de duplicados")
+                    self._clear(conn)
+
+            # El encabezado no tiene saltos de línea: basta la primera línea
+            f.seek(0)
+            header = next(csv.reader([f.readline().decode('utf-8-sig')]), None)
+            if not header or 'MIA_URL' not in header:
+                return 0
+            f.seek(max(start, f.tell()))
+
+            # csv.reader sobre el resto del archivo (celdas con saltos de línea)
+            text = io.TextIOWrapper(f, encoding='utf-8', newline='')
+            rows, batch = 0, []
+            for values in csv.reader(text):
+                rows += 1
+                key, digest = row_identity(dict(zip(header, values)))
+                if key:
+                    batch.append((key, digest, "csv"))
+                if len(batch) >= _BATCH_SIZE:
+                    self._upsert(conn, batch)
+                    batch = []
+            text.detach()   # Sin cerrar f
+            end = f.tell()
+            self._upsert(conn, batch)
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO dedupe_meta (key, value) VALUES (?, ?)", [
+                    ("csv_path", path), ("csv_offset", str(end)), ("csv_tail", self._tail(f, end)),
+                    ("key_version", _KEY_VERSION)
+                ])
+
+        self.logger.info(f"Índice de duplicados: {rows} filas nuevas leídas del CSV")
+        return rows
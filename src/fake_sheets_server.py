@@ -0,0 +1,161 @@
+"""
+================================================================================
+MIA V4.0 - SERVIDOR FALSO DE GOOGLE SHEETS (fake_sheets_server.py)
+================================================================================
+
+OBJETIVO GENERAL:
+    Probar la salida a Google Sheets (sheets_sink.py) sin red ni
+    credenciales: un servidor HTTP local, en un thread, que implementa los
+    dos endpoints REST que usa MIA y simula la cuota de la API.
+
+ENDPOINTS:
+    GET  /v4/spreadsheets/{id}/values/{hoja}            -> {"values": [...]}
+    POST /v4/spreadsheets/{id}/values/{hoja}!A1:append  -> agrega filas
+
+CUOTA SIMULADA:
+    Con quota_per_window=N, más de N requests en window_seconds reciben
+    429 RESOURCE_EXHAUSTED (con Retry-After si se configura), como la
+    cuota "requests por minuto por usuario" de Sheets.
+
+USO:
+    with FakeSheetsServer(quota_per_window=2, window_seconds=0.5) as server:
+        sink = GoogleSheetsSink(requests.Session(), "test", api_url=server.url)
+        ...
+        server.rows("test", "Oportunidades")   # Filas escritas
+        server.requests                        # [(método, ruta, estado)]
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Google Sheets por Lotes
+================================================================================
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+
+class FakeSheetsServer:
+    """Servidor local con los endpoints values.get / values.append de Sheets."""
+
+    def __init__(self, quota_per_window: int = 0, window_seconds: float = 60.0,
+                 retry_after: Optional[float] = None):
+        """
+        PARÁMETROS:
+            quota_per_window (int): Requests permitidos por ventana (0 = sin cuota)
+            window_seconds (float): Duración de la ventana de cuota
+            retry_after (float): Valor del header Retry-After en los 429
+        """
+        self.quota_per_window = quota_per_window
+        self.window_seconds = window_seconds
+        self.retry_after = retry_after
+        self.sheets: Dict[Tuple[str, str], List[List[Any]]] = {}
+        self.requests: List[Tuple[str, str, int]] = []
+        self._window: List[float] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeSheetsServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeSheetsServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def rows(self, spreadsheet_id: str, worksheet: str) -> List[List[Any]]:
+        """Filas de una hoja (incluye el encabezado)."""
+        with self._lock:
+            return [list(row) for row in self.sheets.get((spreadsheet_id, worksheet), [])]
+
+    def count(self, method: str, status: int = 200) -> int:
+        """Requests recibidos con ese método y estado."""
+        with self._lock:
+            return sum(1 for m, _, s in self.requests if m == method and s == status)
+
+    # ========================================================================
+    # MANEJO DE REQUESTS
+    # ========================================================================
+    def _throttled(self) -> bool:
+        """True si el request supera la cuota de la ventana actual."""
+        if not self.quota_per_window:
+            return False
+        now = time.monotonic()
+        self._window = [t for t in self._window if now - t < self.window_seconds]
+        if len(self._window) >= self.quota_per_window:
+            return True
+        self._window.append(now)
+        return False
+
+    def _handle(self, method: str, path: str, body: Optional[Dict[str, Any]]) -> Tuple[int, Dict[str, Any]]:
+        parts = path.split('/')
+        # ['', 'v4', 'spreadsheets', id, 'values', rango]
+        if len(parts) != 6 or parts[1:3] != ['v4', 'spreadsheets'] or parts[4] != 'values':
+            return 404, {"error": {"code": 404, "status": "NOT_FOUND"}}
+        spreadsheet_id, range_ = unquote(parts[3]), unquote(parts[5])
+        append = range_.endswith(':append')
+        worksheet = range_[:-len(':append')] if append else range_
+        worksheet = worksheet.split('!', 1)[0]
+
+        with self._lock:
+            if self._throttled():
+                return 429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED",
+                                       "message": "Quota exceeded for quota metric 'Write requests'"}}
+            sheet = self.sheets.setdefault((spreadsheet_id, worksheet), [])
+            if method == "GET" and not append:
+                return 200, {"range": worksheet, "majorDimension": "ROWS", "values": [list(r) for r in sheet]}
+            if method == "POST" and append:
+                values = (body or {}).get("values") or []
+                start = len(sheet) + 1
+                sheet.extend(list(row) for row in values)
+                return 200, {"spreadsheetId": spreadsheet_id, "updates": {
+                    "updatedRange": f"{worksheet}!A{start}:Z{len(sheet)}", "updatedRows": len(values)}}
+        return 400, {"error": {"code": 400, "status": "INVALID_ARGUMENT"}}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self, method: str) -> None:
+                path = urlsplit(self.path).path
+                body = None
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    body = json.loads(self.rfile.read(length).decode('utf-8'))
+                status, payload = server._handle(method, path, body)
+                with server._lock:
+                    server.requests.append((method, path, status))
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                if status == 429 and server.retry_after is not None:
+                    self.send_header('Retry-After', str(server.retry_after))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+            def log_message(self, format, *args):
+                pass   # Sin salida por consola en los tests
+
+        return Handler
@@ -0,0 +1,258 @@
+"""
+================================================================================
+MIA V4.0 - CLIENTE DE GEMINI CON CUOTA RPM/TPM (gemini_client.py)
+================================================================================
+
+OBJETIVO GENERAL:
+    Programar las llamadas a Gemini para quedar dentro de la cuota del
+    proyecto (requests y tokens por minuto) en lugar de detectar el rate
+    limit buscando 'quota' o '429' en el texto del error y dormir 2^n
+    segundos a ciegas en cada worker.
+
+FUNCIONAMIENTO:
+    1. Dos baldes de tokens (rate_limiter.TokenBucket) compartidos por
+       todos los workers: uno de requests (GEMINI_REQUESTS_PER_MINUTE) y
+       otro de tokens (GEMINI_TOKENS_PER_MINUTE). Antes de cada llamada se
+       reserva 1 request + los tokens estimados del prompt
+    2. Con la respuesta, los tokens reales (usage_metadata, incluye la
+       salida) corrigen la reserva: el exceso se descuenta del balde
+    3. Los errores se clasifican por tipo de excepción de google.api_core:
+       - quota (429 / ResourceExhausted): se respeta la pista del servidor
+         (RetryInfo / "retry in Ns" / Retry-After) y se pausa a TODOS los
+         workers hasta ese momento, sin ráfagas contra la cuota agotada
+       - transient (503, 500, 504, red): reintento con backoff del worker
+       - fatal (400, 403, 404, respuesta bloqueada): sin reintento
+    4. Lotes grandes avanzan a la tasa que permite la cuota, sin alternar
+       ráfagas y esperas fijas
+
+USO:
+    client = GeminiClient()
+    response, latency_ms = client.generate(model, prompt, estimated_tokens=900)
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Cuota de Gemini
+================================================================================
+"""
+
+import logging
+import re
+import threading
+import time
+from typing import Any, Optional, Tuple
+
+from google.api_core import exceptions as api_exceptions
+
+from src.rate_limiter import TokenBucket, parse_retry_after
+
+# Pista de espera en el mensaje de error ("Please retry in 27.5s",
+# "retry_delay { seconds: 27 }")
+_RETRY_IN_RE = re.compile(r'retry in\s+([\d.]+)\s*(ms|s)\b', re.IGNORECASE)
+_RETRY_DELAY_RE = re.compile(r'retry_delay\s*\{\s*seconds:\s*(\d+)', re.IGNORECASE)
+
+_QUOTA_ERRORS = (api_exceptions.TooManyRequests, api_exceptions.ResourceExhausted)
+_TRANSIENT_ERRORS = (
+    api_exceptions.ServiceUnavailable, api_exceptions.InternalServerError,
+    api_exceptions.DeadlineExceeded, api_exceptions.GatewayTimeout,
+    api_exceptions.BadGateway, api_exceptions.Aborted,
+    ConnectionError, TimeoutError
+)
+_FATAL_ERRORS = (
+    api_exceptions.InvalidArgument, api_exceptions.PermissionDenied,
+    api_exceptions.Unauthenticated, api_exceptions.NotFound,
+    api_exceptions.FailedPrecondition,
+    ValueError   # response.text de una respuesta bloqueada: reenviar da lo mismo
+)
+
+
+# ============================================================================
+# CLASIFICACIÓN DE ERRORES
+# ============================================================================
+def classify_error(error: BaseException) -> str:
+    """
+    Tipo de error de una llamada a Gemini.
+
+    RETORNO:
+        'quota', 'transient' o 'fatal'. Errores desconocidos se consideran
+        'transient' (se reintentan, como antes)
+    """
+    if isinstance(error, _QUOTA_ERRORS):
+        return "quota"
+    if isinstance(error, _TRANSIENT_ERRORS):
+        return "transient"
+    if isinstance(error, _FATAL_ERRORS):
+        return "fatal"
+    return "transient"
+
+
+def retry_hint(error: BaseException) -> Optional[float]:
+    """
+    Segundos de espera que sugiere el servidor, si los informa.
+
+    FUENTES (en orden):
+        RetryInfo en error.details, header Retry-After de error.response,
+        texto del mensaje
+    """
+    for detail in getattr(error, 'details', None) or []:
+        delay = getattr(detail, 'retry_delay', None)
+        if delay is not None and hasattr(delay, 'seconds'):
+            return delay.seconds + getattr(delay, 'nanos', 0) / 1e9
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers:
+        seconds = parse_retry_after(headers.get('Retry-After'))
+        if seconds is not None:
+            return seconds
+    message = str(error)
+    match = _RETRY_IN_RE.search(message)
+    if match:
+        value = float(match.group(1))
+        return value / 1000 if match.group(2).lower() == 'ms' else value
+    match = _RETRY_DELAY_RE.search(message)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+# ============================================================================
+# CLASE GEMINICLIENT
+# ============================================================================
+class GeminiClient:
+    """
+    Envía prompts a Gemini dentro de la cuota RPM/TPM, compartida entre threads.
+
+    RESPONSABILIDADES:
+        - Reservar requests y tokens antes de cada llamada
+        - Corregir la reserva con los tokens reales de la respuesta
+        - Pausar a todos los workers ante un 429 (con la pista del servidor)
+        - Reintentar errores transitorios; no reintentar errores fatales
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None,
+                 max_attempts: Optional[int] = None, burst: Optional[int] = None):
+        """
+        PARÁMETROS (default: config.py):
+            requests_per_minute (float): GEMINI_REQUESTS_PER_MINUTE (0 = sin límite)
+            tokens_per_minute (float): GEMINI_TOKENS_PER_MINUTE (0 = sin límite)
+            max_attempts (int): Intentos por llamada (GEMINI_RETRY_ATTEMPTS)
+            burst (int): Requests seguidos permitidos (GEMINI_MAX_CONCURRENCY)
+        """
+        from src.config import (
+            GEMINI_REQUESTS_PER_MINUTE, GEMINI_TOKENS_PER_MINUTE,
+            GEMINI_RETRY_ATTEMPTS, GEMINI_MAX_CONCURRENCY
+        )
+        self.logger = logging.getLogger(__name__)
+        rpm = GEMINI_REQUESTS_PER_MINUTE if requests_per_minute is None else requests_per_minute
+        tpm = GEMINI_TOKENS_PER_MINUTE if tokens_per_minute is None else tokens_per_minute
+        self.max_attempts = max(1, max_attempts or GEMINI_RETRY_ATTEMPTS)
+
+        self.request_bucket = TokenBucket(rpm / 60, capacity=burst or GEMINI_MAX_CONCURRENCY) if rpm > 0 else None
+        # La cuota de tokens es por minuto: se permite usarla toda de una vez
+        self.token_bucket = TokenBucket(tpm / 60, capacity=tpm) if tpm > 0 else None
+
+        self._lock = threading.Lock()
+        self._resume_at = 0.0      # Pausa global tras un 429 (time.monotonic)
+        self.stats = {"calls": 0, "quota_errors": 0, "transient_errors": 0, "waited_s": 0.0}
+
+    # ========================================================================
+    # PROGRAMACIÓN DE LLAMADAS
+    # ========================================================================
+    def _wait_pause(self) -> float:
+        """Espera a que termine la pausa global. Retorna los segundos esperados."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                pause = self._resume_at - time.monotonic()
+            if pause <= 0:
+                return waited
+            time.sleep(pause)
+            waited += pause
+
+    def _wait_turn(self, estimated_tokens: int) -> float:
+        """Espera la pausa global y la cuota. Retorna los segundos esperados."""
+        waited = self._wait_pause()
+        if self.request_bucket is not None:
+            waited += self.request_bucket.acquire()
+        if self.token_bucket is not None and estimated_tokens > 0:
+            waited += self.token_bucket.acquire(min(estimated_tokens, self.token_bucket.capacity))
+        # Un 429 de otro worker pudo pausar mientras se esperaba la cuota
+        return waited + self._wait_pause()
+
+    def _pause_all(self, seconds: float) -> None:
+        """
+        Registra un 429 y pausa a todos los workers `seconds` segundos (no
+        acorta una pausa mayor). El contador y la pausa se actualizan bajo
+        el mismo lock que consulta _wait_pause: un 429 contado ya está pausando.
+        """
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+            self.stats["quota_errors"] += 1
+        if self.request_bucket is not None:
+            self.request_bucket.drain()   # Al reanudar no sale una ráfaga
+
+    def _settle_tokens(self, response: Any, estimated_tokens: int) -> None:
+        """Descuenta del balde los tokens reales que superaron la estimación."""
+        if self.token_bucket is None:
+            return
+        meta = getattr(response, 'usage_metadata', None)
+        actual = getattr(meta, 'total_token_count', None)
+        if actual is None:
+            prompt_tokens = getattr(meta, 'prompt_token_count', None)
+            if prompt_tokens is None:
+                return
+            actual = prompt_tokens + (getattr(meta, 'candidates_token_count', 0) or 0)
+        extra = actual - min(estimated_tokens, self.token_bucket.capacity)
+        if extra > 0:
+            self.token_bucket.reserve(extra)   # Sin esperar: lo paga el próximo
+
+    # ========================================================================
+    # LLAMADA
+    # ========================================================================
+    def generate(self, model: Any, prompt: str, estimated_tokens: int = 0,
+                 **kwargs) -> Tuple[Any, float]:
+        """
+        Llama a model.generate_content dentro de la cuota, con reintentos.
+
+        PARÁMETROS:
+            model: genai.GenerativeModel (o compatible)
+            prompt (str): Prompt completo
+            estimated_tokens (int): Tokens estimados del prompt (balde TPM)
+            **kwargs: Argumentos de generate_content (ej: generation_config)
+
+        RETORNO:
+            (respuesta, latencia_ms de la llamada exitosa)
+
+        EXCEPCIONES:
+            La última excepción si se agotan los intentos o el error es fatal
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            waited = self._wait_turn(estimated_tokens)
+            with self._lock:
+                self.stats["waited_s"] += waited
+            start = time.perf_counter()
+            try:
+                response = model.generate_content(prompt, **kwargs)
+            except Exception as e:
+                kind = classify_error(e)
+                if kind == "fatal" or attempt == self.max_attempts:
+                    raise
+                hint = retry_hint(e)
+                backoff = 2 ** (attempt - 1)
+                if kind == "quota":
+                    delay = hint if hint is not None else backoff
+                    self._pause_all(delay)   # Antes de loguear: cada instrucción es una ventana
+                    self.logger.warning(f"Cuota de Gemini agotada: pausa de {delay:.1f}s para todos "
+                                        f"los workers (intento {attempt}/{self.max_attempts})")
+                else:
+                    delay = max(hint or 0.0, backoff)
+                    with self._lock:
+                        self.stats["transient_errors"] += 1
+                    self.logger.warning(f"Error transitorio de Gemini ({type(e).__name__}: {e}). "
+                                        f"Reintentando en {delay:.1f}s (intento {attempt}/{self.max_attempts})")
+                    time.sleep(delay)
+                continue
+            latency_ms = (time.perf_counter() - start) * 1000
+            self._settle_tokens(response, estimated_tokens)
+            with self._lock:
+                self.stats["calls"] += 1
+            return response, latency_ms
@@ -0,0 +1,281 @@
+"""
+================================================================================
+MIA V4.0 - EXTRACCIÓN DE TEXTO HTML (html_extractor.py)
+================================================================================
+
+OBJETIVO GENERAL:
+    Parsear cada documento HTML UNA sola vez y producir su texto limpio
+    una única vez, para que el matching de keywords, el content_snippet y
+    el full_text reutilicen el mismo string.
+
+FUNCIONAMIENTO:
+    1. Parseo con un backend rápido configurable (lxml por defecto,
+       BeautifulSoup html.parser como alternativa)
+    2. Eliminación de <script>, <style>, <noscript> y <template>
+    3. Opcional: restringir el texto a ciertos nodos (ej: "table", "main")
+    4. Normalización de espacios en blanco (sin líneas vacías repetidas) y
+       Unicode NFC (letra + acento combinante -> un carácter), para que el
+       matcher de keywords encuentre "licitacio\u0301n" como "licitación"
+    5. HtmlTextStream: versión incremental y aproximada para descargas en
+       streaming (quita tags y entidades chunk a chunk, sin construir árbol)
+
+CONFIGURACIÓN:
+    HTML_PARSER_BACKEND: auto | lxml | html.parser
+        auto = lxml si está instalado, si no html.parser
+
+USO:
+    from src.html_extractor import extract_response
+    doc = extract_response(resp)
+    doc.text         # Texto limpio completo
+    doc.snippet(5000)
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Extracción HTML
+================================================================================
+"""
+
+import html
+import logging
+import re
+import unicodedata
+from typing import Iterable, Optional, Union
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+    LXML_AVAILABLE = True
+except ImportError:  # pragma: no cover - depende del entorno
+    LXML_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Elementos cuyo contenido no es texto visible
+_NON_TEXT_TAGS = ('script', 'style', 'noscript', 'template')
+
+_INLINE_SPACE_RE = re.compile(r'[ \t\r\f\v\xa0]+')
+_NEWLINES_RE = re.compile(r' ?\n[\s]*')
+# Un '<' abre un tag solo si lo sigue un nombre, '/', '!' o '?' (como en
+# los parsers HTML); "monto < 100" es texto
+_TAG_RE = re.compile(r'<[A-Za-z/!?][^>]*>')
+_TAG_START_RE = re.compile(r'[A-Za-z/!?]')
+_ANY_SPACE_RE = re.compile(r'\s+')
+
+# Máximo de caracteres retenidos esperando el cierre de un tag o entidad
+_MAX_CARRY = 4096
+_MAX_ENTITY = 12
+
+
+# ============================================================================
+# DOCUMENTO EXTRAÍDO
+# ============================================================================
+class ExtractedDocument:
+    """
+    Resultado de la extracción de un documento HTML.
+
+    ATRIBUTOS:
+        text (str): Texto visible normalizado (espacios colapsados)
+        title (str): Contenido de <title> si existe
+        backend (str): Backend de parseo utilizado
+    """
+
+    def __init__(self, text: str, title: Optional[str] = None, backend: Optional[str] = None):
+        self.text = text
+        self.title = title
+        self.backend = backend
+
+    def snippet(self, length: int) -> str:
+        """Primeros `length` caracteres del texto."""
+        return self.text[:length].strip()
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+
+# ============================================================================
+# FUNCIONES DE EXTRACCIÓN
+# ============================================================================
+def normalize_whitespace(text: str) -> str:
+    """Colapsa espacios y líneas vacías repetidas; el resultado queda en NFC."""
+    text = _INLINE_SPACE_RE.sub(' ', unicodedata.normalize('NFC', text))
+    return _NEWLINES_RE.sub('\n', text).strip()
+
+
+def resolve_backend(backend: Optional[str] = None) -> str:
+    """
+    Resuelve el backend de parseo a usar.
+
+    RETORNO:
+        'lxml' o 'html.parser'
+    """
+    if backend is None:
+        from src.config import HTML_PARSER_BACKEND
+        backend = HTML_PARSER_BACKEND
+    backend = (backend or 'auto').lower()
+    if backend in ('auto', 'lxml'):
+        if LXML_AVAILABLE:
+            return 'lxml'
+        if backend == 'lxml':
+            logger.warning("lxml no está instalado, se usa html.parser")
+    return 'html.parser'
+
+
+def extract_document(markup: Union[str, bytes], encoding: Optional[str] = None,
+                     only_tags: Optional[Iterable[str]] = None,
+                     backend: Optional[str] = None) -> ExtractedDocument:
+    """
+    Parsea un documento HTML una vez y extrae su texto visible.
+
+    PARÁMETROS:
+        markup (str|bytes): HTML del documento
+        encoding (str): Codificación de markup si es bytes (None = detectar)
+        only_tags (iterable): Si se indica, solo se extrae el texto de esos
+                              nodos (ej: ['table']). Si no hay ninguno en el
+                              documento, se usa el documento completo.
+        backend (str): 'auto', 'lxml' o 'html.parser' (default: config)
+
+    RETORNO:
+        ExtractedDocument
+    """
+    backend = resolve_backend(backend)
+    only_tags = tuple(only_tags) if only_tags else ()
+    if not markup:
+        return ExtractedDocument('', backend=backend)
+
+    if backend == 'lxml':
+        return _extract_lxml(markup, encoding, only_tags)
+    return _extract_soup(markup, encoding, only_tags)
+
+
+def extract_response(response, only_tags: Optional[Iterable[str]] = None,
+                     backend: Optional[str] = None) -> ExtractedDocument:
+    """
+    Extrae el texto de un requests.Response.
+
+    Solo usa la codificación del response si el servidor la declaró en
+    Content-Type; si no, el parser la detecta desde <meta charset>.
+    """
+    content_type = response.headers.get('Content-Type', '') if response.headers else ''
+    encoding = response.encoding if 'charset=' in content_type.lower() else None
+    return extract_document(response.content, encoding=encoding, only_tags=only_tags, backend=backend)
+
+
+def _extract_lxml(markup, encoding, only_tags) -> ExtractedDocument:
+    """Extracción con lxml (parser en C, sin árbol de objetos Python)."""
+    if isinstance(markup, str):
+        markup = markup.encode('utf-8')
+        encoding = 'utf-8'
+    parser = lxml_html.HTMLParser(encoding=encoding, remove_comments=True, remove_pis=True)
+    try:
+        root = lxml_html.document_fromstring(markup, parser=parser)
+    except (etree.ParserError, ValueError):
+        return ExtractedDocument('', backend='lxml')
+
+    etree.strip_elements(root, *_NON_TEXT_TAGS, with_tail=False)
+
+    title_el = root.find('.//title')
+    title = normalize_whitespace(title_el.text_content()) if title_el is not None else None
+
+    nodes = [root]
+    if only_tags:
+        selected = [el for el in root.iter(*only_tags)]
+        selected_set = set(selected)
+        # Evitar duplicar texto de nodos anidados dentro de otros seleccionados
+        nodes = [
+            el for el in selected
+            if not any(anc in selected_set for anc in el.iterancestors())
+        ] or [root]
+
+    text = '\n'.join(''.join(node.itertext()) for node in nodes)
+    return ExtractedDocument(normalize_whitespace(text), title=title, backend='lxml')
+
+
+def _extract_soup(markup, encoding, only_tags) -> ExtractedDocument:
+    """Extracción con BeautifulSoup html.parser (fallback sin lxml)."""
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    def parse(strainer=None):
+        return BeautifulSoup(markup, 'html.parser', from_encoding=encoding if isinstance(markup, bytes) else None,
+                             parse_only=strainer)
+
+    soup = parse(SoupStrainer(list(only_tags) + ['title'])) if only_tags else parse()
+    for tag in soup(list(_NON_TEXT_TAGS)):
+        tag.decompose()
+
+    title_el = soup.find('title')
+    title = normalize_whitespace(title_el.get_text()) if title_el is not None else None
+    if title_el is not None and only_tags and 'title' not in only_tags:
+        title_el.decompose()
+
+    text = soup.get_text()
+    if only_tags and not text.strip():
+        # Ningún nodo seleccionado: usar el documento completo
+        return _extract_soup(markup, encoding, ())
+    return ExtractedDocument(normalize_whitespace(text), title=title, backend='html.parser')
+
+
+# ============================================================================
+# TEXTO INCREMENTAL (STREAMING)
+# ============================================================================
+class HtmlTextStream:
+    """
+    Conversión incremental de HTML a texto para descargas en streaming.
+
+    Quita tags, decodifica entidades, colapsa espacios y normaliza a NFC
+    chunk a chunk, reteniendo al final de cada chunk un tag o entidad
+    incompletos (o la última letra, que puede recibir un acento combinante
+    en el chunk siguiente). Un '<' que no abre un tag se conserva como
+    texto. No elimina el contenido de <script>/<style>: el resultado
+    contiene todo el texto de extract_document, apto como prefiltro de
+    keywords sin límite de palabra (si un trigger no aparece aquí, tampoco
+    en el texto extraído).
+    """
+
+    def __init__(self):
+        self._carry = ''
+        self._after_space = True
+
+    def feed(self, chunk: str) -> str:
+        """Procesa el siguiente fragmento y retorna el texto listo."""
+        data = self._carry + chunk
+        cut = len(data)
+
+        # Tag sin cerrar al final del chunk (un '<' final puede abrir uno)
+        lt = data.rfind('<')
+        while lt != -1 and lt + 1 < len(data) and not _TAG_START_RE.match(data, lt + 1):
+            lt = data.rfind('<', 0, lt)
+        if lt != -1 and data.find('>', lt) == -1:
+            cut = lt
+        else:
+            # Última letra (y sus acentos): el chunk siguiente puede traer
+            # otro acento combinante que NFC une con ella
+            while cut > 0 and unicodedata.combining(data[cut - 1]):
+                cut -= 1
+            if cut > 0 and data[cut - 1].isalpha():
+                cut -= 1
+            else:
+                cut = len(data)
+        # Entidad posiblemente incompleta (&aacute sin ';')
+        amp = data.rfind('&', 0, cut)
+        if amp != -1 and cut - amp <= _MAX_ENTITY and ';' not in data[amp:cut]:
+            cut = amp
+
+        if len(data) - cut > _MAX_CARRY:
+            # Un '<' suelto en el texto: no retener indefinidamente
+            cut = len(data)
+
+        self._carry = data[cut:]
+        return self._clean(data[:cut])
+
+    def close(self) -> str:
+        """Retorna el texto pendiente al finalizar el stream."""
+        rest, self._carry = self._carry, ''
+        return self._clean(rest)
+
+    def _clean(self, text: str) -> str:
+        text = unicodedata.normalize('NFC', html.unescape(_TAG_RE.sub('', text)))
+        text = _ANY_SPACE_RE.sub(' ', text)
+        if self._after_space and text.startswith(' '):
+            text = text[1:]
+        if text:
+            self._after_space = text.endswith(' ')
+        return text
@@ -0,0 +1,339 @@
+"""
+================================================================================
+MIA V4.0 - CLIENTE HTTP COMPARTIDO (http_client.py)
+================================================================================
+
+OBJETIVO GENERAL:
+    Centralizar todas las conexiones HTTP del sistema en un único cliente
+    con pools de conexiones keep-alive por host. Tanto el Scraper como
+    todos los PortalSearcher usan la misma instancia, de modo que los
+    requests repetidos a un mismo portal reutilizan conexiones TCP+TLS
+    ya abiertas.
+
+CARACTERÍSTICAS:
+    - requests.Session único con HTTPAdapter configurable
+    - HTTP_POOL_CONNECTIONS: hosts con pool propio
+    - HTTP_POOL_MAXSIZE: conexiones reutilizables por host
+    - Timeouts separados de conexión y de lectura
+    - Política de headers única (User-Agent, Accept, Accept-Language)
+    - GET condicional opcional con PageCache (ETag / Last-Modified):
+      una respuesta 304 indica que la página no cambió desde la última vez.
+      Los validadores nuevos quedan pendientes hasta commit_validators()
+      (al terminar la ejecución con los resultados escritos)
+    - Descarga en streaming (get_streamed) con límite de bytes, filtro de
+      Content-Type y decodificación incremental del texto
+    - Rate limiting adaptativo por host (HostRateLimiter): cada request
+      espera su turno y los 429/503 / Retry-After ajustan la tasa
+
+USO:
+    from src.http_client import get_http_client
+    resp = get_http_client().get("https://comprar.gob.ar")
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Cliente HTTP
+================================================================================
+"""
+
+import codecs
+import logging
+import re
+import threading
+from typing import Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.rate_limiter import HostRateLimiter, host_of
+
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?\s*([a-zA-Z0-9_\-]+)', re.IGNORECASE)
+
+
+# ============================================================================
+# CLASE HTTPCLIENT - SESIÓN HTTP CON POOL DE CONEXIONES
+# ============================================================================
+class HttpClient:
+    """
+    Cliente HTTP con pool de conexiones keep-alive por host.
+
+    RESPONSABILIDADES:
+        - Mantener una sesión requests compartida entre threads
+        - Reutilizar conexiones abiertas hacia cada portal
+        - Aplicar timeouts y headers comunes a todos los requests
+    """
+
+    def __init__(self, pool_connections=None, pool_maxsize=None,
+                 connect_timeout=None, read_timeout=None, user_agent=None,
+                 page_cache=None, max_bytes=None, rate_limiter=None):
+        """
+        CONSTRUCTOR - Inicialización del cliente
+
+        PARÁMETROS:
+            pool_connections (int): Hosts con pool propio (default: config)
+            pool_maxsize (int): Conexiones por host (default: config)
+            connect_timeout (float): Timeout de conexión en segundos
+            read_timeout (float): Timeout de lectura en segundos
+            user_agent (str): User-Agent a enviar en todos los requests
+            page_cache (PageCache): Caché para GET condicional (opcional)
+            max_bytes (int): Límite de get_streamed (default: HTTP_MAX_BYTES)
+            rate_limiter (HostRateLimiter): Límite por host (opcional)
+        """
+        self.logger = logging.getLogger(__name__)
+        from src.config import (
+            HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE,
+            HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_USER_AGENT, HTTP_MAX_BYTES
+        )
+
+        self.page_cache = page_cache
+        self.max_bytes = max_bytes or HTTP_MAX_BYTES
+        self.rate_limiter = rate_limiter
+        self.pool_connections = pool_connections or HTTP_POOL_CONNECTIONS
+        self.pool_maxsize = pool_maxsize or HTTP_POOL_MAXSIZE
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else HTTP_CONNECT_TIMEOUT,
+            read_timeout if read_timeout is not None else HTTP_READ_TIMEOUT
+        )
+
+        # Política de headers única para todo el sistema.
+        # Accept-Encoding se deja a requests/urllib3, que solo anuncian
+        # las codificaciones que realmente pueden decodificar.
+        self.headers: Dict[str, str] = {
+            'User-Agent': user_agent or HTTP_USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'es-AR,es;q=0.9,en;q=0.8',
+            'Connection': 'keep-alive',
+            'Upgrade-Insecure-Requests': '1'
+        }
+
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+
+        # Los reintentos los maneja retry_with_backoff, no urllib3
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=0
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.logger.debug(
+            f"HttpClient configurado: pools={self.pool_connections}, "
+            f"conexiones_por_host={self.pool_maxsize}, timeout={self.timeout}"
+        )
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None,
+            timeout=None, conditional: bool = False, **kwargs) -> requests.Response:
+        """
+        Realiza un HTTP GET reutilizando las conexiones del pool.
+
+        PARÁMETROS:
+            url (str): URL a consultar
+            headers (dict): Headers adicionales para este request
+            timeout: Timeout propio (default: (connect, read) del cliente)
+            conditional (bool): Si True y hay PageCache, envía
+                                If-None-Match / If-Modified-Since y deja
+                                pendientes los validadores de una
+                                respuesta 200 (ver commit_validators)
+
+        RETORNO:
+            requests.Response (sin raise_for_status; lo decide el llamador).
+            Un status 304 significa que la página no cambió.
+        """
+        kwargs.setdefault('allow_redirects', True)
+        use_cache = conditional and self.page_cache is not None
+        if use_cache:
+            headers = {**self.page_cache.conditional_headers(url), **(headers or {})}
+
+        host = host_of(url)
+        if self.rate_limiter is not None:
+            waited = self.rate_limiter.acquire(host)
+            if waited > 0:
+                self.logger.debug(f"Rate limit {host}: espera de {waited:.2f}s")
+
+        response = self.session.get(
+            url,
+            headers=headers,
+            timeout=timeout if timeout is not None else self.timeout,
+            **kwargs
+        )
+
+        if self.rate_limiter is not None:
+            self.rate_limiter.record(host, response.status_code, response.headers.get('Retry-After'))
+
+        if use_cache:
+            if response.status_code == 304:
+                self.logger.debug(f"304 Not Modified: {url}")
+            elif response.status_code == 200 and not kwargs.get('stream'):
+                self.page_cache.store(url, response)
+        return response
+
+    def get_streamed(self, url: str, max_bytes: Optional[int] = None,
+                     allowed_types=None, on_text: Optional[Callable[[str], None]] = None,
+                     headers: Optional[Dict[str, str]] = None, timeout=None,
+                     conditional: bool = False, **kwargs) -> requests.Response:
+        """
+        HTTP GET en streaming con límite de tamaño y filtro de Content-Type.
+
+        PARÁMETROS:
+            url (str): URL a consultar
+            max_bytes (int): Máximo de bytes (descomprimidos) a leer
+                             (default: self.max_bytes). Al superarlo se corta
+                             la descarga y el cuerpo queda truncado.
+            allowed_types (iterable): Tipos MIME aceptados
+                             (default: HTTP_ALLOWED_CONTENT_TYPES). Otros tipos
+                             no se descargan.
+            on_text (callable): Recibe el texto de cada chunk a medida que
+                             llega (decodificado, sin tags ni entidades; ver
+                             HtmlTextStream). Permite detectar triggers antes
+                             de parsear el documento.
+            headers, timeout, conditional: igual que get()
+
+        RETORNO:
+            requests.Response con .content ya leído (posiblemente truncado) y
+            el atributo stream_info:
+                bytes (int): Bytes leídos
+                truncated (bool): Se alcanzó max_bytes
+                skipped (str|None): 'content_type' si no se descargó
+                content_type (str): Tipo MIME informado por el servidor
+                decode_errors (bool): Hubo bytes no decodificables en el texto
+        """
+        from src.config import HTTP_ALLOWED_CONTENT_TYPES, HTTP_CHUNK_SIZE
+        from src.html_extractor import HtmlTextStream
+
+        max_bytes = max_bytes if max_bytes is not None else self.max_bytes
+        allowed_types = allowed_types if allowed_types is not None else HTTP_ALLOWED_CONTENT_TYPES
+
+        # Con stream=True, get() no guarda en la caché: se hace al terminar
+        response = self.get(url, headers=headers, timeout=timeout,
+                            conditional=conditional, stream=True, **kwargs)
+
+        content_type = response.headers.get('Content-Type', '')
+        info = {
+            "bytes": 0,
+            "truncated": False,
+            "skipped": None,
+            "content_type": content_type.split(';')[0].strip().lower(),
+            "decode_errors": False
+        }
+        response.stream_info = info
+        chunks = []
+        try:
+            if response.status_code != 200:
+                return response
+            if allowed_types and info["content_type"] and info["content_type"] not in allowed_types:
+                info["skipped"] = "content_type"
+                self.logger.debug(f"Content-Type no permitido ({info['content_type']}): {url}")
+                return response
+
+            decoder = None
+            text_stream = HtmlTextStream() if on_text else None
+            for chunk in response.iter_content(chunk_size=HTTP_CHUNK_SIZE):
+                remaining = max_bytes - info["bytes"]
+                if len(chunk) > remaining:
+                    chunk = chunk[:remaining]
+                    info["truncated"] = True
+                if chunk:
+                    chunks.append(chunk)
+                    info["bytes"] += len(chunk)
+                    if text_stream is not None:
+                        if decoder is None:
+                            decoder = self._incremental_decoder(content_type, chunk)
+                        text = decoder.decode(chunk)
+                        if '\ufffd' in text:
+                            info["decode_errors"] = True
+                        on_text(text_stream.feed(text))
+                if info["truncated"]:
+                    self.logger.debug(f"Descarga truncada en {max_bytes} bytes: {url}")
+                    break
+            if text_stream is not None:
+                tail = decoder.decode(b'', final=True) if decoder is not None else ''
+                on_text(text_stream.feed(tail) + text_stream.close())
+        finally:
+            # Cuerpo ya leído: requests lo expone en .content / .text.
+            # Cerrar devuelve la conexión al pool (o la descarta si se cortó).
+            response._content = b''.join(chunks)
+            response._content_consumed = True
+            response.close()
+
+        if conditional and self.page_cache is not None and not info["truncated"]:
+            self.page_cache.store(url, response)
+        return response
+
+    @staticmethod
+    def _incremental_decoder(content_type: str, first_chunk: bytes):
+        """
+        Decoder incremental según charset del Content-Type, o de <meta charset>
+        en el primer chunk, o UTF-8 (bytes inválidos se reemplazan).
+        """
+        encoding = None
+        if 'charset=' in content_type.lower():
+            encoding = requests.utils.get_encoding_from_headers({'content-type': content_type})
+        if not encoding:
+            found = _META_CHARSET_RE.search(first_chunk[:4096])
+            encoding = found.group(1).decode('ascii') if found else 'utf-8'
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            encoding = 'utf-8'
+        return codecs.getincrementaldecoder(encoding)(errors='replace')
+
+    def invalidate(self, url: str) -> None:
+        """Descarta los validadores de una URL (el próximo GET será completo)."""
+        if self.page_cache is not None:
+            self.page_cache.invalidate(url)
+
+    def commit_validators(self) -> int:
+        """
+        Guarda los validadores de las páginas descargadas en esta ejecución.
+        Llamar recién cuando sus resultados se escribieron: desde ese
+        momento un 304 omite la página.
+
+        RETORNO:
+            int: Páginas guardadas
+        """
+        return self.page_cache.commit() if self.page_cache is not None else 0
+
+    def discard_validators(self) -> int:
+        """
+        Descarta los validadores pendientes (la ejecución falló o no se
+        escribieron sus resultados): la próxima descarga será completa.
+
+        RETORNO:
+            int: Páginas descartadas
+        """
+        return self.page_cache.discard_pending() if self.page_cache is not None else 0
+
+    def close(self) -> None:
+        """Cierra todas las conexiones abiertas del pool."""
+        self.session.close()
+
+
+# ============================================================================
+# INSTANCIA COMPARTIDA
+# ============================================================================
+_shared_client: Optional[HttpClient] = None
+_shared_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """
+    Retorna el HttpClient compartido del proceso (se crea en el primer uso).
+
+    RETORNO:
+        HttpClient: Instancia única usada por Scraper y PortalSearchers
+    """
+    global _shared_client
+    if _shared_client is None:
+        with _shared_lock:
+            if _shared_client is None:
+                from src.config import HTTP_CACHE_ENABLED, HTTP_CACHE_DIR, RATE_LIMIT_ENABLED, PORTALS
+                page_cache = None
+                if HTTP_CACHE_ENABLED:
+                    from src.page_cache import PageCache
+                    page_cache = PageCache(HTTP_CACHE_DIR)
+                rate_limiter = None
+                if RATE_LIMIT_ENABLED:
+                    rate_limiter = HostRateLimiter()
+                    rate_limiter.configure_portals(PORTALS)
+                _shared_client = HttpClient(page_cache=page_cache, rate_limiter=rate_limiter)
+    return _shared_client
@@ -0,0 +1,449 @@
+"""
+================================================================================
+MIA V4.0 - MATCHER MULTI-PATRÓN DE KEYWORDS (keyword_matcher.py)
+================================================================================
+
+OBJETIVO GENERAL:
+    Detectar todas las keywords (TRIGGERS, SEARCH_KEYWORDS y keywords de
+    rubros) en una sola pasada sobre el texto, sin importar cuántas sean.
+    Reemplaza los bucles "for trigger in triggers: if trigger in text",
+    cuyo costo crece con (cantidad de triggers × largo del texto).
+
+FUNCIONAMIENTO:
+    1. Normalización Unicode: minúsculas, sin acentos, espacios unificados
+       ("Licitación Pública" y "licitacion publica" son equivalentes)
+    2. Autómata Aho-Corasick compilado una sola vez con todos los patrones
+    3. Una pasada sobre el texto retorna posiciones y conteos por keyword
+
+NORMALIZACIÓN:
+    normalize_text() conserva el largo del texto (un carácter por carácter),
+    por lo que las posiciones de los matches son válidas en el texto original.
+    Los acentos combinantes (NFD) no se quitan acá: html_extractor entrega
+    el texto ya en NFC, y las posiciones se calculan sobre ese texto.
+
+USO:
+    from src.keyword_matcher import get_default_matcher
+    match = get_default_matcher().search(texto)
+    match.keywords("trigger")   # triggers encontrados
+    match.counts                # {keyword: cantidad}
+    match.positions             # {keyword: [(inicio, fin), ...]}
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Matcher de Keywords
+================================================================================
+"""
+
+import re
+import threading
+import unicodedata
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# ============================================================================
+# NORMALIZACIÓN DE TEXTO (CONSERVA EL LARGO)
+# ============================================================================
+def _build_translation_table() -> Dict[int, str]:
+    """
+    Tabla de traducción para str.translate: minúsculas y sin acentos.
+
+    Solo incluye mapeos de un carácter a un carácter, para que el texto
+    normalizado tenga exactamente el mismo largo que el original.
+    """
+    table = {}
+    for codepoint in range(0x250):  # Latin-1 + Latin Extended A/B
+        char = chr(codepoint)
+        if char.isspace():
+            table[codepoint] = ' '
+            continue
+        lower = char.lower()
+        if len(lower) != 1:
+            continue
+        decomposed = unicodedata.normalize('NFKD', lower)
+        base = ''.join(c for c in decomposed if not unicodedata.combining(c))
+        target = base if len(base) == 1 else lower
+        if target != char:
+            table[codepoint] = target
+    # Espacios Unicode fuera del rango anterior
+    for char in '\u1680\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000':
+        table[ord(char)] = ' '
+    return table
+
+
+_TRANSLATION_TABLE = _build_translation_table()
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normaliza un texto para matching: minúsculas, sin acentos y con todo
+    espacio en blanco convertido a ' '. El resultado tiene el mismo largo
+    que la entrada.
+    """
+    return text.translate(_TRANSLATION_TABLE)
+
+
+def normalize_keyword(keyword: str) -> str:
+    """Normaliza una keyword (además colapsa espacios repetidos)."""
+    return re.sub(r' +', ' ', normalize_text(keyword)).strip()
+
+
+def rubro_keyword_variants(keyword: str) -> List[str]:
+    """
+    Variantes buscables de una keyword de rubro.
+
+    EJEMPLOS:
+        "Ósmosis Inversa Industrial (RO)" -> ["Ósmosis Inversa Industrial", "RO"]
+        "II. Provisión, Agua:"            -> []  (encabezado de sección)
+    """
+    keyword = keyword.strip()
+    if not keyword or re.match(r'^[IVX]+\.\s', keyword):
+        return []
+    variants = []
+    outer = re.sub(r'\s*\([^)]*\)', '', keyword).strip()
+    if outer:
+        variants.append(outer)
+    for inner in re.findall(r'\(([^)]*)\)', keyword):
+        inner = inner.strip()
+        if len(inner) >= 2 and inner not in variants:
+            variants.append(inner)
+    return variants
+
+
+# ============================================================================
+# RESULTADO DE UNA BÚSQUEDA
+# ============================================================================
+class MatchResult:
+    """
+    Resultado de buscar keywords en un texto.
+
+    ATRIBUTOS:
+        positions (dict): {keyword: [(inicio, fin), ...]} en orden de aparición
+        categories (dict): {keyword: [(categoria, grupo), ...]}
+    """
+
+    def __init__(self, order: Dict[str, int]):
+        self._order = order
+        self.positions: Dict[str, List[Tuple[int, int]]] = {}
+        self.categories: Dict[str, List[Tuple[str, Optional[str]]]] = {}
+
+    def _add(self, keyword: str, start: int, end: int, tags) -> None:
+        hits = self.positions.get(keyword)
+        if hits is None:
+            self.positions[keyword] = [(start, end)]
+            self.categories[keyword] = tags
+        else:
+            hits.append((start, end))
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        """Cantidad de apariciones por keyword."""
+        return {kw: len(hits) for kw, hits in self.positions.items()}
+
+    @property
+    def total_hits(self) -> int:
+        """Cantidad total de apariciones."""
+        return sum(len(hits) for hits in self.positions.values())
+
+    def keywords(self, category: Optional[str] = None) -> List[str]:
+        """
+        Keywords encontradas (en el orden en que se registraron en el matcher).
+
+        PARÁMETROS:
+            category (str): Filtrar por categoría ('trigger', 'search_keyword',
+                            'rubro', 'keyword'). None = todas.
+        """
+        found = [
+            kw for kw, tags in self.categories.items()
+            if category is None or any(cat == category for cat, _ in tags)
+        ]
+        return sorted(found, key=lambda kw: self._order.get(kw, 0))
+
+    def groups(self, category: str) -> Dict[str, List[str]]:
+        """
+        Keywords encontradas agrupadas por grupo dentro de una categoría.
+
+        EJEMPLO:
+            match.groups('rubro') -> {"Rubro 2: Purificación - Provisión": [...]}
+        """
+        grouped: Dict[str, List[str]] = {}
+        for kw in self.keywords(category):
+            for cat, group in self.categories[kw]:
+                if cat == category and group is not None:
+                    grouped.setdefault(group, []).append(kw)
+        return grouped
+
+    def all_positions(self) -> List[Tuple[int, int]]:
+        """Todas las posiciones (inicio, fin) ordenadas por inicio."""
+        return sorted(pos for hits in self.positions.values() for pos in hits)
+
+    def __bool__(self) -> bool:
+        return bool(self.positions)
+
+
+# ============================================================================
+# CLASE KEYWORDMATCHER - AUTÓMATA AHO-CORASICK
+# ============================================================================
+class KeywordMatcher:
+    """
+    Matcher multi-patrón basado en Aho-Corasick.
+
+    RESPONSABILIDADES:
+        - Compilar todas las keywords en un único autómata
+        - Buscar todas las apariciones en una sola pasada por el texto
+        - Respetar límites de palabra para keywords cortas (ej: "RO", "PLC")
+    """
+
+    def __init__(self, keywords: Optional[Iterable[str]] = None,
+                 category: str = 'keyword', whole_word: bool = False):
+        """
+        PARÁMETROS:
+            keywords (iterable): Keywords iniciales (opcional)
+            category (str): Categoría de las keywords iniciales
+            whole_word (bool): Exigir límite de palabra en las iniciales
+        """
+        # Patrón normalizado -> [(keyword original, categoría, grupo, whole_word)]
+        self._patterns: Dict[str, List[Tuple[str, str, Optional[str], bool]]] = {}
+        self._order: Dict[str, int] = {}
+        self._compiled = False
+        self._lock = threading.Lock()
+        for kw in keywords or []:
+            self.add(kw, category=category, whole_word=whole_word)
+
+    def add(self, keyword: str, category: str = 'keyword', group: Optional[str] = None,
+            whole_word: bool = False, pattern: Optional[str] = None) -> None:
+        """
+        Registra una keyword.
+
+        PARÁMETROS:
+            keyword (str): Keyword original (es la que se reporta en los resultados)
+            category (str): Categoría ('trigger', 'search_keyword', 'rubro', ...)
+            group (str): Subgrupo dentro de la categoría (ej: nombre del rubro)
+            whole_word (bool): Solo matchear palabras completas
+            pattern (str): Texto a buscar si difiere de la keyword (variantes)
+        """
+        normalized = normalize_keyword(pattern if pattern is not None else keyword)
+        if not normalized:
+            return
+        entries = self._patterns.setdefault(normalized, [])
+        entry = (keyword, category, group, whole_word)
+        if entry not in entries:
+            entries.append(entry)
+        self._order.setdefault(keyword, len(self._order))
+        self._compiled = False
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    # ------------------------------------------------------------------------
+    # COMPILACIÓN DEL AUTÓMATA
+    # ------------------------------------------------------------------------
+    def compile(self) -> 'KeywordMatcher':
+        """Construye el autómata (se llama automáticamente en la primera búsqueda)."""
+        with self._lock:
+            if self._compiled:
+                return self
+            goto: List[Dict[str, int]] = [{}]
+            outputs: List[List[int]] = [[]]
+            pattern_list = list(self._patterns.keys())
+
+            # Trie con todos los patrones
+            for pattern_id, pattern in enumerate(pattern_list):
+                state = 0
+                for char in pattern:
+                    nxt = goto[state].get(char)
+                    if nxt is None:
+                        nxt = len(goto)
+                        goto[state][char] = nxt
+                        goto.append({})
+                        outputs.append([])
+                    state = nxt
+                outputs[state].append(pattern_id)
+
+            # Enlaces de falla (BFS)
+            fail = [0] * len(goto)
+            queue = deque(goto[0].values())
+            while queue:
+                state = queue.popleft()
+                for char, nxt in goto[state].items():
+                    queue.append(nxt)
+                    f = fail[state]
+                    while f and char not in goto[f]:
+                        f = fail[f]
+                    fail[nxt] = goto[f].get(char, 0) if goto[f].get(char, 0) != nxt else 0
+                    outputs[nxt] = outputs[nxt] + outputs[fail[nxt]]
+
+            self._goto = goto
+            self._fail = fail
+            self._outputs = outputs
+            self._pattern_list = pattern_list
+            self._pattern_lengths = [len(p) for p in pattern_list]
+            self._pattern_entries = [self._patterns[p] for p in pattern_list]
+            self._keyword_tags = {}
+            for entries in self._pattern_entries:
+                for keyword, category, group, _ in entries:
+                    tags = self._keyword_tags.setdefault(keyword, [])
+                    if (category, group) not in tags:
+                        tags.append((category, group))
+            self._max_length = max(self._pattern_lengths, default=0)
+            self._compiled = True
+        return self
+
+    # ------------------------------------------------------------------------
+    # BÚSQUEDA
+    # ------------------------------------------------------------------------
+    def search(self, text: str) -> MatchResult:
+        """
+        Busca todas las keywords en el texto en una sola pasada.
+
+        PARÁMETROS:
+            text (str): Texto original (se normaliza internamente)
+
+        RETORNO:
+            MatchResult con posiciones válidas en el texto original
+        """
+        scanner = self.scanner()
+        scanner.feed(text)
+        return scanner.close()
+
+    def scanner(self) -> 'MatchScanner':
+        """Crea un scanner incremental (para textos recibidos por partes)."""
+        if not self._compiled:
+            self.compile()
+        return MatchScanner(self)
+
+
+# ============================================================================
+# SCANNER INCREMENTAL
+# ============================================================================
+class MatchScanner:
+    """
+    Estado de una búsqueda en curso. Permite alimentar el texto por partes
+    (feed) conservando el estado del autómata entre llamadas.
+    """
+
+    def __init__(self, matcher: KeywordMatcher):
+        self._m = matcher
+        self._state = 0
+        self._offset = 0             # Posición global del inicio del próximo chunk
+        self._tail = ''              # Últimos caracteres normalizados (límites de palabra)
+        self._pending = []           # Matches whole_word esperando el próximo carácter
+        self.result = MatchResult(matcher._order)
+
+    def _char_before(self, index: int, chunk: str) -> str:
+        """Carácter normalizado en la posición global index (o '' si no existe)."""
+        if index < 0:
+            return ''
+        local = index - self._offset
+        if local >= 0:
+            return chunk[local]
+        tail_index = len(self._tail) + local
+        return self._tail[tail_index] if tail_index >= 0 else ''
+
+    def _record(self, pattern_id: int, start: int, end: int, next_char: Optional[str], prev_char: str) -> None:
+        """Registra un match aplicando la regla de palabra completa si corresponde."""
+        boundary_ok = (not prev_char.isalnum()) and (next_char is None or not next_char.isalnum())
+        for keyword, category, group, whole_word in self._m._pattern_entries[pattern_id]:
+            if whole_word and not boundary_ok:
+                continue
+            self.result._add(keyword, start, end, self._m._keyword_tags[keyword])
+
+    def feed(self, text: str) -> 'MatchScanner':
+        """Procesa el siguiente fragmento de texto."""
+        if not text:
+            return self
+        chunk = normalize_text(text)
+        goto, fail, outputs = self._m._goto, self._m._fail, self._m._outputs
+        lengths = self._m._pattern_lengths
+        root = goto[0]
+
+        # Resolver matches whole_word pendientes del chunk anterior
+        if self._pending:
+            for pattern_id, start, end, prev_char in self._pending:
+                self._record(pattern_id, start, end, chunk[0], prev_char)
+            self._pending = []
+
+        state = self._state
+        last = len(chunk) - 1
+        for i, char in enumerate(chunk):
+            if state == 0 and char not in root:
+                continue
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if outputs[state]:
+                end = self._offset + i + 1
+                for pattern_id in outputs[state]:
+                    start = end - lengths[pattern_id]
+                    prev_char = self._char_before(start - 1, chunk)
+                    if i == last:
+                        # El carácter siguiente llega en el próximo chunk
+                        self._pending.append((pattern_id, start, end, prev_char))
+                    else:
+                        self._record(pattern_id, start, end, chunk[i + 1], prev_char)
+
+        self._state = state
+        self._offset += len(chunk)
+        self._tail = (self._tail + chunk)[-(self._m._max_length + 1):]
+        return self
+
+    def close(self) -> MatchResult:
+        """Finaliza la búsqueda y retorna el resultado."""
+        for pattern_id, start, end, prev_char in self._pending:
+            self._record(pattern_id, start, end, None, prev_char)
+        self._pending = []
+        return self.result
+
+
+# ============================================================================
+# MATCHERS COMPARTIDOS
+# ============================================================================
+_default_matcher: Optional[KeywordMatcher] = None
+_default_lock = threading.Lock()
+
+
+def build_default_matcher(triggers=None, search_keywords=None, rubros=None) -> KeywordMatcher:
+    """
+    Construye el matcher con todas las keywords de configuración.
+
+    CATEGORÍAS:
+        - 'trigger': TRIGGERS (match por substring, como antes)
+        - 'search_keyword': SEARCH_KEYWORDS
+        - 'rubro': keywords de cada rubro (grupo = nombre del rubro),
+                   con sus variantes y límite de palabra
+    """
+    from src.config import TRIGGERS, SEARCH_KEYWORDS, RUBRO_KEYWORDS
+
+    matcher = KeywordMatcher()
+    for trigger in (TRIGGERS if triggers is None else triggers):
+        matcher.add(trigger, category='trigger')
+    for keyword in (SEARCH_KEYWORDS if search_keywords is None else search_keywords):
+        matcher.add(keyword, category='search_keyword')
+    for rubro, keywords in (RUBRO_KEYWORDS if rubros is None else rubros).items():
+        for keyword in keywords:
+            for variant in rubro_keyword_variants(keyword):
+                matcher.add(keyword, category='rubro', group=rubro, whole_word=True, pattern=variant)
+    return matcher.compile()
+
+
+def get_default_matcher() -> KeywordMatcher:
+    """Matcher compartido con TRIGGERS, SEARCH_KEYWORDS y rubros (se compila una vez)."""
+    global _default_matcher
+    if _default_matcher is None:
+        with _default_lock:
+            if _default_matcher is None:
+                _default_matcher = build_default_matcher()
+    return _default_matcher
+
+
+@lru_cache(maxsize=64)
+def _matcher_for_tuple(keywords: Tuple[str, ...]) -> KeywordMatcher:
+    return KeywordMatcher(keywords).compile()
+
+
+def matcher_for(keywords: Iterable[str]) -> KeywordMatcher:
+    """
+    Matcher compilado (y cacheado) para una lista arbitraria de keywords,
+    como la que reciben los PortalSearcher en search(keywords).
+    """
+    return _matcher_for_tuple(tuple(keywords))
@@ -0,0 +1,379 @@
+"""
+================================================================================
+MIA V4.0 - ALMACÉN DE MÉTRICAS DE GEMINI (metrics_store.py)
+================================================================================
+
+OBJETIVO GENERAL:
+    Registrar el uso de Gemini (requests, tokens, costo, latencia) sin
+    reescribir gemini_metrics.json en cada llamada. Antes cada request
+    reescribía el JSON completo (con todo el historial por fecha): I/O
+    proporcional al historial por llamada e inseguro con workers
+    concurrentes.
+
+FUNCIONAMIENTO:
+    1. record(): acumula el evento en memoria (totales + buffer), bajo lock
+    2. flush(): cada GEMINI_METRICS_FLUSH_EVERY eventos o
+       GEMINI_METRICS_FLUSH_SECONDS segundos, el buffer se agrega a una
+       tabla SQLite append-only en UNA transacción (atómica también entre
+       procesos, modo WAL)
+    3. compact(): los eventos de días anteriores se resumen en la tabla
+       de rollups diarios (fecha + modelo) y se borran, en una transacción
+    4. close(): flush + compactación + snapshot gemini_metrics.json
+       (escritura atómica, una vez por ejecución). También al salir del
+       intérprete (atexit)
+
+    El snapshot JSON conserva el formato anterior (total_requests,
+    requests_by_date, models, ...). Si existe un gemini_metrics.json de
+    versiones anteriores y la base está vacía, se importa una sola vez.
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Métricas Append-Only
+================================================================================
+"""
+
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Modelo asignado a los datos importados del JSON anterior (sin modelo)
+LEGACY_MODEL = "desconocido"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metric_events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    date TEXT NOT NULL,
+    model TEXT NOT NULL,
+    rollup TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_metric_events_date ON metric_events(date);
+CREATE TABLE IF NOT EXISTS metric_daily (
+    date TEXT NOT NULL,
+    model TEXT NOT NULL,
+    rollup TEXT NOT NULL,
+    PRIMARY KEY (date, model)
+);
+CREATE TABLE IF NOT EXISTS metric_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_COUNTERS = ("requests", "cache_hits", "metered", "calls", "tokens", "prompt_tokens", "output_tokens",
+             "cached_tokens", "latency_ms", "cost_usd", "estimated_requests")
+_HISTOGRAMS = ("latency_ms_histogram", "prompt_tokens_histogram")
+
+
+# ============================================================================
+# ROLLUPS
+# ============================================================================
+def empty_rollup() -> Dict[str, Any]:
+    """Rollup vacío: contadores + histogramas de un (día, modelo)."""
+    rollup: Dict[str, Any] = {key: 0 for key in _COUNTERS}
+    for key in _HISTOGRAMS:
+        rollup[key] = {}
+    return rollup
+
+
+def merge_rollup(target: Dict[str, Any], source: Dict[str, Any]) -> Dict[str, Any]:
+    """Suma source en target (contadores e histogramas). Retorna target."""
+    for key in _COUNTERS:
+        target[key] = target.get(key, 0) + source.get(key, 0)
+    for key in _HISTOGRAMS:
+        histogram = target.setdefault(key, {})
+        for bucket, count in (source.get(key) or {}).items():
+            histogram[bucket] = histogram.get(bucket, 0) + count
+    return target
+
+
+def empty_totals() -> Dict[str, Any]:
+    """Totales con el formato histórico de gemini_metrics.json."""
+    return {
+        "total_requests": 0,
+        "cache_hits": 0,
+        "cache_misses": 0,
+        "total_tokens": 0,
+        "prompt_tokens": 0,
+        "output_tokens": 0,
+        "cached_tokens": 0,
+        "total_latency_ms": 0.0,
+        "total_cost_usd": 0.0,
+        "requests_by_date": {},
+        "models": {}
+    }
+
+
+def apply_rollup(totals: Dict[str, Any], date: str, model: str, rollup: Dict[str, Any]) -> None:
+    """Suma un rollup de (día, modelo) a los totales."""
+    misses = rollup["requests"] - rollup["cache_hits"]
+    totals["total_requests"] += rollup["requests"]
+    totals["cache_hits"] += rollup["cache_hits"]
+    totals["cache_misses"] += misses
+    totals["total_tokens"] += rollup["tokens"]
+    totals["prompt_tokens"] += rollup["prompt_tokens"]
+    totals["output_tokens"] += rollup["output_tokens"]
+    totals["cached_tokens"] += rollup["cached_tokens"]
+    totals["total_latency_ms"] += rollup["latency_ms"]
+    totals["total_cost_usd"] += rollup["cost_usd"]
+
+    day = totals["requests_by_date"].setdefault(date, {
+        "requests": 0, "cache_hits": 0, "tokens": 0, "cost_usd": 0.0,
+        "prompt_tokens": 0, "output_tokens": 0, "cached_tokens": 0
+    })
+    day["requests"] += rollup["requests"]
+    day["cache_hits"] += rollup["cache_hits"]
+    day["tokens"] += rollup["tokens"]
+    day["cost_usd"] += rollup["cost_usd"]
+    for key in ("prompt_tokens", "output_tokens", "cached_tokens"):
+        day[key] = day.get(key, 0) + rollup[key]
+
+    if rollup["metered"] <= 0:
+        return  # Sin uso medido (caché o versión anterior): no suma al modelo
+    stats = totals["models"].setdefault(model, {
+        "requests": 0, "calls": 0, "prompt_tokens": 0, "output_tokens": 0, "cached_tokens": 0,
+        "latency_ms_total": 0.0, "cost_usd": 0.0, "estimated_requests": 0,
+        "latency_ms_histogram": {}, "prompt_tokens_histogram": {}
+    })
+    stats["requests"] += rollup["metered"]
+    stats["latency_ms_total"] += rollup["latency_ms"]
+    for key in ("calls", "prompt_tokens", "output_tokens", "cached_tokens", "cost_usd", "estimated_requests"):
+        stats[key] += rollup[key]
+    for key in _HISTOGRAMS:
+        for bucket, count in rollup[key].items():
+            stats[key][bucket] = stats[key].get(bucket, 0) + count
+
+
+# ============================================================================
+# CLASE METRICSSTORE
+# ============================================================================
+class MetricsStore:
+    """
+    Métricas de uso de Gemini: acumulador en memoria + log SQLite append-only.
+
+    USO:
+        store = MetricsStore()
+        store.record(model, rollup)    # rollup de un request (ver Analyzer)
+        store.totals                   # totales (historial + esta ejecución)
+        store.close()                  # flush + compactación + snapshot JSON
+    """
+
+    def __init__(self, db_path: Optional[str] = None, snapshot_path: Optional[str] = None,
+                 flush_every: Optional[int] = None, flush_seconds: Optional[float] = None):
+        """
+        PARÁMETROS (default: config.py):
+            db_path (str): Base SQLite (GEMINI_METRICS_DB)
+            snapshot_path (str): Resumen JSON (GEMINI_METRICS_FILE)
+            flush_every (int): Eventos en buffer antes de escribir
+            flush_seconds (float): Antigüedad máxima del buffer
+        """
+        from src.config import (
+            GEMINI_METRICS_DB, GEMINI_METRICS_FILE,
+            GEMINI_METRICS_FLUSH_EVERY, GEMINI_METRICS_FLUSH_SECONDS
+        )
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path or GEMINI_METRICS_DB
+        self.snapshot_path = snapshot_path or GEMINI_METRICS_FILE
+        self.flush_every = max(1, flush_every or GEMINI_METRICS_FLUSH_EVERY)
+        self.flush_seconds = GEMINI_METRICS_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._buffer: List[tuple] = []
+        self._last_flush = time.monotonic()
+        self._recorded = 0
+        self._closed = False
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.executescript(_SCHEMA)
+        self._import_legacy_snapshot()
+        self.totals = self.summary()
+        atexit.register(self.close)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión SQLite del thread actual (WAL, compartible entre procesos)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    # ========================================================================
+    # REGISTRO Y FLUSH
+    # ========================================================================
+    def record(self, model: str, rollup: Dict[str, Any], date: Optional[str] = None) -> None:
+        """
+        Registra un request (rollup de un solo evento).
+
+        PARÁMETROS:
+            model (str): Modelo de Gemini
+            rollup (dict): Contadores/histogramas del request (empty_rollup)
+            date (str): Día YYYY-MM-DD (default: hoy)
+        """
+        date = date or datetime.now().strftime('%Y-%m-%d')
+        with self._lock:
+            apply_rollup(self.totals, date, model, rollup)
+            self._recorded += 1
+            self._buffer.append((time.time(), date, model, json.dumps(rollup)))
+            due = (len(self._buffer) >= self.flush_every
+                   or time.monotonic() - self._last_flush >= self.flush_seconds)
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Escribe el buffer en la tabla append-only (una transacción).
+
+        RETORNO:
+            int: Eventos escritos
+        """
+        with self._lock:
+            pending, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+        try:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO metric_events (ts, date, model, rollup) VALUES (?, ?, ?, ?)", pending
+                )
+        except sqlite3.Error as e:
+            self.logger.warning(f"No se pudieron guardar métricas ({len(pending)} eventos): {e}")
+            with self._lock:
+                self._buffer[:0] = pending
+            return 0
+        return len(pending)
+
+    # ========================================================================
+    # COMPACTACIÓN Y RESUMEN
+    # ========================================================================
+    def compact(self, before: Optional[str] = None) -> int:
+        """
+        Resume los eventos de días anteriores en rollups diarios y los borra.
+
+        PARÁMETROS:
+            before (str): Compactar días < before (default: hoy)
+
+        RETORNO:
+            int: Eventos compactados
+        """
+        before = before or datetime.now().strftime('%Y-%m-%d')
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")   # Otro proceso no compacta a la vez
+            rows = conn.execute(
+                "SELECT date, model, rollup FROM metric_events WHERE date < ?", (before,)
+            ).fetchall()
+            if not rows:
+                return 0
+            daily: Dict[tuple, Dict[str, Any]] = {}
+            for date, model, rollup in rows:
+                merge_rollup(daily.setdefault((date, model), empty_rollup()), json.loads(rollup))
+            for (date, model), rollup in daily.items():
+                existing = conn.execute(
+                    "SELECT rollup FROM metric_daily WHERE date = ? AND model = ?", (date, model)
+                ).fetchone()
+                if existing:
+                    rollup = merge_rollup(json.loads(existing[0]), rollup)
+                conn.execute(
+                    "INSERT OR REPLACE INTO metric_daily (date, model, rollup) VALUES (?, ?, ?)",
+                    (date, model, json.dumps(rollup))
+                )
+            conn.execute("DELETE FROM metric_events WHERE date < ?", (before,))
+        self.logger.debug(f"Métricas: {len(rows)} eventos compactados en {len(daily)} rollups diarios")
+        return len(rows)
+
+    def summary(self) -> Dict[str, Any]:
+        """Totales de todo el historial guardado (rollups + eventos)."""
+        totals = empty_totals()
+        conn = self._connection()
+        for date, model, rollup in conn.execute("SELECT date, model, rollup FROM metric_daily ORDER BY date"):
+            apply_rollup(totals, date, model, merge_rollup(empty_rollup(), json.loads(rollup)))
+        for date, model, rollup in conn.execute("SELECT date, model, rollup FROM metric_events ORDER BY id"):
+            apply_rollup(totals, date, model, merge_rollup(empty_rollup(), json.loads(rollup)))
+        return totals
+
+    def write_snapshot(self) -> None:
+        """Escribe el resumen JSON de forma atómica (archivo temporal + rename)."""
+        payload = json.dumps(self.summary(), indent=2, ensure_ascii=False)
+        directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".gemini_metrics_")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            self.logger.warning(f"No se pudo escribir el resumen de métricas: {e}")
+
+    def close(self) -> None:
+        """Flush + compactación + snapshot JSON (una vez, si hubo requests)."""
+        if self._closed:
+            return
+        self._closed = True
+        if not self._recorded:
+            return
+        try:
+            self.flush()
+            self.compact()
+            self.write_snapshot()
+        except sqlite3.Error as e:
+            self.logger.warning(f"Error cerrando métricas: {e}")
+
+    # ========================================================================
+    # MIGRACIÓN DEL JSON ANTERIOR
+    # ========================================================================
+    def _import_legacy_snapshot(self) -> None:
+        """
+        Importa requests_by_date de un gemini_metrics.json anterior como
+        rollups diarios (modelo 'desconocido'), una sola vez.
+        """
+        conn = self._connection()
+        if conn.execute("SELECT 1 FROM metric_meta WHERE key = 'legacy_imported'").fetchone():
+            return
+        has_data = conn.execute(
+            "SELECT EXISTS(SELECT 1 FROM metric_daily) OR EXISTS(SELECT 1 FROM metric_events)"
+        ).fetchone()[0]
+
+        imported = 0
+        if not has_data and os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                    legacy = json.load(f)
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"No se pudo importar {self.snapshot_path}: {e}")
+                legacy = {}
+            with conn:
+                for date, day in (legacy.get("requests_by_date") or {}).items():
+                    rollup = empty_rollup()
+                    rollup.update({
+                        "requests": day.get("requests", 0),
+                        "cache_hits": day.get("cache_hits", 0),
+                        "tokens": day.get("tokens", 0),
+                        "prompt_tokens": day.get("prompt_tokens", 0),
+                        "output_tokens": day.get("output_tokens", 0),
+                        "cached_tokens": day.get("cached_tokens", 0),
+                        "cost_usd": day.get("cost_usd", 0.0)
+                    })
+                    conn.execute(
+                        "INSERT OR REPLACE INTO metric_daily (date, model, rollup) VALUES (?, ?, ?)",
+                        (date, LEGACY_MODEL, json.dumps(rollup))
+                    )
+                    imported += 1
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO metric_meta (key, value) VALUES ('legacy_imported', ?)",
+                         (str(imported),))
+        if imported:
+            self.logger.info(f"Métricas: {imported} días importados de {self.snapshot_path}")
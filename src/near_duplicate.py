@@ -0,0 +1,249 @@
+"""
+================================================================================
+MIA V4.0 - DETECCIÓN DE CASI-DUPLICADOS (near_duplicate.py)
+================================================================================
+
+OBJETIVO GENERAL:
+    Reutilizar análisis de Gemini para páginas que cambiaron trivialmente
+    (una fecha, un contador, un banner) entre ejecuciones. La caché exacta
+    falla ante cualquier cambio; este índice detecta documentos "casi
+    iguales" a uno ya analizado.
+
+FUNCIONAMIENTO:
+    1. SimHash de 64 bits sobre el texto normalizado (shingles de 3
+       palabras, sin mayúsculas ni acentos): textos parecidos producen
+       huellas que difieren en pocos bits
+    2. La huella se divide en 4 bandas de 16 bits indexadas en SQLite.
+       Si dos huellas difieren en <= 3 bits, al menos una banda coincide
+       (principio del palomar), así que la búsqueda solo revisa los
+       candidatos de 4 lookups por índice, sin recorrer la historia
+    3. Entre los candidatos se calcula la distancia de Hamming exacta
+
+    Las huellas se agrupan por "scope" (modelo + versión de plantilla):
+    un análisis de otro modelo o plantilla nunca se reutiliza.
+
+CONFIGURACIÓN:
+    NEAR_DUP_ENABLED, NEAR_DUP_MAX_DISTANCE (0-3), NEAR_DUP_MODE
+    (reuse | flag), NEAR_DUP_MIN_CHARS
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Casi-Duplicados
+================================================================================
+"""
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from src.keyword_matcher import normalize_text
+
+FINGERPRINT_BITS = 64
+BANDS = 4
+BAND_BITS = FINGERPRINT_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+# Con 4 bandas la búsqueda es exacta hasta esta distancia
+MAX_EXACT_DISTANCE = BANDS - 1
+
+_WORD_RE = re.compile(r'\w+')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    id INTEGER PRIMARY KEY,
+    scope TEXT NOT NULL,
+    fingerprint INTEGER NOT NULL,
+    band0 INTEGER NOT NULL,
+    band1 INTEGER NOT NULL,
+    band2 INTEGER NOT NULL,
+    band3 INTEGER NOT NULL,
+    cache_key TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fp_band0 ON fingerprints(scope, band0);
+CREATE INDEX IF NOT EXISTS idx_fp_band1 ON fingerprints(scope, band1);
+CREATE INDEX IF NOT EXISTS idx_fp_band2 ON fingerprints(scope, band2);
+CREATE INDEX IF NOT EXISTS idx_fp_band3 ON fingerprints(scope, band3);
+CREATE INDEX IF NOT EXISTS idx_fp_created ON fingerprints(created_at);
+"""
+
+
+# ============================================================================
+# SIMHASH
+# ============================================================================
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """
+    Huella SimHash de 64 bits de un texto.
+
+    PARÁMETROS:
+        text (str): Texto a procesar (se normaliza: minúsculas, sin acentos)
+        shingle_size (int): Palabras por shingle
+
+    RETORNO:
+        int: Huella sin signo de 64 bits (0 para texto vacío)
+    """
+    words = _WORD_RE.findall(normalize_text(text))
+    if not words:
+        return 0
+
+    counts: Dict[str, int] = {}
+    if len(words) < shingle_size:
+        counts[' '.join(words)] = 1
+    else:
+        for i in range(len(words) - shingle_size + 1):
+            shingle = ' '.join(words[i:i + shingle_size])
+            counts[shingle] = counts.get(shingle, 0) + 1
+
+    vector = [0] * FINGERPRINT_BITS
+    for shingle, weight in counts.items():
+        h = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(FINGERPRINT_BITS):
+            if h >> bit & 1:
+                vector[bit] += weight
+            else:
+                vector[bit] -= weight
+
+    fingerprint = 0
+    for bit, value in enumerate(vector):
+        if value > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Cantidad de bits distintos entre dos huellas."""
+    return bin(a ^ b).count('1')
+
+
+def _bands(fingerprint: int):
+    return [(fingerprint >> (i * BAND_BITS)) & BAND_MASK for i in range(BANDS)]
+
+
+def _to_signed(value: int) -> int:
+    """SQLite guarda enteros con signo de 64 bits."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+# ============================================================================
+# ÍNDICE PERSISTENTE
+# ============================================================================
+class NearDuplicateIndex:
+    """
+    Índice de huellas SimHash de documentos ya analizados.
+
+    USO:
+        index = NearDuplicateIndex()
+        fp = simhash(texto)
+        match = index.find(fp, scope)   # {'cache_key', 'distance', ...} o None
+        index.add(fp, scope, cache_key)
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_distance: Optional[int] = None,
+                 retention_hours: Optional[float] = None):
+        """
+        PARÁMETROS (default: config.py):
+            db_path (str): Base SQLite (default: la de la caché de análisis)
+            max_distance (int): Bits distintos tolerados (0-3)
+            retention_hours (float): Antigüedad máxima de una huella
+                                     (default: GEMINI_CACHE_TTL_HOURS)
+        """
+        from src.config import GEMINI_CACHE_FILE, GEMINI_CACHE_TTL_HOURS, NEAR_DUP_MAX_DISTANCE
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path or GEMINI_CACHE_FILE
+        distance = NEAR_DUP_MAX_DISTANCE if max_distance is None else max_distance
+        if distance > MAX_EXACT_DISTANCE:
+            self.logger.warning(
+                f"NEAR_DUP_MAX_DISTANCE={distance} supera {MAX_EXACT_DISTANCE}; se usa {MAX_EXACT_DISTANCE}"
+            )
+            distance = MAX_EXACT_DISTANCE
+        self.max_distance = max(0, distance)
+        hours = GEMINI_CACHE_TTL_HOURS if retention_hours is None else retention_hours
+        self.retention_seconds = hours * 3600
+
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.executescript(_SCHEMA)
+        self.purge_expired()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión SQLite del thread actual (WAL, compartible entre procesos)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def add(self, fingerprint: int, scope: str, cache_key: str) -> None:
+        """Registra la huella de un documento analizado."""
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO fingerprints (scope, fingerprint, band0, band1, band2, band3, cache_key, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (scope, _to_signed(fingerprint), *_bands(fingerprint), cache_key, time.time())
+            )
+
+    def add_many(self, items) -> None:
+        """Registra muchas huellas en una transacción: [(fingerprint, scope, cache_key)]."""
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT INTO fingerprints (scope, fingerprint, band0, band1, band2, band3, cache_key, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                ((scope, _to_signed(fp), *_bands(fp), key, now) for fp, scope, key in items)
+            )
+
+    def find(self, fingerprint: int, scope: str, exclude_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Busca el documento indexado más parecido dentro de max_distance.
+
+        RETORNO:
+            {'cache_key', 'distance', 'created_at'} o None
+        """
+        conn = self._connection()
+        min_created = time.time() - self.retention_seconds if self.retention_seconds else 0
+        best = None
+        seen = set()
+        for i, band in enumerate(_bands(fingerprint)):
+            rows = conn.execute(
+                f"SELECT fingerprint, cache_key, created_at FROM fingerprints "
+                f"WHERE scope = ? AND band{i} = ? AND created_at >= ?",
+                (scope, band, min_created)
+            )
+            for stored, cache_key, created_at in rows:
+                if cache_key == exclude_key or cache_key in seen:
+                    continue
+                seen.add(cache_key)
+                distance = hamming_distance(fingerprint, _to_unsigned(stored))
+                if distance <= self.max_distance and (
+                        best is None or (distance, -created_at) < (best["distance"], -best["created_at"])):
+                    best = {"cache_key": cache_key, "distance": distance, "created_at": created_at}
+        return best
+
+    def purge_expired(self) -> int:
+        """Borra huellas más viejas que la retención."""
+        if not self.retention_seconds:
+            return 0
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                "DELETE FROM fingerprints WHERE created_at < ?", (time.time() - self.retention_seconds,)
+            )
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]
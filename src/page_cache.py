@@ -0,0 +1,193 @@
+"""
+================================================================================
+MIA V4.0 - CACHÉ DE PÁGINAS CON GET CONDICIONAL (page_cache.py)
+================================================================================
+
+OBJETIVO GENERAL:
+    Evitar descargar y procesar nuevamente páginas de portales que no
+    cambiaron desde la última ejecución. Guarda en disco, por URL, los
+    validadores HTTP (ETag / Last-Modified).
+
+FUNCIONAMIENTO:
+    1. Antes de un GET, HttpClient agrega If-None-Match / If-Modified-Since
+       con los validadores guardados para esa URL
+    2. Si el servidor responde 304 Not Modified, el llamador omite el
+       parseo, la detección de triggers y el análisis con Gemini
+    3. Si responde 200 con validadores, la entrada queda PENDIENTE en
+       memoria. Se escribe en disco con commit(), cuando la ejecución
+       terminó de procesar la página (análisis y escritura de resultados).
+       Si la ejecución se corta antes, la próxima vuelve a descargarla
+       completa en lugar de recibir un 304 y perder la oportunidad
+
+ALMACENAMIENTO:
+    HTTP_CACHE_DIR/<sha256(url)>.json     -> metadata y validadores
+    (el cuerpo no se guarda: ante un 304 la página no se reprocesa)
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Caché HTTP
+================================================================================
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+
+# ============================================================================
+# CLASE PAGECACHE - CACHÉ PERSISTENTE DE PÁGINAS POR URL
+# ============================================================================
+class PageCache:
+    """
+    Caché en disco de páginas HTTP indexada por URL.
+
+    RESPONSABILIDADES:
+        - Guardar validadores (ETag, Last-Modified) de cada página, recién
+          cuando su procesamiento terminó (store + commit)
+        - Generar headers condicionales para el próximo request
+        - Invalidar entradas cuyo procesamiento posterior falló
+    """
+
+    def __init__(self, cache_dir: str):
+        """
+        PARÁMETROS:
+            cache_dir (str): Directorio donde se guardan las entradas
+        """
+        self.logger = logging.getLogger(__name__)
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+        
+        # Validadores descargados en esta ejecución, todavía sin commit
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, url: str) -> str:
+        """Retorna la ruta de la metadata de una URL."""
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Retorna la metadata guardada (con commit) para una URL, o None si no existe.
+        """
+        meta_path = self._path(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.warning(f"Entrada de caché HTTP ilegible para {url}: {e}")
+            return None
+        return entry if entry.get('url') == url else None
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """
+        Construye los headers de GET condicional para una URL.
+
+        RETORNO:
+            Dict con If-None-Match y/o If-Modified-Since (vacío si no hay caché)
+        """
+        entry = self.get(url)
+        headers = {}
+        if not entry:
+            return headers
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, url: str, response) -> bool:
+        """
+        Deja pendientes los validadores de una respuesta 200 (se escriben
+        en disco con commit()).
+
+        PARÁMETROS:
+            url (str): URL solicitada (clave de la caché)
+            response: requests.Response con status 200
+
+        RETORNO:
+            bool: True si quedó pendiente (la respuesta tenía validadores)
+        """
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            # Sin validadores no hay GET condicional posible
+            return False
+
+        entry = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_type": response.headers.get('Content-Type'),
+            "encoding": response.encoding,
+            "fetched_at": datetime.now().isoformat(timespec='seconds')
+        }
+        with self._lock:
+            self._pending[url] = entry
+        return True
+
+    def commit(self) -> int:
+        """
+        Escribe en disco los validadores pendientes (las páginas de esta
+        ejecución ya se procesaron y sus resultados se escribieron).
+
+        RETORNO:
+            int: Entradas escritas
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        written = 0
+        for url, entry in pending.items():
+            try:
+                self._atomic_write(self._path(url), json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+                written += 1
+            except Exception as e:
+                self.logger.warning(f"No se pudo guardar caché HTTP de {url}: {e}")
+        return written
+
+    def discard_pending(self) -> int:
+        """
+        Descarta los validadores pendientes sin escribirlos (la ejecución
+        no terminó de procesar sus páginas).
+
+        RETORNO:
+            int: Entradas descartadas
+        """
+        with self._lock:
+            count = len(self._pending)
+            self._pending = {}
+        return count
+
+    def invalidate(self, url: str) -> None:
+        """
+        Elimina la entrada de una URL, pendiente o en disco (el próximo GET
+        será completo).
+
+        USO:
+            Cuando el procesamiento de la página falló (ej: error de Gemini),
+            para que la próxima ejecución no reciba un 304 y la reprocese.
+        """
+        with self._lock:
+            self._pending.pop(url, None)
+        try:
+            os.remove(self._path(url))
+        except FileNotFoundError:
+            pass
+
+    def _atomic_write(self, path: str, data: bytes) -> None:
+        """Escribe un archivo de forma atómica (temporal + os.replace)."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -1,19 +1,27 @@
 import logging
-import requests
 from abc import ABC, abstractmethod
+from src.http_client import get_http_client
+from src.keyword_matcher import matcher_for
+from src.html_extractor import extract_response
+from src.config import HTTP_STREAMING
 
 class PortalSearcher(ABC):
     """
     Abstract base class for all portal searchers.
+    All searchers share the process-wide HttpClient, so repeated hits to
+    the same portal reuse warm keep-alive connections.
+
+    Subclasses may set `content_tags` (e.g. ('table',)) to restrict text
+    extraction to the nodes they care about.
     """
+    content_tags = None
+
     def __init__(self, portal_config):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.name = portal_config.get("name")
         self.base_url = portal_config.get("url")
-        self.session = requests.Session()
-        self.session.headers.update({
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        })
+        self.http = get_http_client()
+        self.session = self.http.session
 
     @abstractmethod
     def search(self, keywords):
@@ -33,12 +41,47 @@ class PortalSearcher(ABC):
         """
         pass
 
-    def fetch_page(self, url):
-        """Helper to fetch a page with error handling."""
+    def fetch_page(self, url, conditional=True):
+        """
+        Helper to fetch a page with error handling.
+        With conditional=True the request carries the cached validators;
+        a 304 response means the page did not change (see is_not_modified).
+        With HTTP_STREAMING the download is capped at HTTP_MAX_BYTES and
+        non-HTML content types are skipped (returns None).
+        """
         try:
-            resp = self.session.get(url, timeout=20)
+            if HTTP_STREAMING:
+                resp = self.http.get_streamed(url, conditional=conditional)
+            else:
+                resp = self.http.get(url, conditional=conditional)
             resp.raise_for_status()
+            info = getattr(resp, 'stream_info', None)
+            if info and info["skipped"]:
+                self.logger.info(f"Skipping {url}: content type {info['content_type']}")
+                return None
+            if info and info["truncated"]:
+                self.logger.warning(f"{url} truncated at {info['bytes']} bytes")
             return resp
         except Exception as e:
             self.logger.error(f"Error fetching {url}: {e}")
             return None
+
+    def extract(self, resp, only_tags=None):
+        """
+        Parse the response once and return its ExtractedDocument
+        (visible text without scripts/styles, whitespace normalized).
+        """
+        return extract_response(resp, only_tags=only_tags or self.content_tags)
+
+    @staticmethod
+    def matcher_for(keywords):
+        """
+        Compiled multi-pattern matcher for the given keywords (built once
+        per keyword list, case- and accent-insensitive).
+        """
+        return matcher_for(keywords)
+
+    @staticmethod
+    def is_not_modified(resp):
+        """True if the response is a 304 (unchanged since the last run)."""
+        return resp is not None and resp.status_code == 304
@@ -1,5 +1,4 @@
 from .base import PortalSearcher
-from bs4 import BeautifulSoup
 import time
 
 class ComprarSearcher(PortalSearcher):
@@ -21,25 +20,23 @@ class ComprarSearcher(PortalSearcher):
             f"{self.base_url}/PLIEGO/BusquedaPliego.aspx" # Common pattern
         ]
         
+        matcher = self.matcher_for(keywords)
         for url in target_urls:
             resp = self.fetch_page(url)
             if not resp:
                 continue
+            if self.is_not_modified(resp):
+                # Unchanged since the last run: skip parsing and matching
+                self.logger.info(f"Sin cambios (304): {url}")
+                continue
                 
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            text_content = soup.get_text().lower()
+            text_content = self.extract(resp).text
             
             # Very basic check: do any keywords appear in the valid text?
             # Ideally we would loop through rows of a table.
+            matched_kw = matcher.search(text_content).keywords()
             
-            hit = False
-            matched_kw = []
-            for kw in keywords:
-                if kw.lower() in text_content:
-                    hit = True
-                    matched_kw.append(kw)
-            
-            if hit:
+            if matched_kw:
                 # We found keywords on the page. 
                 # Since we are not strictly parsing individual rows yet (requires detailed HTML analysis),
                 # we return the page itself as a "Lead" to be analyzed by the LLM.
@@ -47,8 +44,8 @@ class ComprarSearcher(PortalSearcher):
                     "portal": self.name,
                     "url": url,
                     "title": f"Matches for {', '.join(matched_kw)}",
-                    "content_snippet": soup.get_text()[:3000].strip(),
-                    "full_text": soup.get_text()
+                    "content_snippet": text_content[:3000].strip(),
+                    "full_text": text_content
                 })
         
         return results
@@ -63,19 +60,21 @@ class ContratarSearcher(PortalSearcher):
         resp = self.fetch_page(self.base_url)
         if not resp:
             return results
+        if self.is_not_modified(resp):
+            self.logger.info(f"Sin cambios (304): {self.base_url}")
+            return results
             
-        soup = BeautifulSoup(resp.text, 'html.parser')
-        text_content = soup.get_text().lower()
+        text_content = self.extract(resp).text
         
-        matched_kw = [kw for kw in keywords if kw.lower() in text_content]
+        matched_kw = self.matcher_for(keywords).search(text_content).keywords()
         
         if matched_kw:
              results.append({
                 "portal": self.name,
                 "url": self.base_url,
                 "title": f"Home Page Match: {', '.join(matched_kw)}",
-                "content_snippet": soup.get_text()[:3000].strip(),
-                "full_text": soup.get_text()
+                "content_snippet": text_content[:3000].strip(),
+                "full_text": text_content
             })
         return results
 
@@ -97,21 +96,23 @@ class BoletinSearcher(PortalSearcher):
             resp = self.fetch_page(self.base_url)
             if not resp: return results
 
-        soup = BeautifulSoup(resp.text, 'html.parser')
-        
+        if self.is_not_modified(resp):
+            self.logger.info(f"Sin cambios (304): {resp.url}")
+            return results
+
         # In the Boletin, we might want to look at specific headers or links.
         # For now, we stick to the text-scan strategy for consistency with Stage 1 requirements.
         
-        text_content = soup.get_text().lower()
-        matched_kw = [kw for kw in keywords if kw.lower() in text_content]
+        text_content = self.extract(resp).text
+        matched_kw = self.matcher_for(keywords).search(text_content).keywords()
         
         if matched_kw:
              results.append({
                 "portal": self.name,
                 "url": section_url if section_url else self.base_url,
                 "title": f"Boletin Matches: {', '.join(matched_kw)}",
-                "content_snippet": soup.get_text()[:3000].strip(),
-                "full_text": soup.get_text()
+                "content_snippet": text_content[:3000].strip(),
+                "full_text": text_content
             })
             
         return results
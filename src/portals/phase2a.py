@@ -166,6 +166,9 @@ class AysaScraper(PortalSearcher):
         """
         results = []
         
+        # Matcher compilado una sola vez para todas las filas
+        matcher = self.matcher_for(keywords) if keywords else None
+        
         try:
             # Buscar tabla de resultados
             # La tabla está dentro de un contenedor con clase específica
@@ -193,10 +196,17 @@ class AysaScraper(PortalSearcher):
                     presupuesto = cells[4].text.strip() if len(cells) > 4 else "No aplica"
                     
                     # Filtrar por keywords si se especificaron
-                    if keywords:
-                        texto_completo = f"{objeto} {numero}".lower()
-                        if not any(kw.lower() in texto_completo for kw in keywords):
+                    # (una pasada por fila, sin distinguir mayúsculas ni acentos)
+                    matched_keywords = []
+                    if matcher:
+                        match = matcher.search(f"{objeto} {numero}")
+                        if not match:
                             continue
+                        # Solo se reportan las keywords presentes en el objeto
+                        matched_keywords = [
+                            kw for kw, hits in match.positions.items()
+                            if any(end <= len(objeto) for _, end in hits)
+                        ]
                     
                     # Intentar obtener URL de detalle (si la fila es clickeable)
                     detail_url = ""
@@ -220,7 +230,7 @@ class AysaScraper(PortalSearcher):
                         "url": detail_url,
                         "content_snippet": objeto[:200],
                         "full_text": f"Licitación {numero}: {objeto}. Estado: {estado}. Fechas: {fechas}. Presupuesto: {presupuesto}",
-                        "matched_keywords": [kw for kw in keywords if kw.lower() in objeto.lower()] if keywords else []
+                        "matched_keywords": matched_keywords
                     }
                     
                     results.append(result)
@@ -0,0 +1,278 @@
+"""
+================================================================================
+MIA V4.0 - LIMITADOR DE TASA POR HOST (rate_limiter.py)
+================================================================================
+
+OBJETIVO GENERAL:
+    Reemplazar la pausa fija entre portales por un límite de requests por
+    segundo POR HOST, que se adapta a la respuesta de cada sitio:
+    - Sitios robustos: se escanean a la tasa configurada
+    - Sitios frágiles: al recibir 429/503 la tasa baja y se respeta
+      Retry-After; con respuestas sanas vuelve a subir de a poco
+
+COMPONENTES:
+    - TokenBucket: balde de tokens thread-safe (tasa + ráfaga)
+    - HostRateLimiter: un TokenBucket por host con ajuste adaptativo
+      (baja multiplicativa ante 429/503, subida aditiva con respuestas sanas)
+
+CONFIGURACIÓN:
+    Defaults en config.py (RATE_LIMIT_*). Cada portal de PORTALS puede
+    definir sus propios límites:
+        "requests_per_second": 2.0,   # Tasa máxima para ese host
+        "burst": 3                    # Requests seguidos permitidos
+
+USO:
+    limiter = HostRateLimiter()
+    limiter.acquire("comprar.gob.ar")          # Espera su turno
+    limiter.record("comprar.gob.ar", 429, "30")  # Ajusta la tasa
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Rate Limiting Adaptativo
+================================================================================
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+# Códigos que indican que el sitio pide bajar la velocidad
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+# ============================================================================
+# TOKEN BUCKET
+# ============================================================================
+class TokenBucket:
+    """
+    Balde de tokens thread-safe.
+
+    Se recargan `rate` tokens por segundo hasta `capacity`. Cada acquire()
+    consume tokens y, si no alcanzan, espera lo necesario. Las esperas se
+    reservan bajo el lock, así varios threads quedan en fila sin
+    despertarse todos a la vez.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        """
+        PARÁMETROS:
+            rate (float): Tokens por segundo (> 0)
+            capacity (float): Máximo de tokens acumulables (ráfaga)
+        """
+        self.rate = float(rate)
+        self.capacity = float(max(capacity, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, tokens: float = 1) -> float:
+        """Consume tokens y retorna cuántos segundos hay que esperar."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= tokens
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Consume tokens esperando si hace falta. Retorna los segundos esperados."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """Consume tokens solo si están disponibles ahora (sin esperar)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def set_rate(self, rate: float) -> None:
+        """Cambia la tasa (los tokens ya acumulados se conservan)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+
+    def drain(self) -> None:
+        """Vacía el balde (el próximo request espera un intervalo completo)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0)
+
+
+# ============================================================================
+# FUNCIONES AUXILIARES
+# ============================================================================
+def host_of(url: str) -> str:
+    """Host (con puerto si lo tiene) de una URL, en minúsculas."""
+    return urlsplit(url).netloc.lower()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Interpreta el header Retry-After.
+
+    RETORNO:
+        Segundos a esperar (segundos o fecha HTTP), o None si no es válido
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+# ============================================================================
+# LIMITADOR ADAPTATIVO POR HOST
+# ============================================================================
+class HostRateLimiter:
+    """
+    Límite de requests por segundo para cada host, adaptativo.
+
+    AJUSTE:
+        - 429/503: tasa = max(min_rate, tasa * backoff_factor), balde vacío
+          y, si viene Retry-After, el host queda en pausa ese tiempo
+        - Respuesta sana (< 400): tasa += recovery_step, hasta la tasa
+          configurada del host
+        - Otros errores (404, 500, timeouts) no cambian la tasa
+    """
+
+    def __init__(self, default_rate: Optional[float] = None, default_burst: Optional[int] = None,
+                 min_rate: Optional[float] = None, backoff_factor: Optional[float] = None,
+                 recovery_step: Optional[float] = None, max_retry_after: Optional[float] = None):
+        """
+        PARÁMETROS (default: config.py):
+            default_rate (float): Requests/seg de un host sin config propia
+            default_burst (int): Ráfaga de un host sin config propia
+            min_rate (float): Tasa mínima tras sucesivos 429/503
+            backoff_factor (float): Multiplicador de la tasa ante 429/503
+            recovery_step (float): Requests/seg recuperados por respuesta sana
+            max_retry_after (float): Tope en segundos para Retry-After
+        """
+        from src.config import (
+            RATE_LIMIT_DEFAULT_RPS, RATE_LIMIT_DEFAULT_BURST, RATE_LIMIT_MIN_RPS,
+            RATE_LIMIT_BACKOFF_FACTOR, RATE_LIMIT_RECOVERY_STEP, RATE_LIMIT_MAX_RETRY_AFTER
+        )
+        self.logger = logging.getLogger(__name__)
+        self.default_rate = default_rate or RATE_LIMIT_DEFAULT_RPS
+        self.default_burst = default_burst or RATE_LIMIT_DEFAULT_BURST
+        self.min_rate = min_rate or RATE_LIMIT_MIN_RPS
+        self.backoff_factor = backoff_factor or RATE_LIMIT_BACKOFF_FACTOR
+        self.recovery_step = recovery_step if recovery_step is not None else RATE_LIMIT_RECOVERY_STEP
+        self.max_retry_after = max_retry_after if max_retry_after is not None else RATE_LIMIT_MAX_RETRY_AFTER
+
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict[str, Any]] = {}
+
+    # ------------------------------------------------------------------------
+    # CONFIGURACIÓN
+    # ------------------------------------------------------------------------
+    def configure(self, host: str, rate: Optional[float] = None, burst: Optional[int] = None) -> None:
+        """Define la tasa máxima y la ráfaga de un host."""
+        rate = float(rate or self.default_rate)
+        burst = int(burst or self.default_burst)
+        with self._lock:
+            self._hosts[host.lower()] = self._new_state(rate, burst)
+
+    def configure_portals(self, portals) -> None:
+        """Aplica requests_per_second / burst definidos en PORTALS."""
+        for portal in portals:
+            if portal.get("requests_per_second") or portal.get("burst"):
+                self.configure(
+                    host_of(portal["url"]),
+                    rate=portal.get("requests_per_second"),
+                    burst=portal.get("burst")
+                )
+
+    def _new_state(self, rate: float, burst: int) -> Dict[str, Any]:
+        return {
+            "bucket": TokenBucket(rate, burst),
+            "ceiling": rate,          # Tasa configurada (techo de la recuperación)
+            "blocked_until": 0.0,     # time.monotonic() hasta el que no se envían requests
+            "throttled": 0            # Cantidad de 429/503 recibidos
+        }
+
+    def _state(self, host: str) -> Dict[str, Any]:
+        host = host.lower()
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._new_state(self.default_rate, self.default_burst)
+                self._hosts[host] = state
+            return state
+
+    # ------------------------------------------------------------------------
+    # USO
+    # ------------------------------------------------------------------------
+    def acquire(self, host: str) -> float:
+        """
+        Espera el turno para enviar un request al host.
+
+        RETORNO:
+            float: Segundos esperados
+        """
+        state = self._state(host)
+        blocked = state["blocked_until"] - time.monotonic()
+        waited = 0.0
+        if blocked > 0:
+            time.sleep(blocked)
+            waited = blocked
+        return waited + state["bucket"].acquire()
+
+    def record(self, host: str, status_code: int, retry_after: Optional[str] = None) -> None:
+        """
+        Ajusta la tasa del host según el código de respuesta.
+
+        PARÁMETROS:
+            host (str): Host consultado
+            status_code (int): Código HTTP recibido
+            retry_after (str): Valor del header Retry-After (si vino)
+        """
+        state = self._state(host)
+        bucket = state["bucket"]
+
+        if status_code in THROTTLE_STATUS_CODES:
+            new_rate = max(self.min_rate, bucket.rate * self.backoff_factor)
+            bucket.set_rate(new_rate)
+            bucket.drain()
+            pause = parse_retry_after(retry_after)
+            with self._lock:
+                state["throttled"] += 1
+                if pause:
+                    pause = min(pause, self.max_retry_after)
+                    state["blocked_until"] = max(state["blocked_until"], time.monotonic() + pause)
+            self.logger.warning(
+                f"[RATE LIMIT] {host} respondió {status_code}: tasa reducida a {new_rate:.2f} req/s"
+                + (f", pausa de {pause:.0f}s (Retry-After)" if pause else "")
+            )
+        elif status_code < 400 and bucket.rate < state["ceiling"]:
+            bucket.set_rate(min(state["ceiling"], bucket.rate + self.recovery_step))
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Estado actual por host (tasa, techo y cantidad de 429/503)."""
+        with self._lock:
+            return {
+                host: {
+                    "rate": state["bucket"].rate,
+                    "ceiling": state["ceiling"],
+                    "throttled": state["throttled"]
+                }
+                for host, state in self._hosts.items()
+            }
@@ -0,0 +1,166 @@
+"""
+================================================================================
+MIA V4.0 - SCORE LOCAL DE RELEVANCIA (relevance.py)
+================================================================================
+
+OBJETIVO GENERAL:
+    Descartar ANTES de Gemini las oportunidades que no tienen nada que ver
+    con agua o efluentes. Un trigger genérico ("provisión de",
+    "licitación pública") alcanza para detectar una oportunidad, pero no
+    dice si es del rubro: sin este filtro cada una cuesta una llamada a
+    la API.
+
+FUNCIONAMIENTO:
+    1. Vocabulario: keywords de los 8 rubros (config/keywords.json, generado
+       por migration.py) + términos base del dominio (RELEVANCE_BASE_TERMS)
+    2. Peso tipo IDF por término: una keyword presente en un solo rubro es
+       más específica que una repetida en varios; las frases de varias
+       palabras pesan más que una palabra suelta
+    3. Una pasada del matcher Aho-Corasick cuenta las apariciones; cada
+       término aporta peso x (1 + ln(apariciones))
+    4. Score 0-100 con saturación: 100 x (1 - e^(-suma / RELEVANCE_SATURATION))
+
+    El rubro con más peso acumulado se informa como rubro probable.
+
+USO:
+    scorer = get_default_scorer()
+    result = scorer.score(texto)   # {'score': 47, 'rubro': ..., 'terms': [...]}
+    kept, discarded = filter_opportunities(raw_ops)
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Score Local
+================================================================================
+"""
+
+import math
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.keyword_matcher import KeywordMatcher, rubro_keyword_variants
+
+# Grupo de los términos base (no pertenecen a un rubro)
+BASE_GROUP = "base"
+
+
+class RelevanceScorer:
+    """
+    Score de relevancia local (0-100) por términos ponderados.
+
+    RESPONSABILIDADES:
+        - Compilar un matcher con las keywords de rubros y términos base
+        - Calcular pesos por especificidad (IDF entre rubros)
+        - Puntuar textos en una sola pasada
+    """
+
+    def __init__(self, rubros: Optional[Dict[str, List[str]]] = None,
+                 base_terms: Optional[Iterable[str]] = None,
+                 saturation: Optional[float] = None):
+        """
+        PARÁMETROS (default: config.py):
+            rubros (dict): {rubro: [keywords]} (RUBRO_KEYWORDS)
+            base_terms (iterable): Términos del dominio (RELEVANCE_BASE_TERMS)
+            saturation (float): Suma de pesos que lleva el score a ~63
+                                (RELEVANCE_SATURATION)
+        """
+        from src.config import RUBRO_KEYWORDS, RELEVANCE_BASE_TERMS, RELEVANCE_SATURATION
+        rubros = RUBRO_KEYWORDS if rubros is None else rubros
+        base_terms = RELEVANCE_BASE_TERMS if base_terms is None else base_terms
+        self.saturation = float(saturation or RELEVANCE_SATURATION)
+
+        # Rubros en los que aparece cada keyword (document frequency)
+        rubros_by_keyword: Dict[str, set] = {}
+        for rubro, keywords in rubros.items():
+            for keyword in keywords:
+                if rubro_keyword_variants(keyword):
+                    rubros_by_keyword.setdefault(keyword, set()).add(rubro)
+
+        total = max(len(rubros), 1)
+        self.weights: Dict[str, float] = {}
+        self.matcher = KeywordMatcher()
+        for keyword, found_in in rubros_by_keyword.items():
+            words = len(rubro_keyword_variants(keyword)[0].split())
+            idf = math.log(1 + total / len(found_in))
+            self.weights[keyword] = idf * (1 + 0.5 * min(words - 1, 2))
+            for rubro in found_in:
+                for variant in rubro_keyword_variants(keyword):
+                    self.matcher.add(keyword, category='rubro', group=rubro, whole_word=True, pattern=variant)
+        for term in base_terms:
+            if term not in self.weights:
+                self.weights[term] = 1.0
+            self.matcher.add(term, category='rubro', group=BASE_GROUP, whole_word=True)
+        self.matcher.compile()
+
+    def __len__(self) -> int:
+        return len(self.weights)
+
+    def score(self, text: str) -> Dict[str, Any]:
+        """
+        Puntúa un texto.
+
+        RETORNO:
+            {'score': int 0-100, 'rubro': rubro probable o None,
+             'terms': términos encontrados, ordenados por aporte}
+        """
+        match = self.matcher.search(text or "")
+        contributions: Dict[str, float] = {}
+        for keyword, positions in match.positions.items():
+            # Una keyword de varios rubros se registra una vez por rubro
+            count = len(set(positions))
+            contributions[keyword] = self.weights.get(keyword, 1.0) * (1 + math.log(count))
+
+        by_rubro: Dict[str, float] = {}
+        for rubro, keywords in match.groups('rubro').items():
+            if rubro != BASE_GROUP:
+                by_rubro[rubro] = sum(contributions[kw] for kw in keywords)
+
+        total = sum(contributions.values())
+        return {
+            "score": int(round(100 * (1 - math.exp(-total / self.saturation)))),
+            "rubro": max(by_rubro, key=by_rubro.get) if by_rubro else None,
+            "terms": sorted(contributions, key=contributions.get, reverse=True)
+        }
+
+
+# ============================================================================
+# SCORER COMPARTIDO Y FILTRO DE OPORTUNIDADES
+# ============================================================================
+_default_scorer: Optional[RelevanceScorer] = None
+_default_lock = threading.Lock()
+
+
+def get_default_scorer() -> RelevanceScorer:
+    """Scorer con la configuración de config.py (se compila una vez)."""
+    global _default_scorer
+    if _default_scorer is None:
+        with _default_lock:
+            if _default_scorer is None:
+                _default_scorer = RelevanceScorer()
+    return _default_scorer
+
+
+def filter_opportunities(opportunities: List[Dict[str, Any]], threshold: Optional[float] = None,
+                         scorer: Optional[RelevanceScorer] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Calcula el score local de cada oportunidad y separa las que van a Gemini.
+
+    PARÁMETROS:
+        opportunities (list): Oportunidades del scraper (con 'full_text')
+        threshold (float): Score local mínimo (RELEVANCE_MIN_LOCAL_SCORE)
+        scorer (RelevanceScorer): Default: get_default_scorer()
+
+    RETORNO:
+        (enviar, descartadas). Cada oportunidad recibe 'local_score',
+        'local_rubro' y 'local_terms'.
+    """
+    from src.config import RELEVANCE_MIN_LOCAL_SCORE
+    threshold = RELEVANCE_MIN_LOCAL_SCORE if threshold is None else threshold
+    scorer = scorer or get_default_scorer()
+
+    kept, discarded = [], []
+    for op in opportunities:
+        result = scorer.score(op.get('full_text', ''))
+        op['local_score'] = result['score']
+        op['local_rubro'] = result['rubro']
+        op['local_terms'] = result['terms'][:5]
+        (kept if result['score'] >= threshold else discarded).append(op)
+    return kept, discarded
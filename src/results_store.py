@@ -0,0 +1,249 @@
+"""
+================================================================================
+MIA V4.0 - HISTORIAL DE RESULTADOS EN SQLITE (results_store.py)
+================================================================================
+
+OBJETIVO GENERAL:
+    Guardar los resultados en una base SQLite consultable. Con el CSV como
+    único historial, filtrar por rubro, por score o por los últimos días
+    de un portal obligaba a cargar el archivo completo en una planilla.
+
+FUNCIONAMIENTO:
+    1. Tabla `results` con todos los campos MIA_*, incluidos los que el
+       CSV no guarda (MIA_Link_al_Pliego, MIA_Empresa_Asignada,
+       MIA_Preguntas_Tecnicas, esta última como lista JSON)
+    2. Índices por portal + fecha, fecha, score y rubro: las consultas de
+       reportes leen el índice, no toda la tabla
+    3. Las filas se insertan por lotes (una transacción por flush de
+       SheetsManager)
+    4. export_csv() genera un CSV desde la base (vista derivada, con los
+       mismos filtros que query()). La vista SQL `results_csv` expone las
+       filas con los nombres de columna MIA_* (ej: sqlite3 -csv -header
+       results_stage1.db "SELECT * FROM results_csv")
+
+CARACTERÍSTICAS:
+    - SQLite en modo WAL, una conexión por thread (como analysis_cache.py):
+      varios procesos pueden escribir y consultar a la vez
+    - Se activa con OUTPUT_BACKENDS=csv,sqlite (o solo sqlite)
+
+USO:
+    store = ResultsStore("results_stage1.db")
+    store.insert_many([fila, ...])
+    store.query(portal="AySA", since="2026-01-01", min_score=70)
+    store.export_csv("reporte.csv", rubro="Rubro 2: Purificación - Provisión")
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Historial SQLite
+================================================================================
+"""
+
+import csv
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# (columna SQLite, campo de la fila MIA, tipo SQLite)
+COLUMNS: List[Tuple[str, str, str]] = [
+    ("detected_at", "Timestamp_Deteccion", "TEXT NOT NULL"),
+    ("portal", "Portal", "TEXT NOT NULL"),
+    ("url", "MIA_URL", "TEXT NOT NULL"),
+    ("keywords", "MIA_Keywords_Detectadas", "TEXT"),
+    ("rubro", "MIA_Rubro", "TEXT"),
+    ("score_ia", "MIA_Score_IA", "INTEGER"),
+    ("score_local", "MIA_Score_Local", "INTEGER"),
+    ("tier", "MIA_Tier", "TEXT"),
+    ("model", "MIA_Modelo", "TEXT"),
+    ("summary", "MIA_Resumen_Tecnico", "TEXT"),
+    ("tender_id", "MIA_ID_Licitacion", "TEXT"),
+    ("content_hash", "MIA_Hash_Contenido", "TEXT"),
+    ("tender_link", "MIA_Link_al_Pliego", "TEXT"),
+    ("assigned_company", "MIA_Empresa_Asignada", "TEXT"),
+    ("technical_questions", "MIA_Preguntas_Tecnicas", "TEXT"),   # Lista JSON
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    {columns}
+);
+CREATE INDEX IF NOT EXISTS idx_results_portal_date ON results(portal, detected_at);
+CREATE INDEX IF NOT EXISTS idx_results_date ON results(detected_at);
+CREATE INDEX IF NOT EXISTS idx_results_score ON results(score_ia);
+CREATE INDEX IF NOT EXISTS idx_results_rubro ON results(rubro, detected_at);
+CREATE VIEW IF NOT EXISTS results_csv AS
+    SELECT {aliases} FROM results ORDER BY detected_at, id;
+""".format(columns=",\n    ".join(f"{name} {sql_type}" for name, _, sql_type in COLUMNS),
+           aliases=", ".join(f"{name} AS {field}" for name, field, _ in COLUMNS))
+
+_INSERT = "INSERT INTO results ({}) VALUES ({})".format(
+    ", ".join(name for name, _, _ in COLUMNS), ", ".join("?" for _ in COLUMNS)
+)
+
+
+# ============================================================================
+# CLASE RESULTSSTORE
+# ============================================================================
+class ResultsStore:
+    """
+    Historial de resultados de MIA en SQLite, con índices para reportes.
+
+    RESPONSABILIDADES:
+        - Guardar cada fila con todos los campos MIA_*
+        - Consultas filtradas por portal, fecha, score y rubro
+        - Exportar a CSV (vista derivada)
+    """
+
+    def __init__(self, db_path: str):
+        """
+        PARÁMETROS:
+            db_path (str): Archivo SQLite
+        """
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        self._local = threading.local()
+
+        directory = os.path.dirname(os.path.abspath(self.db_path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    # ========================================================================
+    # CONEXIÓN
+    # ========================================================================
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión SQLite del thread actual (se crea en el primer uso)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def close(self) -> None:
+        """Cierra la conexión del thread actual."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ========================================================================
+    # ESCRITURA
+    # ========================================================================
+    @staticmethod
+    def _values(row: Dict[str, Any]) -> Tuple[Any, ...]:
+        """Valores de una fila MIA en el orden de COLUMNS."""
+        values = []
+        for name, field, sql_type in COLUMNS:
+            value = row.get(field)
+            if name == "technical_questions":
+                if isinstance(value, str):
+                    value = [value] if value else []
+                value = json.dumps(value or [], ensure_ascii=False)
+            elif sql_type == "INTEGER":
+                try:
+                    value = int(value) if value not in (None, "") else None
+                except (TypeError, ValueError):
+                    value = None
+            elif isinstance(value, (list, tuple)):
+                value = ", ".join(str(v) for v in value)
+            values.append(value)
+        return tuple(values)
+
+    def insert_many(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Inserta filas en una transacción.
+
+        RETORNO:
+            int: Filas insertadas
+        """
+        values = [self._values(row) for row in rows]
+        if not values:
+            return 0
+        conn = self._connection()
+        with conn:
+            conn.executemany(_INSERT, values)
+        return len(values)
+
+    # ========================================================================
+    # CONSULTAS
+    # ========================================================================
+    def query(self, portal: Optional[str] = None, rubro: Optional[str] = None,
+              min_score: Optional[int] = None, since: Optional[str] = None,
+              until: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Resultados filtrados, más recientes primero.
+
+        PARÁMETROS:
+            portal (str): Nombre exacto del portal
+            rubro (str): Rubro exacto (MIA_Rubro)
+            min_score (int): Score IA mínimo (inclusive)
+            since / until (str): Rango de Timestamp_Deteccion
+                                 ('YYYY-MM-DD' o 'YYYY-MM-DD HH:MM:SS')
+            limit (int): Máximo de filas
+
+        RETORNO:
+            list: Filas con los nombres de campo MIA (Preguntas como lista)
+        """
+        where, params = [], []
+        if portal is not None:
+            where.append("portal = ?")
+            params.append(portal)
+        if rubro is not None:
+            where.append("rubro = ?")
+            params.append(rubro)
+        if min_score is not None:
+            where.append("score_ia >= ?")
+            params.append(int(min_score))
+        if since is not None:
+            where.append("detected_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("detected_at < ?")
+            params.append(until)
+        sql = "SELECT {} FROM results".format(", ".join(name for name, _, _ in COLUMNS))
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY detected_at DESC, id DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        rows = []
+        for values in self._connection().execute(sql, params):
+            row = {field: value for (_, field, _), value in zip(COLUMNS, values)}
+            row["MIA_Preguntas_Tecnicas"] = json.loads(row["MIA_Preguntas_Tecnicas"] or "[]")
+            rows.append(row)
+        return rows
+
+    def count(self) -> int:
+        """Cantidad de resultados guardados."""
+        return self._connection().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def export_csv(self, path: str, fieldnames: Optional[List[str]] = None, **filters) -> int:
+        """
+        Exporta resultados a CSV (vista derivada de la base).
+
+        PARÁMETROS:
+            path (str): Archivo CSV a crear (se reemplaza)
+            fieldnames (list): Columnas (default: todos los campos MIA)
+            **filters: Mismos filtros que query()
+
+        RETORNO:
+            int: Filas exportadas
+        """
+        fieldnames = fieldnames or [field for _, field, _ in COLUMNS]
+        rows = self.query(**filters)
+        rows.reverse()   # Orden cronológico, como el CSV de salida
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writeheader()
+            for row in rows:
+                row["MIA_Preguntas_Tecnicas"] = "\n".join(row["MIA_Preguntas_Tecnicas"])
+                writer.writerow(row)
+        self.logger.info(f"{len(rows)} resultados exportados a {path}")
+        return len(rows)
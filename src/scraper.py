@@ -14,10 +14,18 @@ FUNCIONAMIENTO:
     1. Carga la lista de portales activos desde config.py (PORTALS)
     2. Carga las palabras clave de búsqueda desde config.py (TRIGGERS)
     3. Conecta a cada portal mediante HTTP GET
-    4. Extrae el contenido de texto de la página
+    4. Extrae el contenido de texto de la página (un parseo, ver html_extractor.py)
     5. Busca coincidencias con las palabras clave (triggers)
     6. Retorna lista de oportunidades detectadas con metadata
 
+MODO CONCURRENTE:
+    Con MAX_PARALLEL_PORTALS > 1 los portales se escanean en un pool de
+    threads acotado. SCRAPER_PER_HOST_CONCURRENCY limita los requests
+    simultáneos a un mismo host. La cadencia por host la define el rate
+    limiter adaptativo del HttpClient (src/rate_limiter.py): tasa propia
+    por portal, baja ante 429/503 y respeta Retry-After.
+    El tiempo total depende del portal más lento, no de la suma de todos.
+
 CONFIGURACIÓN REQUERIDA (config.py):
     - PORTALS: Lista de portales con URLs y configuración
     - TRIGGERS: Palabras clave que activan la detección de oportunidades
@@ -27,14 +35,19 @@ SALIDA:
     - portal: Nombre del portal
     - url: URL de la oportunidad
     - matched_keywords: Lista de triggers encontrados
+    - keyword_counts: Apariciones por keyword (triggers, search keywords, rubros)
     - content_snippet: Primeros 5000 caracteres del contenido
     - full_text: Texto completo de la página
 
+    Además, Scraper.portal_stats guarda el tiempo de escaneo de cada portal
+    de la última ejecución de search_all().
+
 LIMITACIONES ACTUALES (Stage 1):
-    - Conexión simple HTTP GET (sin autenticación)
+    - HTTP GET sin autenticación (vía HttpClient compartido, ver http_client.py)
     - No maneja JavaScript dinámico
     - No sigue enlaces internos
-    - Búsqueda básica de texto (case-insensitive)
+    - Búsqueda de texto sin distinguir mayúsculas ni acentos
+      (matcher Aho-Corasick, ver keyword_matcher.py)
 
 AUTOR: Water Tech S.A.
 VERSIÓN: 4.0 - Stage 1
@@ -42,14 +55,17 @@ VERSIÓN: 4.0 - Stage 1
 """
 
 import requests
-from bs4 import BeautifulSoup
 import json
 import logging
 import os
 import time
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from functools import wraps
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
+from urllib.parse import urlparse
 
 # ============================================================================
 # DECORADOR DE RETRY CON BACKOFF EXPONENCIAL
@@ -68,19 +84,23 @@ def retry_with_backoff(max_retries=3, base_delay=1, max_delay=16):
         - Intento 2: delay = base_delay * 2 (2s)
         - Intento 3: delay = base_delay * 4 (4s)
         - Agrega jitter aleatorio para evitar thundering herd
+        - La función decorada acepta max_attempts=N para limitar los
+          intentos de una llamada (ej: max_attempts=1 para una prueba
+          de circuit breaker, sin reintentos)
     """
     def decorator(func):
         @wraps(func)
-        def wrapper(*args, **kwargs):
+        def wrapper(*args, max_attempts=None, **kwargs):
+            attempts = max_attempts or max_retries
             retries = 0
-            while retries < max_retries:
+            while retries < attempts:
                 try:
                     return func(*args, **kwargs)
                 except (requests.exceptions.ConnectionError, 
                         requests.exceptions.Timeout,
                         requests.exceptions.HTTPError) as e:
                     retries += 1
-                    if retries >= max_retries:
+                    if retries >= attempts:
                         raise
                     
                     # Calcular delay con backoff exponencial
@@ -91,7 +111,7 @@ def retry_with_backoff(max_retries=3, base_delay=1, max_delay=16):
                     
                     logger = logging.getLogger(__name__)
                     logger.warning(
-                        f"Reintento {retries}/{max_retries} después de {actual_delay:.2f}s. "
+                        f"Reintento {retries}/{attempts} después de {actual_delay:.2f}s. "
                         f"Error: {type(e).__name__}: {str(e)}"
                     )
                     time.sleep(actual_delay)
@@ -121,37 +141,53 @@ class Scraper:
             1. Configura el logger para registro de operaciones
             2. Carga PORTALS desde config.py (lista de sitios a escanear)
             3. Carga TRIGGERS desde config.py (palabras clave de búsqueda)
-            4. Convierte triggers a minúsculas para búsqueda case-insensitive
+            4. Obtiene el matcher compilado de keywords (triggers, search
+               keywords y rubros; sin distinguir mayúsculas ni acentos)
         """
         self.logger = logging.getLogger(__name__)
-        from src.config import PORTALS, TRIGGERS
+        from src.config import PORTALS, TRIGGERS, HTTP_STREAMING, CIRCUIT_BREAKER_ENABLED
+        from src.keyword_matcher import get_default_matcher
+        from src.html_extractor import extract_response
         
         self.portals = PORTALS      # Lista de portales a escanear
         self.triggers = [t.lower() for t in TRIGGERS]  # Keywords en minúsculas
+        self.matcher = get_default_matcher()  # Aho-Corasick compilado una sola vez
+        self.extract = extract_response       # Parseo único con backend rápido (lxml)
+        self.streaming = HTTP_STREAMING       # Descarga limitada + prefiltro de triggers
         
         # Configuración de scraping desde variables de entorno
-        self.timeout = int(os.getenv('SCRAPER_TIMEOUT', '15'))
+        # (el timeout lo aplica el HttpClient: HTTP_CONNECT_TIMEOUT / HTTP_READ_TIMEOUT,
+        # este último con SCRAPER_TIMEOUT como default)
         self.max_retries = int(os.getenv('SCRAPER_MAX_RETRIES', '3'))
-        self.delay_seconds = float(os.getenv('SCRAPER_DELAY_SECONDS', '2'))
         
-        # User-Agent realista
-        self.user_agent = os.getenv(
-            'SCRAPER_USER_AGENT',
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
-            '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        )
+        # Concurrencia: límite global de portales en paralelo y límite por host
+        self.max_parallel_portals = max(1, int(os.getenv('MAX_PARALLEL_PORTALS', '1')))
+        self.per_host_concurrency = max(1, int(os.getenv('SCRAPER_PER_HOST_CONCURRENCY', '1')))
         
-        # Headers HTTP realistas
-        self.headers = {
-            'User-Agent': self.user_agent,
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'es-AR,es;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1'
-        }
+        # Slots de concurrencia por host (compartidos entre threads).
+        # La tasa de requests por host la controla el rate limiter del HttpClient.
+        self._host_lock = threading.Lock()
+        self._host_slots = {}         # {host: Semaphore}
         
-        self.logger.info(f"Scraper configurado: timeout={self.timeout}s, retries={self.max_retries}, delay={self.delay_seconds}s")
+        # Tiempos por portal de la última ejecución de search_all()
+        self.portal_stats: List[Dict[str, Any]] = []
+        
+        # Salud de cada portal entre ejecuciones (portales caídos se omiten)
+        self.breaker = None
+        if CIRCUIT_BREAKER_ENABLED:
+            from src.circuit_breaker import CircuitBreaker
+            self.breaker = CircuitBreaker()
+        
+        # Cliente HTTP compartido (pool keep-alive por host + headers comunes)
+        from src.http_client import get_http_client
+        self.http = get_http_client()
+        self.user_agent = self.http.headers['User-Agent']
+        self.headers = self.http.headers
+        
+        connect_timeout, read_timeout = self.http.timeout
+        self.logger.info(f"Scraper configurado: timeout={connect_timeout:g}s conexión/{read_timeout:g}s lectura, "
+                         f"retries={self.max_retries}, "
+                         f"paralelo={self.max_parallel_portals}, por_host={self.per_host_concurrency}")
         
     # ========================================================================
     # MÉTODO PRINCIPAL: ESCANEAR TODOS LOS PORTALES
@@ -162,49 +198,167 @@ class Scraper:
         
         PROCESO:
             1. Filtra solo portales con enabled=True
-            2. Escanea cada portal individualmente
-            3. Acumula todas las oportunidades encontradas
+            2. Escanea cada portal (en serie o en un pool de threads acotado
+               por MAX_PARALLEL_PORTALS)
+            3. Acumula todas las oportunidades encontradas, en el orden de PORTALS
             4. Maneja errores por portal (un error no detiene el proceso)
+            5. Registra el tiempo de cada portal en self.portal_stats
+            6. Actualiza y guarda el circuit breaker de cada portal
+               (portales con circuito abierto no se consultan)
         
         RETORNO:
             Lista de oportunidades (diccionarios) encontradas en todos los portales
         """
+        portals = [p for p in self.portals if p.get("enabled", True)]
+        run_start = time.perf_counter()
+        
+        workers = min(self.max_parallel_portals, len(portals))
+        if workers <= 1:
+            outcomes = [self._scan_portal_timed(portal) for portal in portals]
+        else:
+            self.logger.info(f"Escaneo concurrente: {len(portals)} portales, {workers} workers")
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan") as pool:
+                # map() conserva el orden de PORTALS en los resultados
+                outcomes = list(pool.map(self._scan_portal_timed, portals))
+        
         results = []
-        for portal in self.portals:
-            # Verificar si el portal está habilitado en la configuración
-            if not portal.get("enabled", True):
-                continue
-            
-            self.logger.info(f"Scanning {portal['name']}...")
-            try:
-                opportunities = self.scan_portal(portal)
-                results.extend(opportunities)  # Agregar oportunidades encontradas
-                
-                # Rate limiting: delay entre portales
-                if self.delay_seconds > 0:
-                    time.sleep(self.delay_seconds)
-                    
-            except Exception as e:
-                # Error en un portal no detiene el escaneo de otros
-                self.logger.error(f"Error crítico scanning {portal['name']}: {type(e).__name__}: {str(e)}")
-                self.logger.debug(f"Stack trace:", exc_info=True)
+        self.portal_stats = []
+        for opportunities, stats in outcomes:
+            results.extend(opportunities)
+            self.portal_stats.append(stats)
+        
+        if self.breaker is not None:
+            self.breaker.save()
+        self._log_run_summary(time.perf_counter() - run_start)
         return results
 
+    def _scan_portal_timed(self, portal) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Escanea un portal respetando los límites por host y mide su duración.
+        
+        CIRCUIT BREAKER:
+            - open: el portal no se consulta (status 'circuit_open')
+            - half_open: un único request de prueba, sin reintentos
+            - El resultado (status 'error' o no) actualiza el breaker
+        
+        RETORNO:
+            Tupla (oportunidades, estadísticas del portal)
+        """
+        host = urlparse(portal['url']).netloc.lower()
+        stats = {
+            "portal": portal['name'],
+            "host": host,
+            "status": "ok",
+            "opportunities": 0,
+            "seconds": 0.0,
+            "error": None,
+            "breaker": None
+        }
+        opportunities = []
+        
+        breaker_state = self.breaker.allow(portal['name']) if self.breaker is not None else "closed"
+        if breaker_state == "open":
+            stats["status"] = "circuit_open"
+            stats["breaker"] = self.breaker.describe(portal['name'])
+            self.logger.info(f"Omitiendo {portal['name']}: circuito {stats['breaker']}")
+            return opportunities, stats
+        
+        self.logger.info(f"Scanning {portal['name']}..." + (" (prueba de circuit breaker)" if breaker_state == "half_open" else ""))
+        start = time.perf_counter()
+        try:
+            with self._host_slot(host):
+                if breaker_state == "half_open":
+                    opportunities = self.scan_portal(portal, report=stats, max_attempts=1)
+                else:
+                    opportunities = self.scan_portal(portal, report=stats)
+        except Exception as e:
+            # Error en un portal no detiene el escaneo de otros
+            stats["status"] = "error"
+            stats["error"] = f"{type(e).__name__}: {str(e)}"
+            self.logger.error(f"Error crítico scanning {portal['name']}: {stats['error']}")
+            self.logger.debug(f"Stack trace:", exc_info=True)
+        
+        stats["seconds"] = round(time.perf_counter() - start, 3)
+        stats["opportunities"] = len(opportunities)
+        
+        if self.breaker is not None:
+            if stats["status"] == "error":
+                self.breaker.record_failure(portal['name'], stats["error"])
+            else:
+                self.breaker.record_success(portal['name'])
+            stats["breaker"] = self.breaker.describe(portal['name'])
+        return opportunities, stats
+
+    @contextmanager
+    def _host_slot(self, host: str):
+        """
+        Reserva un slot de concurrencia para un host.
+        
+        FUNCIONAMIENTO:
+            - Como máximo per_host_concurrency escaneos simultáneos por host
+            - Hosts distintos no se esperan entre sí
+            - La tasa de requests (y las pausas ante 429/503) las aplica el
+              HostRateLimiter del HttpClient compartido
+        """
+        with self._host_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.Semaphore(self.per_host_concurrency)
+                self._host_slots[host] = slot
+        
+        with slot:
+            yield
+
+    def _log_run_summary(self, total_seconds: float) -> None:
+        """Registra el resumen de tiempos por portal de la última ejecución."""
+        if not self.portal_stats:
+            self.logger.info("No hay portales habilitados para escanear.")
+            return
+        
+        summed = sum(s["seconds"] for s in self.portal_stats)
+        slowest = max(self.portal_stats, key=lambda s: s["seconds"])
+        self.logger.info(
+            f"Escaneo completado en {total_seconds:.2f}s "
+            f"(suma por portal: {summed:.2f}s, más lento: {slowest['portal']} {slowest['seconds']:.2f}s)"
+        )
+        for s in self.portal_stats:
+            breaker = f" | circuito: {s['breaker']}" if s.get('breaker') else ""
+            self.logger.info(
+                f"   - {s['portal']}: {s['status']} | {s['opportunities']} oportunidades | {s['seconds']:.2f}s{breaker}"
+            )
+        
+        limiter = getattr(self.http, 'rate_limiter', None)
+        if limiter is not None:
+            for host, state in limiter.snapshot().items():
+                if state["throttled"]:
+                    self.logger.warning(
+                        f"   - {host}: {state['throttled']} respuestas 429/503, "
+                        f"tasa actual {state['rate']:.2f} req/s (máx. {state['ceiling']:.2f})"
+                    )
+
     # ========================================================================
     # MÉTODO: ESCANEAR UN PORTAL INDIVIDUAL
     # ========================================================================
-    def scan_portal(self, portal):
+    def scan_portal(self, portal, report=None, max_attempts=None):
         """
         Escanea un portal específico en busca de triggers.
         
         PARÁMETROS:
             portal (dict): Diccionario con configuración del portal
                           Debe contener: 'name', 'url', 'enabled'
+            report (dict): Opcional. Se completa con 'status' y 'error'
+                          del escaneo (usado por search_all)
+            max_attempts (int): Opcional. Intentos HTTP (default: reintentos
+                          de retry_with_backoff; 1 = prueba de circuit breaker)
         
         PROCESO:
-            1. Realiza HTTP GET a la URL del portal
-            2. Parsea HTML con BeautifulSoup
-            3. Extrae texto completo de la página
+            1. Realiza HTTP GET condicional a la URL del portal
+               (si responde 304 no hay cambios y se omite el resto).
+               En modo streaming la descarga tiene límite de bytes y
+               filtro de Content-Type, y los triggers se buscan mientras
+               llegan los chunks: sin triggers no se parsea la página
+            2. Parsea HTML una sola vez (html_extractor, backend lxml)
+            3. Extrae texto visible de la página (sin scripts ni estilos)
             4. Busca coincidencias con triggers
             5. Si encuentra triggers, crea registro de oportunidad
         
@@ -213,30 +367,46 @@ class Scraper:
         """
         url = portal['url']
         found_ops = []  # Lista de oportunidades detectadas
+        if report is None:
+            report = {}
+        report.setdefault("status", "ok")
         
         try:
             # ----------------------------------------------------------------
             # CONEXIÓN HTTP AL PORTAL CON RETRY LOGIC
             # ----------------------------------------------------------------
             self.logger.info(f"   Conectando a {url}...")
-            resp = self._make_request(url)
-            if resp and resp.status_code == 200:
+            resp = self._make_request(url, max_attempts=max_attempts)
+            if resp is not None and resp.status_code == 304:
+                # ------------------------------------------------------------
+                # PÁGINA SIN CAMBIOS DESDE LA ÚLTIMA EJECUCIÓN
+                # ------------------------------------------------------------
+                # Se omite parseo, detección de triggers y análisis con IA
+                # ------------------------------------------------------------
+                self.logger.info("   [=] Sin cambios desde la última ejecución (304).")
+                report["status"] = "not_modified"
+            elif resp is not None and self._skip_streamed(resp, report):
+                # Descartada durante la descarga (tipo de contenido o sin
+                # triggers): no se parsea
+                pass
+            elif resp and resp.status_code == 200:
                 # ------------------------------------------------------------
                 # EXTRACCIÓN Y ANÁLISIS DE CONTENIDO
                 # ------------------------------------------------------------
-                soup = BeautifulSoup(resp.text, 'html.parser')
-                text_content = soup.get_text().lower()  # Texto en minúsculas
+                # Un único parseo: sin <script>/<style>, espacios normalizados.
+                # El mismo texto se usa para matching, snippet y full_text.
+                document = self.extract(resp)
+                text_content = document.text
                 
                 # ------------------------------------------------------------
                 # DETECCIÓN DE PALABRAS CLAVE (TRIGGERS)
                 # ------------------------------------------------------------
-                # Busca TODAS las keywords que aparecen en el contenido
-                # Registra cada una para el análisis posterior con IA
+                # Una sola pasada del matcher detecta TODAS las keywords
+                # (sin distinguir mayúsculas ni acentos) con sus posiciones.
+                # Los triggers deciden si hay oportunidad.
                 # ------------------------------------------------------------
-                matched_keywords = []
-                for trigger in self.triggers:
-                    if trigger in text_content:
-                        matched_keywords.append(trigger)
+                match = self.matcher.search(text_content)
+                matched_keywords = match.keywords('trigger')
                 
                 if matched_keywords:
                    # ---------------------------------------------------------
@@ -249,16 +419,21 @@ class Scraper:
                        "portal": portal['name'],                    # Nombre del portal
                        "url": url,                                  # URL de la oportunidad
                        "matched_keywords": matched_keywords,        # Triggers encontrados
-                       "content_snippet": soup.get_text()[:5000],  # Primeros 5000 chars
-                       "full_text": soup.get_text()                # Texto completo para IA
+                       "keyword_counts": match.counts,              # Apariciones por keyword
+                       "content_snippet": text_content[:5000],     # Primeros 5000 chars
+                       "full_text": text_content                   # Texto completo para IA
                    })
                 else:
                     self.logger.info("   [-] No se encontraron palabras clave.")
             elif resp:
                 # Manejo específico de códigos HTTP
                 self._handle_http_error(resp.status_code, url)
+                report["status"] = "error"
+                report["error"] = f"HTTP {resp.status_code}"
             else:
                 self.logger.error(f"   [ERROR] No se pudo obtener respuesta de {url}")
+                report["status"] = "error"
+                report["error"] = "Sin respuesta"
                 
         # ====================================================================
         # MANEJO DE ERRORES DE CONEXIÓN
@@ -266,16 +441,22 @@ class Scraper:
         except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
             # Errores comunes: DNS no resuelve, timeout, sitio caído
             self.logger.warning(
-                f"   [ALERTA] No se pudo conectar a {url} después de {self.max_retries} intentos. "
+                f"   [ALERTA] No se pudo conectar a {url} después de {max_attempts or self.max_retries} intentos. "
                 f"Error: {type(e).__name__}: {str(e)}"
             )
+            report["status"] = "error"
+            report["error"] = f"{type(e).__name__}: {str(e)}"
         except requests.exceptions.HTTPError as e:
             # Errores HTTP (4xx, 5xx)
             self.logger.error(f"   [ERROR HTTP] Error en {url}: {e}")
+            report["status"] = "error"
+            report["error"] = str(e)
         except Exception as e:
             # Cualquier otro error inesperado
             self.logger.error(f"   [ERROR] Excepción inesperada en {url}: {type(e).__name__}: {str(e)}")
             self.logger.debug("Stack trace:", exc_info=True)
+            report["status"] = "error"
+            report["error"] = f"{type(e).__name__}: {str(e)}"
             
         return found_ops
     
@@ -295,17 +476,30 @@ class Scraper:
         
         CARACTERÍSTICAS:
             - Retry automático con backoff exponencial
-            - Headers realistas
-            - Timeout configurable
+            - Conexiones keep-alive reutilizadas (HttpClient compartido)
+            - Timeouts separados de conexión y lectura
+            - GET condicional (ETag / Last-Modified): retorna 304 si no cambió
+            - Streaming (HTTP_STREAMING): límite de bytes, filtro de tipo de
+              contenido y detección temprana de triggers (stream_info)
             - Raise HTTPError para códigos 4xx/5xx
         """
         try:
-            response = requests.get(
-                url,
-                headers=self.headers,
-                timeout=self.timeout,
-                allow_redirects=True
-            )
+            if self.streaming:
+                # Prefiltro: el matcher recorre el texto mientras se descarga
+                # (un scanner nuevo por intento, para que un reintento no
+                # acumule estado del anterior)
+                scanner = self.matcher.scanner()
+                state = {"hit": False}
+
+                def on_text(text):
+                    if not state["hit"] and text:
+                        state["hit"] = bool(scanner.feed(text).result.keywords('trigger'))
+
+                response = self.http.get_streamed(url, conditional=True, on_text=on_text)
+                if response.status_code == 200:
+                    response.stream_info["trigger_hit"] = state["hit"] or bool(scanner.close().keywords('trigger'))
+            else:
+                response = self.http.get(url, conditional=True)
             
             # Raise exception para códigos de error
             response.raise_for_status()
@@ -316,6 +510,44 @@ class Scraper:
             self.logger.debug(f"Request failed: {type(e).__name__}: {str(e)}")
             raise
     
+    # ========================================================================
+    # MÉTODO PRIVADO: DESCARTE TEMPRANO DE DESCARGAS EN STREAMING
+    # ========================================================================
+    def _skip_streamed(self, resp: requests.Response, report: Dict[str, Any]) -> bool:
+        """
+        Decide si una respuesta descargada en streaming se descarta sin parsear.
+        
+        PARÁMETROS:
+            resp (Response): Respuesta con stream_info (ver HttpClient.get_streamed)
+            report (dict): Reporte del escaneo (se marca status 'skipped')
+        
+        RETORNO:
+            bool: True si no hay que parsear la página
+        
+        REGLAS:
+            - Content-Type no permitido (PDF, imágenes, etc.): se descarta
+            - Sin triggers en el texto descargado: se descarta, salvo que
+              hubo bytes no decodificables (el prefiltro no es confiable)
+            - Con triggers pero truncada por tamaño: se parsea lo descargado
+        """
+        info = getattr(resp, 'stream_info', None)
+        if not info or resp.status_code != 200:
+            return False
+        
+        if info["skipped"] == "content_type":
+            self.logger.info(f"   [-] Contenido omitido (Content-Type: {info['content_type']}).")
+            report["status"] = "skipped"
+            return True
+        
+        if not info.get("trigger_hit") and not info["decode_errors"]:
+            detail = f", truncada en {info['bytes']} bytes" if info["truncated"] else ""
+            self.logger.info(f"   [-] No se encontraron palabras clave (sin parseo{detail}).")
+            return True
+        
+        if info["truncated"]:
+            self.logger.warning(f"   [!] Página truncada en {info['bytes']} bytes; se analiza lo descargado.")
+        return False
+    
     # ========================================================================
     # MÉTODO PRIVADO: MANEJAR ERRORES HTTP ESPECÍFICOS
     # ========================================================================
@@ -344,7 +576,7 @@ class Scraper:
         if status_code >= 500:
             self.logger.error(f"   [ERROR {status_code}] {message} en {url}")
         elif status_code == 429:
-            self.logger.warning(f"   [RATE LIMIT] {message} en {url} - Considerar aumentar delay")
+            self.logger.warning(f"   [RATE LIMIT] {message} en {url} - la tasa del host se redujo automáticamente")
         elif status_code in [401, 403]:
             self.logger.warning(f"   [ACCESO DENEGADO {status_code}] {message} en {url}")
         else:
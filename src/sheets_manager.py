@@ -5,14 +5,18 @@ MIA V4.0 - MÓDULO DE GESTIÓN DE SALIDA (sheets_manager.py)
 
 OBJETIVO GENERAL:
     Gestionar la salida de resultados del sistema MIA, guardando las
-    oportunidades analizadas en archivos CSV y (futuro) Google Sheets.
+    oportunidades analizadas en archivos CSV y Google Sheets.
 
 ETAPA: 3 - ALMACENAMIENTO
 
 FUNCIONAMIENTO:
     1. Recibe datos de oportunidades analizadas (dict)
     2. Valida datos antes de escribir
-    3. Detecta y evita duplicados
+    3. Detecta y evita duplicados (índice SQLite, dedupe_store.py): una
+       oportunidad es portal + N° de licitación (o URL) y se omite solo
+       si su contenido no cambió. Al iniciar solo se leen las filas
+       nuevas del CSV. Una fila se registra en el índice cuando se
+       escribe, no cuando entra al buffer
     4. Crea backups automáticos
     5. Agrega timestamps y metadata
     6. Escribe cada oportunidad como una fila en results_stage1.csv
@@ -27,7 +31,19 @@ SALIDA ACTUAL (Stage 1):
         * MIA_Keywords_Detectadas: Triggers encontrados
         * MIA_Rubro: Clasificación por rubro
         * MIA_Score_IA: Score de relevancia (0-100)
+        * MIA_Score_Local: Score local previo a Gemini (0-100, relevance.py)
+        * MIA_Tier: Nivel de análisis (triage / completo, modo cascada)
+        * MIA_Modelo: Modelo de Gemini que produjo el análisis
         * MIA_Resumen_Tecnico: Resumen en español
+        * MIA_ID_Licitacion: N° de licitación (si el portal lo informa)
+        * MIA_Hash_Contenido: Hash del texto analizado (dedupe_store.py)
+
+ESCRITURA EN SESIÓN (buffered_writer):
+    Dentro de `with sheets.buffered_writer():` el CSV se abre una sola vez,
+    las filas se acumulan en memoria y se escriben por lotes cada
+    OUTPUT_FLUSH_ROWS filas u OUTPUT_FLUSH_SECONDS segundos, y al salir del
+    bloque. Fuera de una sesión, add_row escribe cada fila (abrir/cerrar).
+    El backup del día se verifica una vez por ejecución.
 
 MEJORAS FASE 1:
     - ✅ Validación de datos antes de escribir
@@ -36,9 +52,23 @@ MEJORAS FASE 1:
     - ✅ Timestamps automáticos
     - ✅ Configuración desde variables de entorno
 
+HISTORIAL SQLITE (results_store.py):
+    Con OUTPUT_BACKENDS=csv,sqlite (o solo sqlite) cada fila se guarda
+    también en results_stage1.db (OUTPUT_SQLITE_FILE), con todos los
+    campos MIA_* (incluidos MIA_Link_al_Pliego, MIA_Empresa_Asignada y
+    MIA_Preguntas_Tecnicas, que el CSV no guarda) e índices por portal,
+    fecha, score y rubro. El CSV se puede regenerar desde la base.
+
+GOOGLE SHEETS (sheets_sink.py):
+    Con data/service_account.json y GOOGLE_SHEETS_SPREADSHEET_ID, las
+    filas también se envían a la hoja GOOGLE_SHEETS_WORKSHEET_NAME: una
+    llamada values.append por flush (no por fila). Las URLs de la hoja se
+    leen una vez al iniciar y cuentan como procesadas. El CSV se sigue
+    escribiendo como registro local. Las filas que no se pudieron enviar al
+    terminar quedan en GOOGLE_SHEETS_SPOOL_FILE y se reenvían en la
+    próxima ejecución.
+
 FUTURAS FUNCIONALIDADES:
-    - Integración con Google Sheets API
-    - Sincronización automática con spreadsheet
     - Notificaciones por email
     - Dashboard en tiempo real
 
@@ -59,10 +89,35 @@ import json
 import csv
 import os
 import shutil
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, Any, Set
+from typing import Dict, Any, List, Optional
 from urllib.parse import urlparse
 
+from src.dedupe_store import DedupeStore, opportunity_identity, row_identity
+from src.results_store import ResultsStore
+
+# Backends de salida locales (OUTPUT_BACKENDS)
+OUTPUT_BACKENDS = ("csv", "sqlite")
+
+# Columnas de salida (CSV y Google Sheets), en orden
+DEFAULT_FIELDNAMES = [
+    "Timestamp_Deteccion",
+    "Portal",
+    "MIA_URL",
+    "MIA_Keywords_Detectadas",
+    "MIA_Rubro",
+    "MIA_Score_IA",
+    "MIA_Score_Local",
+    "MIA_Tier",
+    "MIA_Modelo",
+    "MIA_Resumen_Tecnico",
+    "MIA_ID_Licitacion",
+    "MIA_Hash_Contenido"
+]
+
 # ============================================================================
 # CLASE SHEETSMANAGER - GESTOR DE SALIDA DE DATOS
 # ============================================================================
@@ -76,28 +131,34 @@ class SheetsManager:
         - Crear backups automáticos
         - Escribir resultados en archivo CSV
         - Agregar timestamps y metadata
-        - (Futuro) Sincronizar con Google Sheets
+        - Enviar filas a Google Sheets por lotes (sheets_sink.py)
+        - Guardar el historial consultable en SQLite (results_store.py)
         - Manejar encoding UTF-8 para caracteres especiales
     """
     
-    def __init__(self, key_path="data/service_account.json"):
+    def __init__(self, key_path="data/service_account.json", sheets_sink=None):
         """
         CONSTRUCTOR - Inicialización del SheetsManager
         
         PARÁMETROS:
             key_path (str): Ruta al archivo de credenciales de Google Sheets
-                           (actualmente no se usa, preparado para futuro)
+                           (service account)
+            sheets_sink (GoogleSheetsSink): Salida a Sheets ya configurada
+                           (default: se crea con key_path y
+                           GOOGLE_SHEETS_SPREADSHEET_ID si existen)
         
         ACCIONES:
             1. Configura logger para registro de operaciones
             2. Verifica existencia de credenciales de Google Sheets
-            3. Carga configuración desde variables de entorno
+            3. Carga configuración desde variables de entorno (con
+               OUTPUT_BACKENDS=csv,sqlite abre también results_stage1.db)
             4. Inicializa conjunto de URLs procesadas
             5. Crea directorio de backups si no existe
-            6. Carga URLs ya procesadas del CSV existente
-        
-        ESTADO ACTUAL:
-            Solo modo CSV (Google Sheets no implementado)
+            6. Abre el índice de oportunidades procesadas (lee solo las
+               filas del CSV que todavía no indexó)
+            7. Con credenciales y spreadsheet: conecta la salida a Google
+               Sheets (una lectura de la hoja; sus filas cuentan como
+               procesadas). Si falla, sigue solo con CSV
         """
         self.logger = logging.getLogger(__name__)
         self.key_path = key_path
@@ -109,9 +170,37 @@ class SheetsManager:
         self.output_file = os.getenv('OUTPUT_CSV_FILE', 'results_stage1.csv')
         self.create_backup = os.getenv('OUTPUT_CREATE_BACKUP', 'true').lower() == 'true'
         self.backup_dir = os.getenv('OUTPUT_BACKUP_DIR', 'backups')
-        
-        # Conjunto para tracking de URLs procesadas (evitar duplicados)
-        self.processed_urls: Set[str] = set()
+        self.flush_rows = max(1, int(os.getenv('OUTPUT_FLUSH_ROWS', '50')))
+        self.flush_seconds = float(os.getenv('OUTPUT_FLUSH_SECONDS', '10'))
+        self.dedupe_db = os.getenv('OUTPUT_DEDUPE_DB') or os.path.splitext(self.output_file)[0] + '.dedupe.db'
+        self.sqlite_file = os.getenv('OUTPUT_SQLITE_FILE') or os.path.splitext(self.output_file)[0] + '.db'
+        self.sheets_spool = (os.getenv('GOOGLE_SHEETS_SPOOL_FILE')
+                             or os.path.splitext(self.output_file)[0] + '.sheets_pending.jsonl')
+        self.backends = self._parse_backends(os.getenv('OUTPUT_BACKENDS', 'csv'))
+        self.write_csv = "csv" in self.backends
+        
+        # Historial SQLite consultable (results_store.py)
+        self.results_store = ResultsStore(self.sqlite_file) if "sqlite" in self.backends else None
+        
+        # Sesión de escritura (buffered_writer): archivo abierto + filas en buffer
+        self._in_session = False
+        self._session_file = None
+        self._session_writer = None
+        self._buffer: List[Dict[str, Any]] = []
+        self._last_flush = 0.0
+        self._backup_checked = False
+        
+        # Índice de oportunidades procesadas (clave -> hash de contenido,
+        # evita duplicados): se carga en _load_processed_items. Las filas en
+        # buffer quedan en _pending_items hasta que el flush las escribe
+        self.processed_items: Optional[DedupeStore] = None
+        self._pending_items: Dict[str, str] = {}
+        
+        # Filas que no se pudieron escribir en CSV/SQLite en esta ejecución
+        self.failed_rows = 0
+        
+        # Serializa add_row: verificación de duplicados + escritura del CSV
+        self._write_lock = threading.Lock()
         
         # Crear directorio de backups si no existe
         if self.create_backup and not os.path.exists(self.backup_dir):
@@ -119,9 +208,17 @@ class SheetsManager:
             self.logger.info(f"Directorio de backups creado: {self.backup_dir}")
         
         # Cargar URLs ya procesadas si el archivo existe
-        self._load_processed_urls()
+        self._load_processed_items()
+        
+        # Google Sheets: filas por lotes (sheets_sink.py)
+        self.sheets_sink = sheets_sink
+        if self.sheets_sink is None and self.has_creds:
+            self.sheets_sink = self._connect_sheets()
+        if self.sheets_sink is not None:
+            self.processed_items.update(self.sheets_sink.existing.items(), source="sheets")
         
-        self.logger.info(f"SheetsManager configurado: output={self.output_file}, backup={self.create_backup}")
+        self.logger.info(f"SheetsManager configurado: output={self.output_file}, "
+                         f"backends={','.join(self.backends)}, backup={self.create_backup}")
 
     # ========================================================================
     # MÉTODO PRINCIPAL: AGREGAR FILA DE DATOS
@@ -134,13 +231,18 @@ class SheetsManager:
             data (dict): Diccionario con los datos de la oportunidad
                         Debe contener las claves: Portal, MIA_URL, 
                         MIA_Keywords_Detectadas, MIA_Rubro, MIA_Score_IA,
-                        MIA_Resumen_Tecnico
+                        MIA_Resumen_Tecnico (opcionales: MIA_ID_Licitacion,
+                        MIA_Hash_Contenido)
         
         PROCESO:
             1. Valida los datos
-            2. Verifica duplicados
-            3. (Futuro) Si hay credenciales, escribe en Google Sheets
-            4. Escribe en CSV como fallback o método principal
+            2. Verifica duplicados: se omite la oportunidad (portal + N° de
+               licitación o URL) ya escrita con el mismo contenido; si el
+               contenido cambió se agrega una fila nueva
+            3. Con Google Sheets conectado, agrega la fila al lote del sink
+            4. Escribe en los backends de OUTPUT_BACKENDS: CSV y/o SQLite
+               (con una sesión buffered_writer abierta, la fila queda en
+               buffer)
         
         RETORNO:
             bool: True si se agregó exitosamente, False si hubo error o duplicado
@@ -150,48 +252,69 @@ class SheetsManager:
             self.logger.error(f"Datos inválidos, no se agregará la fila: {data.get('MIA_URL', 'URL desconocida')}")
             return False
         
-        # Verificar duplicados
-        url = data.get('MIA_URL', '')
-        if url in self.processed_urls:
-            self.logger.warning(f"URL duplicada, omitiendo: {url}")
-            return False
-        
-        if self.has_creds:
-            # ----------------------------------------------------------------
-            # FUTURO: INTEGRACIÓN CON GOOGLE SHEETS
-            # ----------------------------------------------------------------
-            # TODO: Implementar lógica de GSpread cuando existan credenciales
-            # Permitirá sincronización automática con spreadsheet online
-            # ----------------------------------------------------------------
-            pass
-        
-        # Escribir en CSV (método actual)
-        success = self._write_csv(data)
-        
-        if success:
-            # Agregar URL a conjunto de procesadas
-            self.processed_urls.add(url)
-        
-        return success
+        with self._write_lock:
+            # Verificar duplicados
+            url = data.get('MIA_URL', '')
+            key, digest = row_identity(data)
+            state = self._status(key, digest)
+            if state == 'unchanged':
+                self.logger.warning(f"Oportunidad duplicada (sin cambios), omitiendo: {url}")
+                return False
+            if state == 'changed':
+                self.logger.info(f"Oportunidad con cambios desde la última ejecución: {url}")
+            
+            enriched = self._enrich_data(data)
+            if self.sheets_sink is not None:
+                # ------------------------------------------------------------
+                # GOOGLE SHEETS: la fila se envía en el próximo lote
+                # ------------------------------------------------------------
+                # En sesión se envía con cada flush; fuera de una sesión al
+                # juntar flush_rows filas (y al final, ver close)
+                # ------------------------------------------------------------
+                self.sheets_sink.append(enriched)
+                if not self._in_session and len(self.sheets_sink) >= self.flush_rows:
+                    self.sheets_sink.flush()
+            
+            if self._in_session:
+                # Sesión abierta: la fila queda en buffer hasta el próximo flush
+                # (el índice la registra recién cuando se escribe)
+                self._buffer.append(enriched)
+                if key:
+                    self._pending_items[key] = digest
+                if (len(self._buffer) >= self.flush_rows
+                        or time.monotonic() - self._last_flush >= self.flush_seconds):
+                    self._flush_buffer()
+                return True
+            
+            # Escribir en CSV (registro local, también con Google Sheets)
+            # y en el historial SQLite
+            success = self._write_csv(enriched) if self.write_csv else True
+            if success and self.results_store is not None:
+                success = self._write_results([enriched])
+            
+            if success:
+                # Registrar la oportunidad (upsert del hash de contenido)
+                self.processed_items.add(key, digest)
+            else:
+                self.failed_rows += 1
+            
+            return success
         
     # ========================================================================
     # MÉTODO PRIVADO: ESCRIBIR EN ARCHIVO CSV
     # ========================================================================
     def _write_csv(self, data: Dict[str, Any]) -> bool:
         """
-        Escribe una fila de datos en el archivo CSV.
+        Escribe una fila de datos en el archivo CSV (fuera de una sesión
+        buffered_writer: abre y cierra el archivo por fila).
         
         PARÁMETROS:
-            data (dict): Diccionario con datos de la oportunidad
+            data (dict): Datos de la oportunidad (con _enrich_data)
         
         PROCESO:
-            1. Crea backup si es la primera escritura del día
-            2. Verifica si el archivo CSV ya existe
-            3. Define las columnas del CSV (fieldnames)
-            4. Abre archivo en modo append ('a')
-            5. Si es nuevo, escribe encabezados primero
-            6. Agrega timestamps y metadata
-            7. Escribe la fila de datos
+            1. Abre el CSV (_open_output: backup una vez por ejecución,
+               columnas y encabezados si es nuevo)
+            2. Escribe la fila de datos
         
         CARACTERÍSTICAS:
             - Encoding: UTF-8 (soporta caracteres especiales españoles)
@@ -203,45 +326,264 @@ class SheetsManager:
             bool: True si se escribió exitosamente, False si hubo error
         """
         try:
-            # Verificar si el archivo ya existe
-            file_exists = os.path.isfile(self.output_file)
-            
-            # Crear backup si es necesario
-            if file_exists and self.create_backup:
-                self._create_backup()
-            
-            # Agregar timestamps y metadata
-            enriched_data = self._enrich_data(data)
-            
-            # Definir columnas del CSV (orden de las columnas)
-            fieldnames = [
-                "Timestamp_Deteccion",
-                "Portal", 
-                "MIA_URL", 
-                "MIA_Keywords_Detectadas", 
-                "MIA_Rubro", 
-                "MIA_Score_IA", 
-                "MIA_Resumen_Tecnico"
-            ]
-            
-            # Abrir archivo en modo append con encoding UTF-8
-            with open(self.output_file, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
-                
-                # Si el archivo es nuevo, escribir encabezados
-                if not file_exists:
-                    writer.writeheader()
-                    self.logger.info(f"Archivo CSV creado: {self.output_file}")
-                
-                # Escribir fila de datos
-                writer.writerow(enriched_data)
-            
+            f, writer = self._open_output()
+            with f:
+                # Escribir fila de datos (ya con timestamps y metadata)
+                writer.writerow(data)
             return True
             
         except Exception as e:
             self.logger.error(f"Error escribiendo en CSV: {type(e).__name__}: {str(e)}")
             return False
     
+    # ========================================================================
+    # MÉTODO PRIVADO: ABRIR EL CSV PARA AGREGAR FILAS
+    # ========================================================================
+    def _open_output(self):
+        """
+        Abre el CSV en modo append y prepara el DictWriter.
+        
+        PROCESO:
+            1. Crea backup del día (una vez por ejecución)
+            2. Define las columnas: las del CSV existente o las actuales
+            3. Si el archivo es nuevo, escribe los encabezados
+        
+        RETORNO:
+            (archivo abierto, csv.DictWriter)
+        """
+        # Verificar si el archivo ya existe
+        file_exists = os.path.isfile(self.output_file)
+        
+        # Crear backup si es necesario (una vez por ejecución)
+        if file_exists and self.create_backup and not self._backup_checked:
+            self._create_backup()
+        self._backup_checked = True
+        
+        # Definir columnas del CSV (orden de las columnas)
+        fieldnames = list(DEFAULT_FIELDNAMES)
+        
+        # Un CSV creado con otras columnas conserva su encabezado
+        # (las columnas nuevas se agregan al crear un archivo nuevo)
+        if file_exists:
+            fieldnames = self._existing_fieldnames() or fieldnames
+        
+        # Abrir archivo en modo append con encoding UTF-8
+        f = open(self.output_file, 'a', newline='', encoding='utf-8')
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+        
+        # Si el archivo es nuevo, escribir encabezados
+        if not file_exists:
+            writer.writeheader()
+            self.logger.info(f"Archivo CSV creado: {self.output_file}")
+        return f, writer
+    
+    # ========================================================================
+    # FILTRO PREVIO AL ANÁLISIS: OPORTUNIDADES SIN CAMBIOS
+    # ========================================================================
+    def filter_unchanged(self, ops: List[Dict[str, Any]]):
+        """
+        Separa las oportunidades ya escritas con el mismo contenido, para
+        no enviarlas a Gemini.
+        
+        PARÁMETROS:
+            ops (list): Oportunidades del scraper (portal, url,
+                        numero_licitacion opcional, full_text)
+        
+        PROCESO:
+            1. Calcula clave (portal + N° de licitación o URL) y hash del
+               texto; los guarda en op['dedupe_key'] / op['content_hash']
+            2. Nuevas y con cambios pasan; también se descartan repetidas
+               dentro de la misma ejecución
+        
+        RETORNO:
+            (pendientes, sin_cambios)
+        """
+        pending, unchanged, seen = [], [], set()
+        for op in ops:
+            key, digest = opportunity_identity(op)
+            op['dedupe_key'], op['content_hash'] = key, digest
+            if (key, digest) in seen or self._status(key, digest) == 'unchanged':
+                unchanged.append(op)
+                continue
+            seen.add((key, digest))
+            pending.append(op)
+        return pending, unchanged
+    
+    # ========================================================================
+    # SESIÓN DE ESCRITURA CON BUFFER
+    # ========================================================================
+    @contextmanager
+    def buffered_writer(self, flush_rows: Optional[int] = None, flush_seconds: Optional[float] = None):
+        """
+        Sesión de escritura: el CSV se abre una vez y las filas se escriben
+        por lotes.
+        
+        PARÁMETROS:
+            flush_rows (int): Filas en buffer antes de escribir
+                              (default: OUTPUT_FLUSH_ROWS)
+            flush_seconds (float): Antigüedad máxima del buffer
+                                   (default: OUTPUT_FLUSH_SECONDS)
+        
+        USO:
+            with sheets.buffered_writer():
+                for row in rows:
+                    sheets.add_row(row)
+            # Al salir: flush final y cierre del archivo (también si hay error)
+        """
+        with self._write_lock:
+            if flush_rows is not None:
+                self.flush_rows = max(1, flush_rows)
+            if flush_seconds is not None:
+                self.flush_seconds = flush_seconds
+            if self.write_csv:
+                self._session_file, self._session_writer = self._open_output()
+            self._in_session = True
+            self._last_flush = time.monotonic()
+        try:
+            yield self
+        finally:
+            with self._write_lock:
+                self._flush_buffer()
+                self._in_session = False
+                if self._session_file is not None:
+                    self._session_file.close()
+                self._session_file = None
+                self._session_writer = None
+    
+    def flush(self) -> int:
+        """
+        Escribe las filas en buffer de la sesión abierta.
+        
+        RETORNO:
+            int: Filas escritas
+        """
+        with self._write_lock:
+            return self._flush_buffer()
+    
+    def close(self) -> None:
+        """
+        Envía a Google Sheets las filas pendientes (fin de la ejecución).
+        Las que no se pudieron enviar quedan en el spool del sink
+        (GOOGLE_SHEETS_SPOOL_FILE) y se reenvían en la próxima ejecución.
+        """
+        with self._write_lock:
+            if self.sheets_sink is not None:
+                self.sheets_sink.close()
+    
+    def _flush_buffer(self) -> int:
+        """
+        Escribe el buffer en el archivo de la sesión y en el historial
+        SQLite, y envía el lote pendiente a Google Sheets. Requiere
+        _write_lock.
+        """
+        self._last_flush = time.monotonic()
+        if self.sheets_sink is not None:
+            self.sheets_sink.flush()
+        if not self._buffer or not self._in_session:
+            return 0
+        rows, self._buffer = self._buffer, []
+        identities = [row_identity(row) for row in rows]
+        for key, _ in identities:
+            self._pending_items.pop(key, None)
+        try:
+            if self._session_writer is not None:
+                self._session_writer.writerows(rows)
+                self._session_file.flush()
+        except Exception as e:
+            self.logger.error(f"Error escribiendo {len(rows)} filas en CSV: {type(e).__name__}: {str(e)}")
+            self.failed_rows += len(rows)
+            return 0
+        if self.results_store is not None and not self._write_results(rows):
+            self.failed_rows += len(rows)
+            return 0
+        # Filas escritas: recién ahora cuentan como procesadas
+        self.processed_items.update(identities)
+        self.logger.debug(f"{len(rows)} filas escritas ({','.join(self.backends)})")
+        return len(rows)
+    
+    def _status(self, key: str, digest: str) -> str:
+        """
+        Estado de una oportunidad (ver DedupeStore.status), contando las
+        filas en buffer que todavía no se escribieron.
+        """
+        if key in self._pending_items:
+            pending = self._pending_items[key]
+            return 'changed' if digest and pending != digest else 'unchanged'
+        return self.processed_items.status(key, digest)
+    
+    def _write_results(self, rows: List[Dict[str, Any]]) -> bool:
+        """Inserta filas en el historial SQLite (una transacción)."""
+        try:
+            self.results_store.insert_many(rows)
+            return True
+        except Exception as e:
+            self.logger.error(f"Error escribiendo {len(rows)} filas en {self.sqlite_file}: "
+                              f"{type(e).__name__}: {str(e)}")
+            return False
+    
+    # ========================================================================
+    # MÉTODO PRIVADO: BACKENDS DE SALIDA
+    # ========================================================================
+    def _parse_backends(self, value: str) -> List[str]:
+        """
+        Lista de backends de OUTPUT_BACKENDS ('csv', 'sqlite').
+        
+        RETORNO:
+            list: Backends válidos, en orden (default: ['csv'])
+        """
+        backends = []
+        for name in (part.strip().lower() for part in value.split(',')):
+            if not name:
+                continue
+            if name not in OUTPUT_BACKENDS:
+                self.logger.warning(f"Backend de salida desconocido '{name}' (válidos: {', '.join(OUTPUT_BACKENDS)})")
+            elif name not in backends:
+                backends.append(name)
+        return backends or ["csv"]
+    
+    # ========================================================================
+    # MÉTODO PRIVADO: CONECTAR GOOGLE SHEETS
+    # ========================================================================
+    def _connect_sheets(self):
+        """
+        Crea la salida a Google Sheets con la service account.
+        
+        RETORNO:
+            GoogleSheetsSink, o None si falta el spreadsheet o falla la
+            conexión (se sigue solo con CSV)
+        """
+        spreadsheet_id = os.getenv('GOOGLE_SHEETS_SPREADSHEET_ID')
+        if not spreadsheet_id:
+            self.logger.warning("GOOGLE_SHEETS_SPREADSHEET_ID no configurado. Outputting to CSV only.")
+            return None
+        try:
+            from src.sheets_sink import GoogleSheetsSink, DEFAULT_API_URL
+            return GoogleSheetsSink.from_service_account(
+                self.key_path, spreadsheet_id,
+                worksheet=os.getenv('GOOGLE_SHEETS_WORKSHEET_NAME', 'Oportunidades'),
+                columns=DEFAULT_FIELDNAMES,
+                api_url=os.getenv('GOOGLE_SHEETS_API_URL', DEFAULT_API_URL),
+                spool_path=self.sheets_spool
+            )
+        except Exception as e:
+            self.logger.error(f"No se pudo conectar Google Sheets: {type(e).__name__}: {str(e)}. "
+                              f"Outputting to CSV only.")
+            return None
+    
+    # ========================================================================
+    # MÉTODO PRIVADO: LEER ENCABEZADO DEL CSV EXISTENTE
+    # ========================================================================
+    def _existing_fieldnames(self):
+        """
+        Retorna las columnas del CSV existente (None si no se puede leer).
+        """
+        try:
+            with open(self.output_file, 'r', newline='', encoding='utf-8') as f:
+                header = next(csv.reader(f), None)
+            return header or None
+        except OSError:
+            return None
+    
     # ========================================================================
     # MÉTODO PRIVADO: VALIDAR DATOS
     # ========================================================================
@@ -350,25 +692,23 @@ class SheetsManager:
     # ========================================================================
     # MÉTODO PRIVADO: CARGAR URLs PROCESADAS
     # ========================================================================
-    def _load_processed_urls(self) -> None:
+    def _load_processed_items(self) -> None:
         """
-        Carga las URLs ya procesadas del CSV existente.
+        Abre el índice persistente de URLs procesadas (dedupe_store.py).
         
         OBJETIVO:
-            Evitar procesar duplicados entre ejecuciones
+            Evitar procesar duplicados entre ejecuciones sin recorrer todo
+            el CSV: solo se leen las filas agregadas desde la última
+            ejecución (o todo si el CSV se reemplazó)
         """
-        if not os.path.exists(self.output_file):
-            return
-        
         try:
-            with open(self.output_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    url = row.get('MIA_URL')
-                    if url:
-                        self.processed_urls.add(url)
-            
-            self.logger.info(f"Cargadas {len(self.processed_urls)} URLs procesadas previamente")
+            # Sin backend CSV el índice no tiene archivo que sincronizar
+            csv_path = self.output_file if self.write_csv else None
+            self.processed_items = DedupeStore(self.dedupe_db, csv_path=csv_path)
+            self.logger.info(f"Índice de URLs procesadas: {self.dedupe_db} "
+                             f"({self.processed_items.synced_rows} filas nuevas del CSV)")
             
         except Exception as e:
-            self.logger.warning(f"No se pudieron cargar URLs procesadas: {type(e).__name__}: {str(e)}")
+            self.logger.warning(f"No se pudo abrir el índice de URLs procesadas: {type(e).__name__}: {str(e)}. "
+                                f"Se usa un índice vacío en memoria")
+            self.processed_items = DedupeStore(':memory:')
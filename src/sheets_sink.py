@@ -0,0 +1,267 @@
+"""
+================================================================================
+MIA V4.0 - SALIDA A GOOGLE SHEETS POR LOTES (sheets_sink.py)
+================================================================================
+
+OBJETIVO GENERAL:
+    Escribir los resultados en un Google Spreadsheet sin una llamada a la
+    API por fila: la cuota de escritura de Sheets (por minuto y por
+    usuario) se agota enseguida en una corrida grande.
+
+FUNCIONAMIENTO:
+    1. Al iniciar se lee la hoja UNA vez (values.get): encabezado + claves
+       de las oportunidades ya cargadas (dedupe_store.row_identity: portal
+       + N° de licitación o URL, con su hash de contenido). Quedan en
+       memoria para detectar duplicados sin volver a leer la hoja
+    2. append() acumula filas en memoria
+    3. flush() envía todas las filas pendientes en UNA llamada
+       values.append (insertDataOption=INSERT_ROWS)
+    4. Ante 429 / 5xx y errores de red (conexión, timeout) se reintenta
+       con backoff exponencial, respetando Retry-After si el servidor lo
+       envía. Si se agotan los intentos las filas quedan en buffer para el
+       próximo flush
+    5. close() guarda en spool_path (JSONL) las filas que no se pudieron
+       enviar; la próxima ejecución las carga y las vuelve a enviar
+
+    La API se usa por REST (AuthorizedSession de google-auth con la
+    service account). La URL base es configurable: los tests apuntan a
+    src/fake_sheets_server.py.
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Google Sheets por Lotes
+================================================================================
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+from urllib.parse import quote
+
+import requests
+
+from src.dedupe_store import row_identity
+from src.rate_limiter import parse_retry_after
+
+DEFAULT_API_URL = "https://sheets.googleapis.com"
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+
+# Respuestas que indican cuota agotada o falla transitoria
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Fallas de red (conexión rechazada o cortada, timeout): mismo backoff
+RETRY_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+
+class SheetsApiError(Exception):
+    """Error de la API de Sheets que no se resolvió con reintentos."""
+
+
+# ============================================================================
+# CLASE GOOGLESHEETSSINK
+# ============================================================================
+class GoogleSheetsSink:
+    """
+    Salida a una hoja de Google Sheets con escrituras por lotes.
+
+    USO:
+        sink = GoogleSheetsSink.from_service_account(key_path, spreadsheet_id)
+        sink.existing                 # clave -> hash ya cargados (una lectura)
+        sink.append(fila)             # En buffer
+        sink.flush()                  # Una llamada values.append
+        sink.close()                  # Flush final; lo no enviado va al spool
+    """
+
+    def __init__(self, session: Any, spreadsheet_id: str, worksheet: str = "Oportunidades",
+                 columns: Sequence[str] = (), api_url: str = DEFAULT_API_URL,
+                 max_attempts: int = 5, backoff_base: float = 1.0, timeout: float = 30,
+                 spool_path: Optional[str] = None):
+        """
+        PARÁMETROS:
+            session: Sesión HTTP (AuthorizedSession o requests.Session)
+            spreadsheet_id (str): ID del spreadsheet
+            worksheet (str): Nombre de la hoja
+            columns (list): Columnas a usar si la hoja está vacía
+            api_url (str): URL base de la API (tests: servidor falso)
+            max_attempts (int): Intentos por llamada ante 429 / 5xx
+            backoff_base (float): Primera espera del backoff (segundos)
+            timeout (float): Timeout de cada request
+            spool_path (str): JSONL con las filas no enviadas en la
+                              ejecución anterior (None = sin spool)
+        """
+        self.logger = logging.getLogger(__name__)
+        self.session = session
+        self.spreadsheet_id = spreadsheet_id
+        self.worksheet = worksheet
+        self.api_url = api_url.rstrip('/')
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.spool_path = spool_path
+
+        self.columns: List[str] = list(columns)
+        self.existing: Dict[str, str] = {}
+        self.stats = {"reads": 0, "appends": 0, "rows": 0, "throttled": 0}
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._has_header = False
+        self._load_sheet()
+        self._load_spool()
+
+    @classmethod
+    def from_service_account(cls, key_path: str, spreadsheet_id: str, **kwargs) -> "GoogleSheetsSink":
+        """Sink autenticado con el JSON de una service account."""
+        from google.auth.transport.requests import AuthorizedSession
+        from google.oauth2 import service_account
+        credentials = service_account.Credentials.from_service_account_file(key_path, scopes=SCOPES)
+        return cls(AuthorizedSession(credentials), spreadsheet_id, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    # ========================================================================
+    # API REST
+    # ========================================================================
+    def _values_url(self, range_: str, suffix: str = "") -> str:
+        return (f"{self.api_url}/v4/spreadsheets/{quote(self.spreadsheet_id, safe='')}"
+                f"/values/{quote(range_, safe='!:')}{suffix}")
+
+    def _request(self, method: str, url: str, **kwargs) -> Dict[str, Any]:
+        """Request con reintentos ante cuota agotada / fallas transitorias."""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except RETRY_EXCEPTIONS as e:
+                if attempt == self.max_attempts:
+                    raise
+                wait = self.backoff_base * 2 ** (attempt - 1)
+                self.logger.warning(f"Error de red con Google Sheets ({type(e).__name__}). "
+                                    f"Reintentando en {wait:.1f}s (intento {attempt}/{self.max_attempts})")
+                time.sleep(wait)
+                continue
+            if response.status_code < 400:
+                return response.json() if response.content else {}
+            if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_attempts:
+                raise SheetsApiError(f"{method} {url}: HTTP {response.status_code} {response.text[:200]}")
+            wait = parse_retry_after(response.headers.get('Retry-After'))
+            if wait is None:
+                wait = self.backoff_base * 2 ** (attempt - 1)
+            self.stats["throttled"] += 1
+            self.logger.warning(f"Google Sheets respondió {response.status_code}. "
+                                f"Reintentando en {wait:.1f}s (intento {attempt}/{self.max_attempts})")
+            time.sleep(wait)
+        raise SheetsApiError(f"{method} {url}: sin respuesta")
+
+    def _load_sheet(self) -> None:
+        """Lee la hoja una vez: encabezado y claves existentes (la última fila de cada una)."""
+        data = self._request("GET", self._values_url(self.worksheet))
+        self.stats["reads"] += 1
+        values = data.get("values") or []
+        if values and values[0]:
+            self.columns = list(values[0])
+            self._has_header = True
+        if "MIA_URL" in self.columns:
+            for row in values[1:]:
+                key, digest = row_identity(dict(zip(self.columns, row)))
+                if key:
+                    self.existing[key] = digest
+        self.logger.info(f"Google Sheets: {len(self.existing)} oportunidades cargadas de '{self.worksheet}'")
+
+    def _load_spool(self) -> None:
+        """Vuelve a encolar las filas que la ejecución anterior no pudo enviar."""
+        if not self.spool_path or not os.path.exists(self.spool_path):
+            return
+        queued = 0
+        with open(self.spool_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip() and self.append(json.loads(line)):
+                    queued += 1
+        self.logger.info(f"Google Sheets: {queued} filas pendientes de la ejecución anterior ({self.spool_path})")
+
+    # ========================================================================
+    # ESCRITURA POR LOTES
+    # ========================================================================
+    def append(self, row: Dict[str, Any]) -> bool:
+        """
+        Agrega una fila al buffer.
+
+        RETORNO:
+            bool: False si la oportunidad ya está en la hoja (o en el
+                  buffer) con el mismo contenido
+        """
+        key, digest = row_identity(row)
+        with self._lock:
+            if key in self.existing and (not digest or self.existing[key] == digest):
+                return False
+            self._buffer.append(row)
+            if key:
+                self.existing[key] = digest
+            return True
+
+    def flush(self) -> int:
+        """
+        Envía las filas en buffer con una sola llamada values.append.
+
+        RETORNO:
+            int: Filas escritas (0 si falló; las filas quedan en buffer)
+        """
+        with self._lock:
+            if not self._buffer:
+                return 0
+            rows = self._buffer
+            values = [[self._cell(row.get(column)) for column in self.columns] for row in rows]
+            if not self._has_header:
+                values.insert(0, list(self.columns))
+            body = {"values": values, "majorDimension": "ROWS"}
+            try:
+                self._request("POST", self._values_url(f"{self.worksheet}!A1", ":append"),
+                              params={"valueInputOption": "RAW", "insertDataOption": "INSERT_ROWS"},
+                              json=body)
+            except Exception as e:
+                self.logger.error(f"Error escribiendo {len(rows)} filas en Google Sheets: {e}")
+                return 0
+            self._buffer = []
+            self._has_header = True
+            self.stats["appends"] += 1
+            self.stats["rows"] += len(rows)
+            return len(rows)
+
+    def close(self) -> int:
+        """
+        Envía lo pendiente. Si falla, guarda las filas en spool_path para
+        la próxima ejecución (sin spool se pierden, con un error en el log).
+
+        RETORNO:
+            int: Filas que quedaron sin enviar
+        """
+        self.flush()
+        with self._lock:
+            rows = list(self._buffer)
+        if not self.spool_path:
+            if rows:
+                self.logger.error(f"{len(rows)} filas no se enviaron a Google Sheets")
+            return len(rows)
+        if not rows:
+            if os.path.exists(self.spool_path):
+                os.remove(self.spool_path)
+            return 0
+        tmp_path = self.spool_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False, default=str) + '\n')
+        os.replace(tmp_path, self.spool_path)
+        self.logger.warning(f"{len(rows)} filas sin enviar a Google Sheets: guardadas en {self.spool_path}")
+        return len(rows)
+
+    @staticmethod
+    def _cell(value: Any) -> Any:
+        """Valor de celda: números tal cual, listas unidas, None vacío."""
+        if value is None:
+            return ""
+        if isinstance(value, (list, tuple)):
+            return "\n".join(str(v) for v in value)
+        if isinstance(value, (int, float, str)):
+            return value
+        return str(value)
@@ -0,0 +1,188 @@
+"""
+================================================================================
+MIA V4.0 - SALIDA JSON ESTRUCTURADA DE GEMINI (structured_output.py)
+================================================================================
+
+OBJETIVO GENERAL:
+    Pedir a Gemini JSON con esquema (response_mime_type + response_schema)
+    y leer la respuesta localmente UNA vez. Antes se quitaban los fences
+    de markdown con replace y cualquier JSON mal formado o cortado
+    terminaba en un reintento que reenviaba (y volvía a pagar) el prompt
+    completo.
+
+FUNCIONAMIENTO:
+    1. ANALYSIS_FIELDS define los campos MIA_*; de ahí salen el esquema de
+       un análisis (analysis_schema) y el de un lote (batch_schema)
+    2. parse_response() intenta json.loads y, si falla, repara localmente:
+       fences de markdown, texto alrededor del JSON, comillas tipográficas,
+       comas finales y objetos cortados por max_output_tokens
+    3. Si no se puede reparar lanza ResponseFormatError con el tipo de
+       falla ('empty' o 'malformed'). NO es un error
+       transitorio: el Analyzer no reintenta
+    4. normalize_analysis() corrige tipos (score "85" -> 85, fuera de
+       rango -> 0..100, preguntas en texto -> lista) antes de validar
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Salida Estructurada
+================================================================================
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# (campo, tipo del esquema, requerido)
+ANALYSIS_FIELDS: List[Tuple[str, Dict[str, Any], bool]] = [
+    ("MIA_Rubro", {"type": "string"}, True),
+    ("MIA_Score_IA", {"type": "integer"}, True),
+    ("MIA_Resumen_Tecnico", {"type": "string"}, True),
+    ("MIA_Link_al_Pliego", {"type": "string"}, False),
+    ("MIA_Empresa_Asignada", {"type": "string"}, False),
+    ("MIA_Preguntas_Tecnicas", {"type": "array", "items": {"type": "string"}}, False),
+]
+
+# Campos del triage (modo cascada)
+TRIAGE_FIELDS = ("MIA_Rubro", "MIA_Score_IA")
+
+_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$', re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+_SMART_QUOTES = str.maketrans({'“': '"', '”': '"', '„': '"'})
+
+
+class ResponseFormatError(ValueError):
+    """Respuesta de Gemini que no se pudo leer como JSON (ni repararse)."""
+
+    def __init__(self, kind: str, message: str):
+        super().__init__(f"{kind}: {message}")
+        self.kind = kind
+
+
+# ============================================================================
+# ESQUEMAS
+# ============================================================================
+def analysis_schema() -> Dict[str, Any]:
+    """Esquema (subconjunto OpenAPI de Gemini) de un análisis."""
+    return {
+        "type": "object",
+        "properties": {name: dict(spec) for name, spec, _ in ANALYSIS_FIELDS},
+        "required": [name for name, _, required in ANALYSIS_FIELDS if required]
+    }
+
+
+def triage_schema() -> Dict[str, Any]:
+    """Esquema del triage del modo cascada: solo rubro y score."""
+    schema = analysis_schema()
+    schema["properties"] = {name: schema["properties"][name] for name in TRIAGE_FIELDS}
+    schema["required"] = list(TRIAGE_FIELDS)
+    return schema
+
+
+def batch_schema() -> Dict[str, Any]:
+    """Esquema de la respuesta de un lote: array de análisis con 'id'."""
+    item = analysis_schema()
+    item["properties"] = {"id": {"type": "string"}, **item["properties"]}
+    item["required"] = ["id"] + item["required"]
+    return {"type": "array", "items": item}
+
+
+def generation_config(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """generation_config de generate_content para JSON con esquema."""
+    return {"response_mime_type": "application/json", "response_schema": schema}
+
+
+# ============================================================================
+# LECTURA Y REPARACIÓN LOCAL
+# ============================================================================
+def _close_truncated(text: str) -> str:
+    """Cierra strings y corchetes abiertos de un JSON cortado."""
+    stack, in_string, escaped = [], False, False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]' and stack:
+            stack.pop()
+    if escaped:
+        text = text[:-1]
+    if in_string:
+        text += '"'
+    if stack and stack[-1] == '}':
+        # Clave sin valor al final de un objeto: se descarta
+        text = re.sub(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$', r'\1', text.rstrip())
+    text = re.sub(r'[,:]\s*$', '', text.rstrip())
+    return text + ''.join(reversed(stack))
+
+
+def parse_response(text: Optional[str]) -> Tuple[Any, Optional[str]]:
+    """
+    Lee el JSON de una respuesta de Gemini.
+
+    PARÁMETROS:
+        text (str): Texto de la respuesta
+
+    RETORNO:
+        (datos, reparación): reparación es None si el JSON era válido, o
+        'cleaned' / 'truncated' según lo que hubo que corregir
+
+    EXCEPCIONES:
+        ResponseFormatError: vacío, o JSON irreparable
+    """
+    text = (text or "").strip()
+    if not text:
+        raise ResponseFormatError("empty", "Gemini returned empty response")
+    try:
+        return json.loads(text), None
+    except json.JSONDecodeError:
+        pass
+
+    # Fences, texto antes/después del JSON, comillas tipográficas, comas finales
+    cleaned = _FENCE_RE.sub('', text).translate(_SMART_QUOTES)
+    starts = [i for i in (cleaned.find('{'), cleaned.find('[')) if i >= 0]
+    if not starts:
+        raise ResponseFormatError("malformed", f"no JSON in response: {text[:80]!r}")
+    cleaned = cleaned[min(starts):]
+    end = max(cleaned.rfind('}'), cleaned.rfind(']'))
+    candidate = _TRAILING_COMMA_RE.sub(r'\1', cleaned[:end + 1] if end >= 0 else cleaned)
+    try:
+        return json.loads(candidate), "cleaned"
+    except json.JSONDecodeError:
+        pass
+
+    # Respuesta cortada (max_output_tokens): cerrar lo abierto
+    try:
+        return json.loads(_TRAILING_COMMA_RE.sub(r'\1', _close_truncated(cleaned))), "truncated"
+    except json.JSONDecodeError as e:
+        raise ResponseFormatError("malformed", str(e)) from e
+
+
+def normalize_analysis(data: Any) -> Any:
+    """
+    Corrige tipos de un análisis antes de validarlo (sin llamar a Gemini).
+
+    RETORNO:
+        El mismo dict corregido (u otro valor sin cambios si no es dict)
+    """
+    if not isinstance(data, dict):
+        return data
+    score = data.get("MIA_Score_IA")
+    if isinstance(score, str):
+        match = re.search(r'-?\d+(?:[.,]\d+)?', score)
+        if match:
+            score = float(match.group().replace(',', '.'))
+    if isinstance(score, (int, float)) and not isinstance(score, bool):
+        data["MIA_Score_IA"] = int(round(min(max(score, 0), 100)))
+    for field in ("MIA_Rubro", "MIA_Resumen_Tecnico"):
+        if data.get(field) is None and field in data:
+            data[field] = ""
+    questions = data.get("MIA_Preguntas_Tecnicas")
+    if isinstance(questions, str):
+        data["MIA_Preguntas_Tecnicas"] = [q.strip(" -•\t") for q in questions.split('\n') if q.strip(" -•\t")]
+    return data
@@ -0,0 +1,1211 @@
+"""
+================================================================================
+MIA V4.0 - TESTING DE LA ETAPA DE ANÁLISIS
+================================================================================
+
+OBJETIVO:
+    Validar los componentes de la etapa de análisis sin llamar a Gemini:
+    - Caché persistente de análisis (SQLite): entre instancias, TTL,
+      desalojo LRU y escritura desde varios procesos
+    - Claves de caché versionadas (modelo + plantilla + prompt exacto)
+    - Casi-duplicados (SimHash): reutilización y velocidad de búsqueda
+    - Análisis concurrente con requests en vuelo acotados
+    - Lotes de oportunidades cortas en una sola consulta
+    - Contexto por ventanas alrededor de las keywords
+    - Score local de relevancia (filtro previo a Gemini)
+    - Tokens reales (usage_metadata), costo y latencia por modelo
+    - Métricas en buffer: escritura por lotes, concurrencia y compactación
+    - Salida JSON con esquema y reparación local de respuestas
+    - Cuota RPM/TPM compartida y pausas ante 429 con la pista del servidor
+    - Cascada: triage barato y análisis completo solo para leads prometedores
+    - Escritura de resultados por lotes (sesión buffered_writer)
+    - Google Sheets por lotes contra un servidor falso con cuota
+    - Índice persistente de URLs procesadas (sin leer todo el CSV al iniciar)
+    - Duplicados por portal + N° de licitación + hash de contenido
+    - Historial SQLite de resultados: consultas indexadas y exportación CSV
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Etapa de Análisis
+================================================================================
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+import multiprocessing
+from datetime import datetime
+from unittest.mock import patch
+
+# Agregar directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+ANALISIS = {
+    "MIA_Rubro": "Rubro 2: Purificación - Provisión",
+    "MIA_Score_IA": 85,
+    "MIA_Resumen_Tecnico": "Provisión de planta de ósmosis inversa para agua potable. " * 10
+}
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class _FakeModel:
+    """Modelo Gemini simulado: cuenta llamadas y responde un análisis fijo."""
+
+    def __init__(self, response=None):
+        self.calls = []
+        self.response = response or ANALISIS
+
+    def generate_content(self, prompt, **kwargs):
+        self.calls.append(prompt)
+        return _FakeResponse("```json\n" + json.dumps(self.response, ensure_ascii=False) + "\n```")
+
+
+class _SlowModel(_FakeModel):
+    """Modelo simulado con latencia fija; registra el máximo de requests en vuelo."""
+
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.latency)
+        with self._lock:
+            self.in_flight -= 1
+        return super().generate_content(prompt, **kwargs)
+
+
+class _BatchModel(_FakeModel):
+    """Modelo simulado que responde prompts de lote con un array por 'id'."""
+
+    def __init__(self, drop_ids=()):
+        super().__init__()
+        self.drop_ids = set(drop_ids)
+        self.batch_calls = 0
+
+    def generate_content(self, prompt, **kwargs):
+        if "OPORTUNIDADES A ANALIZAR" not in prompt:
+            return super().generate_content(prompt, **kwargs)
+        self.calls.append(prompt)
+        self.batch_calls += 1
+        items = json.loads(prompt.split("(JSON):**\n", 1)[1].split("\n\n**RESPONDE", 1)[0])
+        answer = [{"id": item["id"], **ANALISIS} for item in items if item["id"] not in self.drop_ids]
+        return _FakeResponse(json.dumps(answer, ensure_ascii=False))
+
+
+def _make_analyzer(tmp, model=None):
+    """Analyzer con modelo simulado y caché en un directorio temporal."""
+    from src.analyzer import Analyzer
+    from src.analysis_cache import AnalysisCache
+
+    analyzer = Analyzer()
+    analyzer.api_key = "test"
+    analyzer.model = model or _FakeModel()
+    analyzer.enable_cache = True
+    analyzer.cache = AnalysisCache(os.path.join(tmp, "cache.db"))
+    if analyzer.near_dup_index is not None:
+        from src.near_duplicate import NearDuplicateIndex
+        analyzer.near_dup_index = NearDuplicateIndex(os.path.join(tmp, "cache.db"))
+    from src.metrics_store import MetricsStore
+    analyzer.metrics_file = os.path.join(tmp, "metrics.json")
+    analyzer.metrics_store = MetricsStore(os.path.join(tmp, "metrics.db"), analyzer.metrics_file)
+    analyzer.metrics = analyzer.metrics_store.totals
+    return analyzer
+
+
+def _unlimited_client():
+    """GeminiClient sin cuota local (los tests miden concurrencia, no la cuota)."""
+    from src.gemini_client import GeminiClient
+    return GeminiClient(requests_per_minute=0, tokens_per_minute=0)
+
+
+def _pliego(seed, words=1200):
+    """Texto de pliego pseudoaleatorio (determinístico) de `words` palabras."""
+    import random
+    rng = random.Random(seed)
+    vocab = ["provisión", "planta", "ósmosis", "agua", "potable", "caudal", "m3/h", "bomba",
+             "filtro", "membrana", "licitación", "pública", "pliego", "oferta", "plazo",
+             "garantía", "municipio", "obra", "cloro", "tanque", "cisterna", "tratamiento",
+             "efluentes", "lodos", "presión", "válvula", "cañería", "instalación", "servicio"]
+    return " ".join(rng.choice(vocab) for _ in range(words))
+
+
+def _fila(i, resumen="fila {i}"):
+    """Fila de resultados de AySA para los tests de escritura (resumen con {i})."""
+    return {"Portal": "aysa.com.ar", "MIA_URL": f"https://www.aysa.com.ar/licitacion/{i}",
+            "MIA_Rubro": "Efluentes - Provisión", "MIA_Score_IA": 60, "MIA_Resumen_Tecnico": resumen.format(i=i)}
+
+
+def _write_from_process(db_path, worker):
+    """Escribe entradas en la caché desde otro proceso."""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from src.analysis_cache import AnalysisCache
+
+    cache = AnalysisCache(db_path)
+    for i in range(20):
+        cache.set(f"proceso{worker}-{i}", {**ANALISIS, "MIA_Score_IA": i})
+
+
+def test_persistent_cache():
+    """Test 1: la caché sobrevive entre instancias y respeta el TTL"""
+    print("\n" + "="*70)
+    print("TEST 1: Caché Persistente de Análisis")
+    print("="*70)
+
+    from src.analysis_cache import AnalysisCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "cache.db")
+
+        AnalysisCache(db_path).set("clave", ANALISIS, tokens=1200)
+
+        # Nueva instancia (como una nueva ejecución de main.py)
+        cache = AnalysisCache(db_path, ttl_hours=24)
+        assert cache.get("clave") == ANALISIS
+        assert len(cache) == 1 and "clave" in cache
+        assert cache.stats()["tokens"] == 1200
+        assert cache.stats()["bytes"] < len(str(ANALISIS)), "La respuesta no se comprimió"
+
+        # TTL vencido: la entrada se ignora y se borra
+        expired = AnalysisCache(db_path, ttl_hours=1 / 3600)
+        time.sleep(1.1)
+        assert expired.get("clave") is None
+        assert len(expired) == 0
+
+    print("✅ Análisis reutilizado entre instancias; TTL aplicado")
+
+
+def test_lru_eviction():
+    """Test 2: al superar el tamaño máximo se borran las entradas menos usadas"""
+    print("\n" + "="*70)
+    print("TEST 2: Desalojo LRU por Tamaño")
+    print("="*70)
+
+    from src.analysis_cache import AnalysisCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = AnalysisCache(os.path.join(tmp, "cache.db"), max_mb=0.01, compress=False)
+        for i in range(30):
+            cache.set(f"k{i}", {**ANALISIS, "MIA_Score_IA": i})
+            time.sleep(0.001)
+            cache.get("k0")  # k0 se usa siempre: no debe desalojarse
+        cache.evict()
+
+        assert cache.stats()["bytes"] <= cache.max_bytes
+        assert "k0" in cache, "Se desalojó la entrada más usada"
+        assert "k1" not in cache, "No se desalojó la entrada menos usada"
+        print(f"✅ {len(cache)} entradas retenidas dentro de {cache.max_bytes} bytes")
+
+
+def test_multiprocess_cache():
+    """Test 3: varios procesos escriben la misma caché"""
+    print("\n" + "="*70)
+    print("TEST 3: Caché Compartida entre Procesos")
+    print("="*70)
+
+    from src.analysis_cache import AnalysisCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "cache.db")
+        AnalysisCache(db_path)
+
+        ctx = multiprocessing.get_context("spawn")
+        workers = [ctx.Process(target=_write_from_process, args=(db_path, w)) for w in range(3)]
+        for p in workers:
+            p.start()
+        for p in workers:
+            p.join(60)
+            assert p.exitcode == 0, f"Proceso terminó con código {p.exitcode}"
+
+        cache = AnalysisCache(db_path)
+        assert len(cache) == 60
+        assert cache.get("proceso2-19")["MIA_Score_IA"] == 19
+        print("✅ 3 procesos x 20 escrituras sin errores de bloqueo")
+
+
+def test_versioned_cache_keys():
+    """Test 4: la clave depende del prompt exacto, el modelo y la versión"""
+    print("\n" + "="*70)
+    print("TEST 4: Claves de Caché Versionadas")
+    print("="*70)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        analyzer = _make_analyzer(tmp)
+        texto = "Licitación pública para planta potabilizadora. " * 300  # > 10000 chars
+
+        def key(text=texto, keywords=("licitación pública",)):
+            return analyzer._generate_cache_key(analyzer._build_prompt(text, list(keywords)))
+
+        base = key()
+        assert len(base) == 64, "La clave no es un SHA-256 completo"
+        # Lo que no llega al modelo no cambia la clave
+        assert key(texto + "pie de página distinto") == base
+        # Lo que sí llega al modelo la cambia
+        assert key(keywords=("licitación pública", "agua")) != base
+        assert key("Otro texto") != base
+
+        analyzer.analyze_opportunity(texto, ["licitación pública"])
+        analyzer.analyze_opportunity(texto + " cambio fuera del prompt", ["licitación pública"])
+        assert len(analyzer.model.calls) == 1, "El prompt idéntico no usó la caché"
+
+        # Nueva versión de plantilla o nuevo modelo: no reutilizar
+        analyzer.prompt_version = "1.1"
+        analyzer.analyze_opportunity(texto, ["licitación pública"])
+        analyzer.model_name = "gemini-pro-latest"
+        analyzer.analyze_opportunity(texto, ["licitación pública"])
+        assert len(analyzer.model.calls) == 3, "Versión o modelo distintos reutilizaron la caché"
+
+    print("✅ Claves SHA-256 completas sobre modelo + versión + prompt")
+
+
+def test_near_duplicates():
+    """Test 5: páginas con cambios triviales reutilizan el análisis"""
+    print("\n" + "="*70)
+    print("TEST 5: Casi-Duplicados (SimHash)")
+    print("="*70)
+
+    from src.near_duplicate import simhash, hamming_distance
+
+    base = "Actualizado: 03/01/2026. Visitas: 1520. " + _pliego(1)
+    cambiada = "Actualizado: 04/01/2026. Visitas: 1544. " + _pliego(1)
+    otra = "Actualizado: 03/01/2026. Visitas: 1520. " + _pliego(2)
+
+    assert hamming_distance(simhash(base), simhash(cambiada)) <= 3
+    assert hamming_distance(simhash(base), simhash(otra)) > 10
+
+    with tempfile.TemporaryDirectory() as tmp:
+        analyzer = _make_analyzer(tmp)
+        analyzer.near_dup_mode = "reuse"
+        keywords = ["licitación pública"]
+
+        analyzer.analyze_opportunity(base, keywords)
+        reused = analyzer.analyze_opportunity(cambiada, keywords)
+        assert len(analyzer.model.calls) == 1, "El casi-duplicado se envió a Gemini"
+        assert reused["_near_duplicate"]["distance"] <= 3
+        assert reused["MIA_Rubro"] == ANALISIS["MIA_Rubro"]
+
+        analyzer.analyze_opportunity(otra, keywords)
+        assert len(analyzer.model.calls) == 2, "Un texto distinto se tomó como duplicado"
+
+        # Modo flag: se analiza igual, pero el resultado queda marcado
+        analyzer.near_dup_mode = "flag"
+        flagged = analyzer.analyze_opportunity("Nuevo banner. " + cambiada, keywords)
+        assert len(analyzer.model.calls) == 3 and "_near_duplicate" in flagged
+
+        # Textos cortos sin relación con una plantilla larga (instrucciones
+        # repetidas): la huella es solo del texto, la plantilla compartida
+        # no los hace casi-duplicados
+        analyzer.near_dup_mode = "reuse"
+        instrucciones = analyzer.prompt_template.split("{")[0].replace("}", "}}")
+        analyzer.prompt_template = instrucciones * 15 + analyzer.prompt_template
+        minimo = analyzer.near_dup_min_chars
+        agua = ("Licitación pública 12/2026: provisión e instalación de una planta de ósmosis inversa de "
+                "40 m3/h para el acueducto de Villa Regina, con membranas, bombas de alta presión y "
+                "tablero de control. " * 5)[:minimo]
+        obra = ("Concurso de precios 88/2026: repavimentación de calles del barrio San Martín, bacheo, "
+                "cordón cuneta y señalización vial horizontal, incluida la mano de obra y los "
+                "materiales. " * 5)[:minimo]
+        analyzer.analyze_opportunity(agua, keywords)
+        distinto = analyzer.analyze_opportunity(obra, keywords)
+        assert len(analyzer.model.calls) == 5, "Un texto sin relación reutilizó otro análisis"
+        assert "_near_duplicate" not in distinto
+
+    print("✅ Cambio de fecha/contador reutilizado; texto distinto analizado")
+
+
+def test_near_duplicate_lookup_speed():
+    """Test 6: búsqueda sub-milisegundo con 200.000 huellas"""
+    print("\n" + "="*70)
+    print("TEST 6: Velocidad del Índice de Casi-Duplicados")
+    print("="*70)
+
+    import random
+    from src.near_duplicate import NearDuplicateIndex
+
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = NearDuplicateIndex(os.path.join(tmp, "fp.db"), max_distance=3)
+        fingerprints = [rng.getrandbits(64) for _ in range(200000)]
+        index.add_many((fp, "scope", f"k{i}") for i, fp in enumerate(fingerprints))
+
+        queries = [fingerprints[i] ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64))
+                   for i in range(0, 200000, 2000)]
+        start = time.perf_counter()
+        matches = [index.find(q, "scope") for q in queries]
+        per_lookup_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+        assert all(m is not None and m["distance"] <= 2 for m in matches)
+        assert index.find(fingerprints[0], "otro-scope") is None
+        assert per_lookup_ms < 1.0, f"Búsqueda lenta: {per_lookup_ms:.3f} ms"
+        print(f"✅ {len(index)} huellas, {per_lookup_ms:.3f} ms por búsqueda")
+
+
+def test_concurrent_analysis():
+    """Test 7: analyze_many acota los requests en vuelo y no pierde métricas"""
+    print("\n" + "="*70)
+    print("TEST 7: Análisis Concurrente")
+    print("="*70)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model = _SlowModel(latency=0.2)
+        analyzer = _make_analyzer(tmp, model)
+        analyzer.gemini = _unlimited_client()
+        analyzer.near_dup_index = None
+        analyzer.batch_enabled = False
+        ops = [{"url": f"https://portal.gob.ar/licitacion/{i}", "full_text": f"Pliego {i}: planta de ósmosis",
+                "matched_keywords": ["ósmosis"]} for i in range(20)]
+
+        start = time.perf_counter()
+        results = list(analyzer.analyze_many(ops, max_workers=5))
+        elapsed = time.perf_counter() - start
+
+        assert [op["url"] for op, _ in results] == [op["url"] for op in ops], "Se perdió el orden de entrada"
+        assert all(analysis for _, analysis in results)
+        assert model.max_in_flight == 5, f"En vuelo: {model.max_in_flight}"
+        # Serial: 20 x 0.2s = 4s; con 5 en vuelo: 4 tandas ~ 0.8s
+        assert elapsed < 2.0, f"Análisis lento: {elapsed:.2f}s"
+        assert analyzer.metrics["total_requests"] == 20
+        assert analyzer.metrics["cache_misses"] == 20
+
+    print(f"✅ 20 análisis en {elapsed:.2f}s con 5 requests en vuelo (serial: 4.0s)")
+
+
+def test_batch_analysis():
+    """Test 8: oportunidades cortas se analizan de a lotes con fallback individual"""
+    print("\n" + "="*70)
+    print("TEST 8: Análisis por Lotes")
+    print("="*70)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model = _BatchModel(drop_ids={"3"})
+        analyzer = _make_analyzer(tmp, model)
+        analyzer.gemini = _unlimited_client()
+        analyzer.batch_size = 10
+        assert analyzer.batch_prompt_template, "Falta batch_analysis_prompt en config/prompts.json"
+
+        filas = [{"url": f"https://www.aysa.com.ar/licitacion/{i}", "matched_keywords": ["cloro"],
+                  "full_text": f"Licitación Pública N° {i}/2026 - Provisión de cloro líquido - Abierta"}
+                 for i in range(20)]
+        pliego = {"url": "https://www.aysa.com.ar/pliego", "matched_keywords": ["ósmosis"],
+                  "full_text": _pliego(3, words=400)}
+        ops = filas[:10] + [pliego] + filas[10:]
+
+        results = list(analyzer.analyze_many(ops, max_workers=2))
+        assert [op["url"] for op, _ in results] == [op["url"] for op in ops]
+        assert all(analysis for _, analysis in results), "Oportunidad sin análisis"
+        assert all("id" not in analysis for _, analysis in results)
+        # 2 lotes + 1 pliego largo + 2 fallbacks (id "3" falta en cada lote)
+        assert model.batch_calls == 2, f"Lotes: {model.batch_calls}"
+        assert len(model.calls) == 5, f"Consultas: {len(model.calls)}"
+
+        # Segunda ejecución: lotes e individuales salen de la caché
+        model.calls.clear()
+        assert all(analysis for _, analysis in analyzer.analyze_many(ops, max_workers=2))
+        assert not model.calls, f"Consultas: {len(model.calls)}"
+
+        # Nueva versión de la plantilla de lote: solo se reenvían los lotes
+        # (el pliego y los fallbacks se analizaron de a uno)
+        analyzer.batch_prompt_version += "-nueva"
+        model.drop_ids.clear()
+        assert all(analysis for _, analysis in analyzer.analyze_many(ops, max_workers=2))
+        assert model.batch_calls == 4 and len(model.calls) == 2, f"Consultas: {len(model.calls)}"
+
+    print("✅ 21 oportunidades en 5 consultas (2 lotes, 1 pliego largo, 2 fallbacks)")
+
+
+def test_keyword_context():
+    """Test 9: el contexto incluye triggers lejanos y descarta boilerplate"""
+    print("\n" + "="*70)
+    print("TEST 9: Contexto por Keywords")
+    print("="*70)
+
+    from src.context_builder import build_context, find_windows
+
+    menu = "\n".join(["Inicio", "Institucional", "Licitaciones", "Contacto",
+                      "Política de privacidad", "Usamos cookies para mejorar su experiencia"])
+    relleno = "\n".join(f"Noticia {i}: el municipio inauguró la plaza número {i} del barrio." for i in range(300))
+    licitacion = ("Planta Potabilizadora Norte\n"
+                  "Licitación Pública N° 45/2026. Objeto: provisión e instalación de una planta de "
+                  "ósmosis inversa de 20 m3/h para la red de agua potable. Apertura: 10/03/2026.")
+    pagina = menu + "\nPortal de Compras del Municipio\n" + relleno + "\n" + licitacion + "\n" + menu
+    assert len(pagina) > 15000 and pagina.index("ósmosis") > 10000
+
+    # Dos apariciones cercanas se fusionan en una sola ventana
+    windows = find_windows(licitacion + " " + licitacion, ["ósmosis inversa"], window_chars=100)
+    assert len(windows) == 1 and windows[0]["hits"] == 2
+
+    context = build_context(pagina, ["ósmosis inversa", "agua potable"], window_chars=300, max_chars=4000)
+    assert len(context) <= 4000
+    assert "planta de ósmosis inversa de 20 m3/h" in context, "Falta el trigger lejano"
+    assert "Portal de Compras del Municipio" in context, "Falta el inicio de la página"
+    assert "cookies" not in context and "\nContacto\n" not in context, "Quedó boilerplate"
+    assert "Planta Potabilizadora Norte\n" in context, "Se descartó el título corto como menú"
+
+    # Textos cortos se envían completos
+    assert build_context(licitacion, ["ósmosis inversa"], max_chars=4000) == licitacion
+
+    with tempfile.TemporaryDirectory() as tmp:
+        analyzer = _make_analyzer(tmp)
+        prompt = analyzer._build_prompt(pagina, ["ósmosis inversa"])
+        assert "ósmosis inversa de 20 m3/h" in prompt
+        analyzer.context_builder_enabled = False
+        assert "ósmosis inversa de 20 m3/h" not in analyzer._build_prompt(pagina, ["ósmosis inversa"])
+
+    print(f"✅ Página de {len(pagina)} caracteres -> contexto de {len(context)} con el trigger")
+
+
+def test_local_relevance_gate():
+    """Test 10: el score local descarta oportunidades ajenas al rubro"""
+    print("\n" + "="*70)
+    print("TEST 10: Score Local de Relevancia")
+    print("="*70)
+
+    from src.relevance import RelevanceScorer, filter_opportunities
+
+    rubros = {
+        "Rubro 1: Purificación - Ingeniería": ["Planta Potabilizadora (PTAP)", "Ingeniería de Detalle"],
+        "Rubro 2: Purificación - Provisión": ["Ósmosis Inversa Industrial (RO)", "Ablandador"],
+        "Rubro 5: Efluentes - Ingeniería": ["Planta de Tratamiento de Efluentes (PTE)", "Ingeniería de Detalle"],
+        "Rubro 8: Efluentes - Gestión Hídrica": ["II. Gestión, Efluentes:", "Medidor de DQO (COD)"],
+    }
+    scorer = RelevanceScorer(rubros=rubros, base_terms=["agua potable", "efluentes"], saturation=4)
+
+    papel = scorer.score("Licitación Pública N° 12/2026: provisión de resmas de papel y tóner")
+    planta = scorer.score("Licitación Pública: provisión de equipo de ósmosis inversa industrial "
+                          "y ablandador para la planta potabilizadora. Equipos RO de 20 m3/h.")
+    generico = scorer.score("Ingeniería de detalle para la obra del edificio municipal")
+    assert papel["score"] == 0 and papel["rubro"] is None
+    assert planta["score"] > 60 and planta["rubro"] == "Rubro 2: Purificación - Provisión"
+    # Una keyword presente en varios rubros pesa menos que una específica
+    assert scorer.weights["Ingeniería de Detalle"] < scorer.weights["Planta Potabilizadora (PTAP)"]
+    assert generico["score"] < planta["score"]
+
+    ops = [{"url": "https://a.gob.ar/1", "full_text": "Provisión de resmas de papel"},
+           {"url": "https://a.gob.ar/2", "full_text": "Provisión de ósmosis inversa industrial para agua potable"}]
+    kept, discarded = filter_opportunities(ops, threshold=20, scorer=scorer)
+    assert [op["url"] for op in kept] == ["https://a.gob.ar/2"]
+    assert [op["url"] for op in discarded] == ["https://a.gob.ar/1"]
+    assert kept[0]["local_score"] >= 20 and discarded[0]["local_score"] == 0
+
+    # La columna MIA_Score_Local no desordena un CSV con el encabezado anterior
+    from src.sheets_manager import SheetsManager
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "results.csv")
+        with open(csv_path, "w", encoding="utf-8", newline="") as f:
+            f.write("Timestamp_Deteccion,Portal,MIA_URL,MIA_Keywords_Detectadas,MIA_Rubro,"
+                    "MIA_Score_IA,MIA_Resumen_Tecnico\n")
+        env = {"OUTPUT_CSV_FILE": csv_path, "OUTPUT_CREATE_BACKUP": "false"}
+        with patch.dict(os.environ, env):
+            sheets = SheetsManager(key_path=os.path.join(tmp, "no_creds.json"))
+            assert sheets.add_row({"Portal": "a.gob.ar", "MIA_URL": "https://a.gob.ar/2", "MIA_Rubro": "Otros",
+                                   "MIA_Score_IA": 70, "MIA_Score_Local": 45, "MIA_Resumen_Tecnico": "ok"})
+        with open(csv_path, encoding="utf-8") as f:
+            rows = [line.rstrip("\n").split(",") for line in f]
+        assert len(rows[1]) == len(rows[0]) and rows[1][-1] == "ok"
+
+    print(f"✅ Papel: {papel['score']} | Ósmosis: {planta['score']} ({planta['rubro']}) | Genérico: {generico['score']}")
+
+
+def test_usage_metadata_accounting():
+    """Test 11: métricas con tokens reales de usage_metadata y latencia medida"""
+    print("\n" + "="*70)
+    print("TEST 11: Tokens Reales y Latencia")
+    print("="*70)
+
+    from types import SimpleNamespace
+
+    class _MeteredModel(_FakeModel):
+        """Primera respuesta ilegible (se factura igual), luego un análisis."""
+
+        def generate_content(self, prompt, **kwargs):
+            self.calls.append(prompt)
+            threading.Event().wait(0.05)   # Latencia (no afectada por el patch de time.sleep)
+            text = "no es json" if len(self.calls) == 1 else json.dumps(ANALISIS, ensure_ascii=False)
+            response = _FakeResponse(text)
+            response.usage_metadata = SimpleNamespace(
+                prompt_token_count=1200, candidates_token_count=300, cached_content_token_count=200
+            )
+            return response
+
+    with tempfile.TemporaryDirectory() as tmp:
+        analyzer = _make_analyzer(tmp, _MeteredModel())
+        analyzer.cost_per_1k_tokens = 0.001
+        analyzer.cost_per_1k_cached_tokens = 0.0005
+        analyzer.cost_per_1k_output_tokens = 0.004
+        with patch("time.sleep"):  # Un reintento sería inmediato (no debe haberlo)
+            assert analyzer.analyze_opportunity("Pliego: provisión de cloro", ["cloro"]) is None
+            assert len(analyzer.model.calls) == 1, "Un JSON ilegible no se reenvía"
+            assert analyzer.analyze_opportunity("Pliego: provisión de bombas", ["bombas"])
+
+        analyzer.close()
+        metrics = json.load(open(analyzer.metrics_file, encoding="utf-8"))
+        # 2 respuestas facturadas (la ilegible también)
+        assert metrics["prompt_tokens"] == 2400 and metrics["output_tokens"] == 600
+        assert metrics["cached_tokens"] == 400 and metrics["total_tokens"] == 3000
+        expected = 2 * (1000 * 0.001 + 200 * 0.0005 + 300 * 0.004) / 1000
+        assert abs(metrics["total_cost_usd"] - expected) < 1e-12, metrics["total_cost_usd"]
+
+        model = metrics["models"][analyzer.model_name]
+        assert model["requests"] == 2 and model["calls"] == 2
+        assert model["latency_ms_histogram"] == {"<=250": 2}
+        assert model["prompt_tokens_histogram"] == {"<=2048": 2}
+        assert model["latency_ms_total"] >= 100
+
+    print(f"✅ Tokens 2400/600/400 (entrada/salida/caché), costo ${expected:.6f}")
+
+
+def test_buffered_metrics():
+    """Test 12: métricas en memoria, escritas por lotes y compactadas por día"""
+    print("\n" + "="*70)
+    print("TEST 12: Métricas en Buffer")
+    print("="*70)
+
+    import sqlite3
+    from src.metrics_store import MetricsStore, empty_rollup
+
+    def event(tokens, cached=False):
+        rollup = empty_rollup()
+        rollup["requests"] = 1
+        if cached:
+            rollup["cache_hits"] = 1
+        else:
+            rollup.update(metered=1, calls=1, tokens=tokens, prompt_tokens=tokens, cost_usd=tokens / 1000,
+                          latency_ms_histogram={"<=500": 1})
+        return rollup
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db, snapshot = os.path.join(tmp, "metrics.db"), os.path.join(tmp, "metrics.json")
+        store = MetricsStore(db, snapshot, flush_every=50, flush_seconds=3600)
+
+        # 8 workers x 100 requests: sin escrituras por request ni conteos perdidos
+        def worker(n):
+            for i in range(100):
+                store.record("gemini-test", event(10, cached=(i % 4 == 0)))
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not os.path.exists(snapshot), "El resumen JSON no se escribe por request"
+        assert store.totals["total_requests"] == 800 and store.totals["cache_hits"] == 200
+        assert store.totals["models"]["gemini-test"]["latency_ms_histogram"] == {"<=500": 600}
+
+        # Eventos de días anteriores: se compactan en un rollup por (día, modelo)
+        for _ in range(5):
+            store.record("gemini-test", event(100), date="2020-01-01")
+        store.close()
+        conn = sqlite3.connect(db)
+        assert conn.execute("SELECT COUNT(*) FROM metric_events WHERE date < '2021-01-01'").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM metric_daily").fetchone()[0] == 1
+        assert conn.execute("SELECT COUNT(*) FROM metric_events").fetchone()[0] == 800
+        conn.close()
+
+        saved = json.load(open(snapshot, encoding="utf-8"))
+        assert saved["total_requests"] == 805 and saved["total_tokens"] == 600 * 10 + 500
+        assert saved["requests_by_date"]["2020-01-01"]["requests"] == 5
+
+        # Una nueva ejecución retoma el historial (rollups + eventos)
+        reopened = MetricsStore(db, snapshot)
+        assert reopened.totals["total_requests"] == 805
+        assert reopened.totals["models"]["gemini-test"]["requests"] == 605
+        reopened.close()
+
+    print("✅ 805 requests de 8 threads, 1 rollup diario compactado, resumen JSON al cerrar")
+
+
+def test_structured_output():
+    """Test 13: JSON con esquema, reparación local y sin reintentos por formato"""
+    print("\n" + "="*70)
+    print("TEST 13: Salida Estructurada")
+    print("="*70)
+
+    from src.structured_output import (
+        analysis_schema, batch_schema, normalize_analysis, parse_response, ResponseFormatError
+    )
+
+    schema = analysis_schema()
+    assert schema["required"] == ["MIA_Rubro", "MIA_Score_IA", "MIA_Resumen_Tecnico"]
+    assert schema["properties"]["MIA_Score_IA"] == {"type": "integer"}
+    assert batch_schema()["items"]["required"][0] == "id"
+
+    # Reparaciones locales
+    completo = json.dumps(ANALISIS, ensure_ascii=False)
+    assert parse_response(completo) == (ANALISIS, None)
+    assert parse_response("Claro:\n```json\n" + completo[:-1] + ",}\n```") == (ANALISIS, "cleaned")
+    cortado, repair = parse_response(completo[:80])
+    assert repair == "truncated" and cortado["MIA_Rubro"] == ANALISIS["MIA_Rubro"]
+    for texto, kind in (("", "empty"), ("No puedo ayudar con eso.", "malformed")):
+        try:
+            parse_response(texto)
+            raise AssertionError(f"{texto!r} debería fallar")
+        except ResponseFormatError as e:
+            assert e.kind == kind
+    assert normalize_analysis({"MIA_Score_IA": "85/100"})["MIA_Score_IA"] == 85
+    assert normalize_analysis({"MIA_Score_IA": 140})["MIA_Score_IA"] == 100
+
+    class _SchemaModel(_FakeModel):
+        """Registra el generation_config y responde con score como texto."""
+
+        def __init__(self):
+            super().__init__({**ANALISIS, "MIA_Score_IA": "70"})
+            self.configs = []
+
+        def generate_content(self, prompt, **kwargs):
+            self.configs.append(kwargs.get("generation_config"))
+            return super().generate_content(prompt, **kwargs)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model = _SchemaModel()
+        analyzer = _make_analyzer(tmp, model)
+        result = analyzer.analyze_opportunity("Pliego: provisión de cloro", ["cloro"])
+        assert result["MIA_Score_IA"] == 70 and len(model.calls) == 1
+        assert model.configs[0]["response_mime_type"] == "application/json"
+        assert model.configs[0]["response_schema"] == schema
+
+        analyzer.structured_output = False
+        analyzer.analyze_opportunity("Pliego: provisión de bombas", ["bombas"])
+        assert model.configs[1] is None
+        analyzer.close()
+
+    print("✅ Esquema enviado, JSON con fences/coma final/cortado reparado sin reenviar el prompt")
+
+
+def test_gemini_quota_client():
+    """Test 14: cuota RPM/TPM compartida, pista de espera del 429 y errores fatales"""
+    print("\n" + "="*70)
+    print("TEST 14: Cuota de Gemini")
+    print("="*70)
+
+    from types import SimpleNamespace
+    from google.api_core import exceptions as api_exceptions
+    from src.gemini_client import GeminiClient, classify_error, retry_hint
+
+    agotada = api_exceptions.ResourceExhausted("Quota exceeded. Please retry in 0.3s.")
+    assert classify_error(agotada) == "quota" and abs(retry_hint(agotada) - 0.3) < 1e-9
+    assert classify_error(api_exceptions.ServiceUnavailable("overloaded")) == "transient"
+    assert classify_error(api_exceptions.InvalidArgument("bad schema")) == "fatal"
+    assert retry_hint(api_exceptions.ServiceUnavailable("overloaded")) is None
+
+    class _QuotaModel:
+        """El primer request recibe un 429; registra cuándo llega cada uno."""
+
+        def __init__(self, tokens=0, error=agotada):
+            self.times, self.tokens, self.error = [], tokens, error
+            self._lock = threading.Lock()
+
+        def generate_content(self, prompt, **kwargs):
+            with self._lock:
+                self.times.append(time.monotonic())
+                first = len(self.times) == 1
+            if first and self.error is not None:
+                raise self.error
+            response = _FakeResponse("{}")
+            response.usage_metadata = SimpleNamespace(total_token_count=self.tokens)
+            return response
+
+    def run(client, model, calls, workers=4):
+        threads = [threading.Thread(target=lambda: [client.generate(model, "p", estimated_tokens=100)
+                                                    for _ in range(calls // workers)]) for _ in range(workers)]
+        start = time.monotonic()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.monotonic() - start
+
+    # 429 con "retry in 0.3s": ningún worker vuelve a llamar antes de la pausa.
+    # Los demás workers arrancan apenas el 429 queda contado (sin llamadas en vuelo)
+    model = _QuotaModel()
+    client = GeminiClient(requests_per_minute=0, tokens_per_minute=0, max_attempts=3)
+    first = threading.Thread(target=client.generate, args=(model, "p"))
+    first.start()
+    while client.stats["quota_errors"] == 0:
+        time.sleep(0.0005)
+    run(client, model, 8)
+    first.join()
+    assert len(model.times) == 10 and client.stats["quota_errors"] == 1
+    assert all(t >= model.times[0] + 0.29 for t in model.times[1:]), "Llamadas durante la pausa"
+
+    # RPM: 600/min (10/s, ráfaga 2) reparte 12 requests de 4 workers a ritmo parejo
+    client = GeminiClient(requests_per_minute=600, tokens_per_minute=0, burst=2)
+    elapsed = run(client, _QuotaModel(error=None), 12)
+    assert 0.9 <= elapsed < 2.0, elapsed
+
+    # TPM: los tokens reales (30000 por respuesta) se descuentan del balde
+    client = GeminiClient(requests_per_minute=0, tokens_per_minute=60000)
+    model = _QuotaModel(tokens=30000, error=None)
+    for _ in range(2):
+        client.generate(model, "p", estimated_tokens=100)
+    assert client.stats["waited_s"] == 0
+    client.generate(model, "p", estimated_tokens=100)
+    assert client.stats["waited_s"] >= 0.09, client.stats
+
+    # Error fatal: no se reintenta
+    model = _QuotaModel(error=api_exceptions.InvalidArgument("bad schema"))
+    client = GeminiClient(requests_per_minute=0, tokens_per_minute=0, max_attempts=3)
+    try:
+        client.generate(model, "p")
+        raise AssertionError("InvalidArgument debería propagarse")
+    except api_exceptions.InvalidArgument:
+        pass
+    assert len(model.times) == 1
+
+    print(f"✅ Pausa global de 0.3s tras el 429, 12 requests a 10/s en {elapsed:.2f}s, TPM con tokens reales")
+
+
+
+def test_model_cascade():
+    """Test 15: triage en el modelo económico, análisis completo solo si score >= umbral"""
+    print("\n" + "="*70)
+    print("TEST 15: Análisis en Cascada")
+    print("="*70)
+
+    class _TriageModel(_FakeModel):
+        """Triage simulado: score alto solo si el texto habla de ósmosis."""
+
+        def generate_content(self, prompt, **kwargs):
+            self.calls.append(prompt)
+            score = 80 if "ósmosis" in prompt.split("**TEXTO:**", 1)[1] else 15
+            return _FakeResponse(json.dumps({"MIA_Rubro": "Purificación - Provisión", "MIA_Score_IA": score}))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        full, triage = _FakeModel(), _TriageModel()
+        analyzer = _make_analyzer(tmp, full)
+        assert analyzer.triage_prompt_template, "Falta triage_prompt en config/prompts.json"
+        analyzer.cascade_enabled = True
+        analyzer.triage_model, analyzer.triage_model_name = triage, "modelo-triage"
+        analyzer.model_name = "modelo-completo"
+        analyzer.min_relevance_score = 40
+
+        bajo = analyzer.analyze_opportunity("Provisión de resmas de papel y cloro para oficinas", ["cloro"])
+        alto = analyzer.analyze_opportunity("Provisión de planta de ósmosis inversa", ["ósmosis"])
+        assert (bajo["MIA_Tier"], bajo["MIA_Modelo"], bajo["MIA_Score_IA"]) == ("triage", "modelo-triage", 15)
+        assert bajo["MIA_Resumen_Tecnico"] == ""
+        assert (alto["MIA_Tier"], alto["MIA_Modelo"]) == ("completo", "modelo-completo")
+        assert alto["MIA_Resumen_Tecnico"] == ANALISIS["MIA_Resumen_Tecnico"]
+        assert len(triage.calls) == 2 and len(full.calls) == 1
+
+        # Triage y análisis completo se cachean por separado
+        analyzer.analyze_opportunity("Provisión de resmas de papel y cloro para oficinas", ["cloro"])
+        analyzer.analyze_opportunity("Provisión de planta de ósmosis inversa", ["ósmosis"])
+        assert len(triage.calls) == 2 and len(full.calls) == 1
+
+        # Con cascada no hay lotes: los textos cortos también pasan por el triage
+        analyzer.batch_enabled, analyzer.batch_size = True, 10
+        cortos = [{"url": f"https://www.aysa.com.ar/licitacion/{i}", "full_text": f"Fila {i}: resmas de papel",
+                   "matched_keywords": ["papel"]} for i in range(3)]
+        results = list(analyzer.analyze_many(cortos))
+        assert all(analysis["MIA_Tier"] == "triage" for _, analysis in results)
+        assert len(triage.calls) == 5 and len(full.calls) == 1
+
+        analyzer.close()
+        models = json.load(open(analyzer.metrics_file, encoding="utf-8"))["models"]
+        assert models["modelo-triage"]["requests"] == 5 and models["modelo-completo"]["requests"] == 1
+
+        # Los aciertos de caché del triage se atribuyen al modelo del triage
+        import sqlite3
+        hits = {}
+        with sqlite3.connect(analyzer.metrics_store.db_path) as conn:
+            for model, rollup in conn.execute("SELECT model, rollup FROM metric_events"):
+                hits[model] = hits.get(model, 0) + json.loads(rollup)["cache_hits"]
+        assert hits == {"modelo-triage": 2, "modelo-completo": 1}, hits
+
+    print("✅ 5 triages, 1 análisis completo; MIA_Tier/MIA_Modelo por oportunidad")
+
+
+def test_buffered_result_writer():
+    """Test 16: sesión de escritura con un solo open, flush por tamaño y al cerrar"""
+    print("\n" + "="*70)
+    print("TEST 16: Escritura por Lotes")
+    print("="*70)
+
+    import builtins
+    from src.sheets_manager import SheetsManager
+
+    def data_rows(path):
+        with open(path, encoding="utf-8") as f:
+            return sum(1 for _ in f) - 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "results.csv")
+        env = {"OUTPUT_CSV_FILE": csv_path, "OUTPUT_BACKUP_DIR": os.path.join(tmp, "backups"),
+               "OUTPUT_CREATE_BACKUP": "true"}
+        with patch.dict(os.environ, env):
+            sheets = SheetsManager(key_path=os.path.join(tmp, "no_creds.json"))
+            assert sheets.add_row(_fila(0))   # Sin sesión: escritura inmediata
+            assert data_rows(csv_path) == 1
+
+            with patch("src.sheets_manager.open", create=True, side_effect=builtins.open) as opened, \
+                    patch("shutil.copy2") as copied:
+                with sheets.buffered_writer(flush_rows=50, flush_seconds=3600):
+                    for i in range(1, 121):
+                        assert sheets.add_row(_fila(i))
+                        if i == 100:
+                            assert data_rows(csv_path) == 101   # Dos lotes de 50
+                    assert not sheets.add_row(_fila(7)), "Duplicado en buffer"
+                    assert data_rows(csv_path) == 101
+                # Un open para la sesión (+1 para leer el encabezado existente)
+                assert opened.call_count <= 2, opened.call_count
+                assert copied.call_count == 0, "El backup del día ya se verificó en esta ejecución"
+
+        assert data_rows(csv_path) == 121
+
+    print("✅ 120 filas con 1 apertura del CSV, lotes de 50 y flush final al cerrar la sesión")
+
+
+def test_google_sheets_sink():
+    """Test 17: un values.append por lote, backoff ante 429 / errores de red y URLs en memoria"""
+    print("\n" + "="*70)
+    print("TEST 17: Google Sheets por Lotes")
+    print("="*70)
+
+    import requests
+    from src.fake_sheets_server import FakeSheetsServer
+    from src.sheets_manager import SheetsManager, DEFAULT_FIELDNAMES
+    from src.sheets_sink import GoogleSheetsSink
+
+    # Cuota: 2 requests cada 0.5s; los 429 traen Retry-After
+    with FakeSheetsServer(quota_per_window=2, window_seconds=0.5, retry_after=0.2) as server:
+        sink = GoogleSheetsSink(requests.Session(), "sheet-test", columns=DEFAULT_FIELDNAMES,
+                                api_url=server.url, backoff_base=0.05)
+        assert sink.existing == {}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {"OUTPUT_CSV_FILE": os.path.join(tmp, "results.csv"), "OUTPUT_CREATE_BACKUP": "false"}
+            with patch.dict(os.environ, env):
+                sheets = SheetsManager(key_path=os.path.join(tmp, "no_creds.json"), sheets_sink=sink)
+                with sheets.buffered_writer(flush_rows=100, flush_seconds=3600):
+                    for i in range(250):
+                        assert sheets.add_row(_fila(i))
+
+        values = server.rows("sheet-test", "Oportunidades")
+        assert values[0] == DEFAULT_FIELDNAMES, "Encabezado en la hoja vacía"
+        assert len(values) == 251
+        assert server.count("POST") == 3, "Un values.append por lote (100 + 100 + 50)"
+        assert server.count("GET") == 1, "La hoja se lee una sola vez"
+        throttled = sink.stats["throttled"]
+        assert throttled >= 1 and server.count("POST", 429) >= 1
+
+        # Otra ejecución: URLs de la hoja con una lectura, duplicados sin escribir
+        sink = GoogleSheetsSink(requests.Session(), "sheet-test", api_url=server.url, backoff_base=0.05)
+        assert len(sink.existing) == 250
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {"OUTPUT_CSV_FILE": os.path.join(tmp, "results.csv"), "OUTPUT_CREATE_BACKUP": "false"}
+            with patch.dict(os.environ, env):
+                sheets = SheetsManager(key_path=os.path.join(tmp, "no_creds.json"), sheets_sink=sink)
+                assert not sheets.add_row(_fila(3))
+                assert sheets.add_row(_fila(250))   # Sin sesión: queda en el lote
+                assert len(server.rows("sheet-test", "Oportunidades")) == 251
+                sheets.close()
+        assert len(server.rows("sheet-test", "Oportunidades")) == 252
+        assert server.count("GET", 200) == 2
+
+        # Corte de red en un values.append: se reintenta, el lote no se pierde
+        class _FlakySession(requests.Session):
+            failures = 1
+
+            def request(self, method, url, **kwargs):
+                if method == "POST" and self.failures:
+                    self.failures -= 1
+                    raise requests.exceptions.ConnectionError("Connection reset by peer")
+                return super().request(method, url, **kwargs)
+
+        sink = GoogleSheetsSink(_FlakySession(), "sheet-test", api_url=server.url, backoff_base=0.05)
+        assert sink.append(_fila(260)) and sink.flush() == 1
+        assert len(server.rows("sheet-test", "Oportunidades")) == 253
+
+        # Flush final sin conexión: las filas quedan en el spool y se envían
+        # en la ejecución siguiente
+        with tempfile.TemporaryDirectory() as tmp:
+            spool = os.path.join(tmp, "pending.jsonl")
+            sink = GoogleSheetsSink(requests.Session(), "sheet-test", api_url=server.url,
+                                    backoff_base=0.05, spool_path=spool)
+            assert sink.append(_fila(251))
+            sink.api_url, sink.max_attempts = "http://127.0.0.1:9", 1
+            assert sink.close() == 1 and os.path.exists(spool)
+            assert len(server.rows("sheet-test", "Oportunidades")) == 253
+
+            sink = GoogleSheetsSink(requests.Session(), "sheet-test", api_url=server.url,
+                                    backoff_base=0.05, spool_path=spool)
+            assert len(sink) == 1
+            assert sink.close() == 0 and not os.path.exists(spool)
+            assert len(server.rows("sheet-test", "Oportunidades")) == 254
+
+    print(f"✅ 250 filas en 3 values.append, {throttled} reintentos ante 429, "
+          f"URLs de la hoja cargadas con 1 lectura")
+
+
+def test_dedupe_store():
+    """Test 18: el índice de duplicados lee solo las filas nuevas del CSV"""
+    print("\n" + "="*70)
+    print("TEST 18: Índice de URLs Procesadas")
+    print("="*70)
+
+    import csv
+    from src.sheets_manager import SheetsManager, DEFAULT_FIELDNAMES
+
+    resumen = "fila {i}\ncon salto de línea"   # Celda entre comillas en el CSV
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "results.csv")
+        with open(csv_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=DEFAULT_FIELDNAMES, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(_fila(i, resumen) for i in range(20000))
+
+        env = {"OUTPUT_CSV_FILE": csv_path, "OUTPUT_CREATE_BACKUP": "false"}
+        with patch.dict(os.environ, env):
+            def manager():
+                return SheetsManager(key_path=os.path.join(tmp, "no_creds.json"))
+
+            # Primera ejecución: se indexa el historial
+            sheets = manager()
+            assert sheets.processed_items.synced_rows == 20000
+            assert sheets.dedupe_db == os.path.join(tmp, "results.dedupe.db")
+            assert not sheets.add_row(_fila(19999, resumen)) and sheets.add_row(_fila(20000, resumen))
+
+            # Siguiente ejecución: solo la fila agregada, el resto no se lee
+            start = time.perf_counter()
+            sheets = manager()
+            elapsed = time.perf_counter() - start
+            assert sheets.processed_items.synced_rows == 1
+            assert not sheets.add_row(_fila(20000, resumen)) and not sheets.add_row(_fila(5, resumen))
+
+            sheets = manager()
+            assert sheets.processed_items.synced_rows == 0
+
+            # Filas agregadas a mano al CSV: se leen al iniciar
+            with open(csv_path, "a", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=DEFAULT_FIELDNAMES, extrasaction="ignore")
+                writer.writerow(_fila(30000, resumen))
+            sheets = manager()
+            assert sheets.processed_items.synced_rows == 1 and not sheets.add_row(_fila(30000, resumen))
+
+            # CSV reemplazado por uno más corto: el índice se reconstruye
+            with open(csv_path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=DEFAULT_FIELDNAMES, extrasaction="ignore")
+                writer.writeheader()
+                writer.writerow(_fila(1, resumen))
+            sheets = manager()
+            assert sheets.processed_items.synced_rows == 1
+            assert not sheets.add_row(_fila(1, resumen)) and sheets.add_row(_fila(2, resumen))
+
+            # Corte con filas en buffer: no quedan registradas como escritas
+            sheets = manager()
+            session = sheets.buffered_writer(flush_rows=50, flush_seconds=3600)
+            session.__enter__()
+            assert sheets.add_row(_fila(40000, resumen)) and not sheets.add_row(_fila(40000, resumen))
+            sheets._buffer.clear()   # Proceso terminado antes del flush: el buffer se pierde
+            session.__exit__(None, None, None)
+            sheets = manager()
+            assert sheets.add_row(_fila(40000, resumen)), "Fila perdida: el índice la daba por escrita"
+
+            # CSV borrado: sin duplicados previos
+            os.remove(csv_path)
+            sheets = manager()
+            assert sheets.add_row(_fila(1, resumen))
+
+    print(f"✅ 20000 filas indexadas una vez; arranque siguiente en {elapsed * 1000:.0f}ms leyendo 1 fila")
+
+
+def test_content_aware_dedupe():
+    """Test 19: la misma URL con otro contenido pasa; solo se omite lo que no cambió"""
+    print("\n" + "="*70)
+    print("TEST 19: Duplicados por Contenido")
+    print("="*70)
+
+    from src.sheets_manager import SheetsManager
+    from src.dedupe_store import content_hash
+
+    listado = "https://aysa.com.ar/proveedores/licitaciones/"
+
+    def tender(numero, estado):
+        return {"portal": "AySA", "url": listado, "numero_licitacion": numero,
+                "full_text": f"Licitación {numero}: Planta de ósmosis inversa. Estado: {estado}."}
+
+    def home(text):
+        return {"portal": "Comprar", "url": "https://comprar.gob.ar", "full_text": text}
+
+    def write(sheets, ops):
+        return [sheets.add_row({"Portal": op["portal"], "MIA_URL": op["url"], "MIA_Rubro": "Purificación",
+                                "MIA_Score_IA": 70, "MIA_Resumen_Tecnico": "ok",
+                                "MIA_ID_Licitacion": op.get("numero_licitacion"),
+                                "MIA_Hash_Contenido": op["content_hash"]}) for op in ops]
+
+    assert content_hash("Actualizado 10:15  Planta de\nÓsmosis") == content_hash("actualizado 18:40:02 planta de ósmosis")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {"OUTPUT_CSV_FILE": os.path.join(tmp, "results.csv"), "OUTPUT_CREATE_BACKUP": "false"}
+        with patch.dict(os.environ, env):
+            def manager():
+                return SheetsManager(key_path=os.path.join(tmp, "no_creds.json"))
+
+            # Dos licitaciones con la misma URL de listado y la página del portal
+            sheets = manager()
+            ops = [tender("LPI 1/2026", "Abierta"), tender("LPI 2/2026", "Abierta"), home("Licitaciones: planta de agua"),
+                   tender("LPI 1/2026", "Abierta")]
+            pending, unchanged = sheets.filter_unchanged(ops)
+            assert len(pending) == 3 and len(unchanged) == 1, "Repetida en la misma ejecución"
+            assert write(sheets, pending) == [True, True, True]
+
+            # Siguiente ejecución: solo pasa lo que cambió
+            sheets = manager()
+            ops = [tender("LPI 1/2026", "Adjudicada"), tender("LPI 2/2026", "Abierta"),
+                   home("Licitaciones: planta de agua"), tender("LPI 3/2026", "Abierta")]
+            pending, unchanged = sheets.filter_unchanged(ops)
+            assert [op.get("numero_licitacion") for op in pending] == ["LPI 1/2026", "LPI 3/2026"]
+            assert len(unchanged) == 2
+            assert write(sheets, pending) == [True, True]
+            assert not write(sheets, pending[:1])[0], "Mismo contenido en la misma ejecución"
+
+            pending, _ = sheets.filter_unchanged([home("Licitaciones: efluentes industriales")])
+            assert len(pending) == 1, "La página del portal con otro contenido es nueva"
+
+            # El índice se reconstruye desde el CSV con el último estado de cada clave
+            os.remove(sheets.dedupe_db)
+            sheets = manager()
+            assert sheets.processed_items.synced_rows == 5
+            pending, _ = sheets.filter_unchanged([tender("LPI 1/2026", "Adjudicada"), tender("LPI 1/2026", "Abierta")])
+            assert [op["full_text"].endswith("Abierta.") for op in pending] == [True]
+
+    print("✅ Clave portal + N° de licitación (o URL) con hash de contenido: cambios pasan, repetidos no")
+
+
+def test_sqlite_results_store():
+    """Test 20: backend SQLite con todos los campos MIA_*, consultas por índice y CSV derivado"""
+    print("\n" + "="*70)
+    print("TEST 20: Historial SQLite")
+    print("="*70)
+
+    import csv
+    from src.sheets_manager import SheetsManager
+    from src.results_store import ResultsStore
+
+    def row(i, portal="AySA", rubro="Rubro 2: Purificación - Provisión", score=60, day=1):
+        return {"Timestamp_Deteccion": f"2026-03-{day:02d} 10:00:00", "Portal": portal,
+                "MIA_URL": f"https://aysa.com.ar/licitacion/{i}", "MIA_Rubro": rubro, "MIA_Score_IA": score,
+                "MIA_Resumen_Tecnico": f"fila {i}", "MIA_Link_al_Pliego": f"https://aysa.com.ar/pliego/{i}.pdf",
+                "MIA_Empresa_Asignada": "Water Tech", "MIA_Preguntas_Tecnicas": ["¿Caudal?", "¿Calidad de agua cruda?"]}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "results.csv")
+        env = {"OUTPUT_CSV_FILE": csv_path, "OUTPUT_CREATE_BACKUP": "false", "OUTPUT_BACKENDS": "csv, sqlite"}
+        with patch.dict(os.environ, env):
+            sheets = SheetsManager(key_path=os.path.join(tmp, "no_creds.json"))
+            assert sheets.backends == ["csv", "sqlite"]
+            assert sheets.add_row(row(0))   # Sin sesión
+            with sheets.buffered_writer(flush_rows=50, flush_seconds=3600):
+                for i in range(1, 121):
+                    assert sheets.add_row(row(i))
+                assert sheets.results_store.count() == 101, "Dos lotes de 50 + la fila previa"
+            store = sheets.results_store
+            assert store.count() == 121
+            with open(csv_path, encoding="utf-8") as f:
+                header = next(csv.reader(f))
+            assert "MIA_Preguntas_Tecnicas" not in header, "El CSV no guarda los campos extra"
+            saved = store.query(limit=1)[0]
+            assert saved["MIA_Preguntas_Tecnicas"] == ["¿Caudal?", "¿Calidad de agua cruda?"]
+            assert saved["MIA_Link_al_Pliego"].endswith(".pdf") and saved["MIA_Empresa_Asignada"] == "Water Tech"
+
+        # Solo SQLite: no se crea CSV; backend desconocido se ignora
+        env = {"OUTPUT_CSV_FILE": os.path.join(tmp, "solo.csv"), "OUTPUT_CREATE_BACKUP": "false",
+               "OUTPUT_BACKENDS": "sqlite,parquet"}
+        with patch.dict(os.environ, env):
+            sheets = SheetsManager(key_path=os.path.join(tmp, "no_creds.json"))
+            with sheets.buffered_writer():
+                assert sheets.add_row(row(1)) and not sheets.add_row(row(1))
+            assert sheets.backends == ["sqlite"] and sheets.results_store.count() == 1
+            assert not os.path.exists(os.path.join(tmp, "solo.csv"))
+
+        # Consultas de reportes: índices por portal + fecha, score y rubro
+        store = ResultsStore(os.path.join(tmp, "reportes.db"))
+        portals = ["AySA", "Comprar", "Boletín"]
+        rubros = ["Rubro 1: Efluentes", "Rubro 2: Purificación - Provisión"]
+        store.insert_many(row(i, portals[i % 3], rubros[i % 2], i % 101, 1 + i % 28) for i in range(30000))
+        start = time.perf_counter()
+        recent = store.query(portal="AySA", since="2026-03-22")
+        high = store.query(min_score=95, rubro=rubros[0])
+        elapsed = time.perf_counter() - start
+        assert len(recent) == sum(1 for i in range(30000) if i % 3 == 0 and 1 + i % 28 >= 22)
+        assert all(r["MIA_Score_IA"] >= 95 and r["MIA_Rubro"] == rubros[0] for r in high) and high
+        plan = " ".join(str(r) for r in store._connection().execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM results WHERE portal = ? AND detected_at >= ?", ("AySA", "2026-03-22")))
+        assert "idx_results_portal_date" in plan, plan
+
+        # CSV derivado de la base, con los mismos filtros
+        export = os.path.join(tmp, "export.csv")
+        assert store.export_csv(export, portal="AySA", since="2026-03-22") == len(recent)
+        with open(export, encoding="utf-8") as f:
+            exported = list(csv.DictReader(f))
+        assert exported[0]["MIA_Preguntas_Tecnicas"] == "¿Caudal?\n¿Calidad de agua cruda?"
+        assert [r["Timestamp_Deteccion"] for r in exported] == sorted(r["Timestamp_Deteccion"] for r in exported)
+        views = store._connection().execute("SELECT COUNT(*) FROM results_csv").fetchone()[0]
+        assert views == 30000
+
+    print(f"✅ 30000 resultados: 2 consultas en {elapsed * 1000:.0f}ms por índice, "
+          f"campos extra guardados y CSV exportado")
+
+def main():
+    """Ejecutar todos los tests"""
+    print("\n" + "="*70)
+    print("MIA V4.0 - TESTING DE LA ETAPA DE ANÁLISIS")
+    print("="*70)
+    print(f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    tests = {
+        "Test 1 - Caché Persistente": test_persistent_cache,
+        "Test 2 - Desalojo LRU": test_lru_eviction,
+        "Test 3 - Caché entre Procesos": test_multiprocess_cache,
+        "Test 4 - Claves Versionadas": test_versioned_cache_keys,
+        "Test 5 - Casi-Duplicados": test_near_duplicates,
+        "Test 6 - Velocidad de Búsqueda": test_near_duplicate_lookup_speed,
+        "Test 7 - Análisis Concurrente": test_concurrent_analysis,
+        "Test 8 - Análisis por Lotes": test_batch_analysis,
+        "Test 9 - Contexto por Keywords": test_keyword_context,
+        "Test 10 - Score Local": test_local_relevance_gate,
+        "Test 11 - Tokens Reales": test_usage_metadata_accounting,
+        "Test 12 - Métricas en Buffer": test_buffered_metrics,
+        "Test 13 - Salida Estructurada": test_structured_output,
+        "Test 14 - Cuota de Gemini": test_gemini_quota_client,
+        "Test 15 - Análisis en Cascada": test_model_cascade,
+        "Test 16 - Escritura por Lotes": test_buffered_result_writer,
+        "Test 17 - Google Sheets por Lotes": test_google_sheets_sink,
+        "Test 18 - Índice de URLs Procesadas": test_dedupe_store,
+        "Test 19 - Duplicados por Contenido": test_content_aware_dedupe,
+        "Test 20 - Historial SQLite": test_sqlite_results_store,
+    }
+
+    results = {}
+    for name, test in tests.items():
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"❌ {name}: {e}")
+            results[name] = False
+
+    print("\n" + "="*70)
+    print("RESUMEN DE TESTS")
+    print("="*70)
+    for name, ok in results.items():
+        print(f"{'✅ PASS' if ok else '❌ FAIL'} - {name}")
+
+    passed = sum(results.values())
+    print(f"\nRESULTADO FINAL: {passed}/{len(results)} tests pasados")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""
+================================================================================
+MIA V4.0 - TESTING DE EXTRACCIÓN HTML
+================================================================================
+
+OBJETIVO:
+    Validar la extracción de texto de html_extractor.py:
+    - Eliminación de <script>, <style> y comentarios
+    - Normalización de espacios
+    - Restricción a nodos específicos
+    - Mismo resultado con backend lxml y html.parser
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Extracción HTML
+================================================================================
+"""
+
+import os
+import sys
+from datetime import datetime
+
+# Agregar directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+HTML = """<!DOCTYPE html>
+<html><head>
+  <meta charset="utf-8">
+  <title>  Licitaciones   Vigentes </title>
+  <style>.licitacion { color: red; }</style>
+  <script>var licitacion = "pública";</script>
+</head>
+<body>
+  <div id="menu">Inicio | Contacto</div>
+  <!-- licitación oculta en comentario -->
+  <table>
+    <tr><td>Licitación   Pública N° 12/2026</td></tr>
+    <tr><td>Provisión de Ósmosis Inversa</td></tr>
+  </table>
+  <noscript>Active JavaScript</noscript>
+</body></html>
+"""
+
+
+def test_strip_non_text():
+    """Test 1: scripts, estilos y comentarios no aparecen en el texto"""
+    print("\n" + "="*70)
+    print("TEST 1: Eliminación de Contenido No Visible")
+    print("="*70)
+
+    from src.html_extractor import extract_document
+
+    doc = extract_document(HTML.encode("utf-8"))
+
+    assert "color" not in doc.text
+    assert "var licitacion" not in doc.text
+    assert "comentario" not in doc.text
+    assert "JavaScript" not in doc.text
+    assert "Licitación Pública N° 12/2026" in doc.text, doc.text
+    assert "Provisión de Ósmosis Inversa" in doc.text
+    assert doc.title == "Licitaciones Vigentes"
+    assert "\n\n" not in doc.text and "  " not in doc.text
+
+    print(f"✅ Texto limpio ({doc.backend}): {doc.text!r}")
+
+
+def test_only_tags():
+    """Test 2: restringir la extracción a ciertos nodos"""
+    print("\n" + "="*70)
+    print("TEST 2: Restricción a Nodos")
+    print("="*70)
+
+    from src.html_extractor import extract_document
+
+    for backend in ("lxml", "html.parser"):
+        doc = extract_document(HTML, only_tags=["table"], backend=backend)
+        assert "Inicio" not in doc.text, backend
+        assert "Licitaciones Vigentes" not in doc.text, backend
+        assert "Provisión de Ósmosis Inversa" in doc.text, backend
+
+        # Sin nodos seleccionados se usa el documento completo
+        doc = extract_document(HTML, only_tags=["article"], backend=backend)
+        assert "Inicio | Contacto" in doc.text, backend
+
+    print("✅ Restricción a <table> con lxml y html.parser")
+
+
+def test_backends_equivalent():
+    """Test 3: ambos backends producen el mismo texto"""
+    print("\n" + "="*70)
+    print("TEST 3: Equivalencia de Backends")
+    print("="*70)
+
+    from src.html_extractor import extract_document
+
+    fast = extract_document(HTML.encode("utf-8"), backend="lxml")
+    slow = extract_document(HTML.encode("utf-8"), backend="html.parser")
+
+    assert fast.backend == "lxml" and slow.backend == "html.parser"
+    assert fast.text == slow.text, (fast.text, slow.text)
+
+    print("✅ lxml y html.parser coinciden")
+
+
+def main():
+    """Ejecutar todos los tests"""
+    print("\n" + "="*70)
+    print("MIA V4.0 - TESTING DE EXTRACCIÓN HTML")
+    print("="*70)
+    print(f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    tests = {
+        "Test 1 - Contenido No Visible": test_strip_non_text,
+        "Test 2 - Restricción a Nodos": test_only_tags,
+        "Test 3 - Equivalencia de Backends": test_backends_equivalent,
+    }
+
+    results = {}
+    for name, test in tests.items():
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"❌ {name}: {e}")
+            results[name] = False
+
+    print("\n" + "="*70)
+    print("RESUMEN DE TESTS")
+    print("="*70)
+    for name, ok in results.items():
+        print(f"{'✅ PASS' if ok else '❌ FAIL'} - {name}")
+
+    passed = sum(results.values())
+    print(f"\nRESULTADO FINAL: {passed}/{len(results)} tests pasados")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
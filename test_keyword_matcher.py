@@ -0,0 +1,176 @@
+"""
+================================================================================
+MIA V4.0 - TESTING DEL MATCHER DE KEYWORDS
+================================================================================
+
+OBJETIVO:
+    Validar el matcher multi-patrón (Aho-Corasick) de keyword_matcher.py:
+    - Matching sin distinguir mayúsculas ni acentos
+    - Posiciones válidas en el texto original
+    - Límite de palabra para keywords de rubros
+    - Búsqueda incremental equivalente a la búsqueda completa
+    - Texto con acentos combinantes (NFD) normalizado en la extracción
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Matcher de Keywords
+================================================================================
+"""
+
+import os
+import sys
+from datetime import datetime
+
+# Agregar directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+TEXTO = (
+    "AVISO: Se convoca a LICITACIÓN PÚBLICA N° 12/2026 para la provision de "
+    "una Planta de Osmosis Inversa Industrial. Licitacion publica con pliego "
+    "de bases y condiciones disponible. Equipos RO incluidos; rotor excluido."
+)
+
+
+def test_accent_and_case_insensitive():
+    """Test 1: mayúsculas y acentos no afectan el matching"""
+    print("\n" + "="*70)
+    print("TEST 1: Normalización de Mayúsculas y Acentos")
+    print("="*70)
+
+    from src.keyword_matcher import KeywordMatcher, normalize_text
+
+    assert len(normalize_text(TEXTO)) == len(TEXTO), "La normalización cambió el largo"
+
+    matcher = KeywordMatcher(["licitación pública", "Provisión de", "pliego de bases y condiciones"])
+    match = matcher.search(TEXTO)
+
+    assert match.counts == {
+        "licitación pública": 2,
+        "Provisión de": 1,
+        "pliego de bases y condiciones": 1
+    }, match.counts
+    for keyword, hits in match.positions.items():
+        for start, end in hits:
+            assert normalize_text(TEXTO[start:end]) == normalize_text(keyword).replace("  ", " ")
+
+    print(f"✅ Conteos: {match.counts}")
+
+
+def test_default_matcher_categories():
+    """Test 2: triggers, search keywords y rubros en un único autómata"""
+    print("\n" + "="*70)
+    print("TEST 2: Matcher con Categorías")
+    print("="*70)
+
+    from src.keyword_matcher import build_default_matcher
+
+    rubros = {
+        "Rubro 2: Purificación - Provisión": [
+            "II. Provisión, Agua:",
+            "Ósmosis Inversa Industrial (RO)",
+        ]
+    }
+    matcher = build_default_matcher(
+        triggers=["licitación pública", "provisión de"],
+        search_keywords=["agua"],
+        rubros=rubros
+    )
+    match = matcher.search(TEXTO)
+
+    assert match.keywords("trigger") == ["licitación pública", "provisión de"]
+    assert match.keywords("search_keyword") == []
+    assert match.groups("rubro") == {
+        "Rubro 2: Purificación - Provisión": ["Ósmosis Inversa Industrial (RO)"]
+    }
+    # "RO" cuenta como palabra completa, pero no dentro de "rotor"
+    assert match.counts["Ósmosis Inversa Industrial (RO)"] == 2
+
+    print(f"✅ Triggers: {match.keywords('trigger')}")
+    print(f"✅ Rubros: {list(match.groups('rubro'))}")
+
+
+def test_streaming_equivalence():
+    """Test 3: alimentar el texto por partes da el mismo resultado"""
+    print("\n" + "="*70)
+    print("TEST 3: Búsqueda Incremental")
+    print("="*70)
+
+    from src.keyword_matcher import KeywordMatcher
+
+    matcher = KeywordMatcher(["licitación pública", "osmosis inversa"])
+    matcher.add("RO", whole_word=True)
+    full = matcher.search(TEXTO)
+
+    for size in (1, 5, 17):
+        scanner = matcher.scanner()
+        for i in range(0, len(TEXTO), size):
+            scanner.feed(TEXTO[i:i + size])
+        assert scanner.close().positions == full.positions, f"Diferencia con chunks de {size}"
+
+    print(f"✅ Resultados idénticos con chunks de 1, 5 y 17 caracteres")
+
+
+def test_decomposed_accents():
+    """Test 4: texto NFD (letra + acento combinante) extraído y encontrado"""
+    print("\n" + "="*70)
+    print("TEST 4: Acentos Combinantes (NFD)")
+    print("="*70)
+
+    import unicodedata
+    from src.html_extractor import HtmlTextStream, extract_document
+    from src.keyword_matcher import matcher_for
+
+    html = unicodedata.normalize('NFD', "<p>Licitación pública: planta de ósmosis inversa.</p>")
+    assert "licitacio\u0301n" in html.lower() and "o\u0301smosis" in html
+
+    text = extract_document(html, backend="html.parser").text
+    match = matcher_for(["licitacion", "ósmosis"]).search(text)
+    assert match.counts == {"licitacion": 1, "ósmosis": 1}, match.counts
+    start, end = match.positions["ósmosis"][0]
+    assert text[start:end] == "ósmosis"
+
+    # Streaming: el acento puede llegar en el chunk siguiente a su letra
+    for size in (1, 2, 7):
+        stream = HtmlTextStream()
+        streamed = "".join(stream.feed(html[i:i + size]) for i in range(0, len(html), size))
+        streamed += stream.close()
+        assert streamed == text, f"Diferencia con chunks de {size}: {streamed!r}"
+
+    print("✅ 'licitacio\u0301n' y 'o\u0301smosis' encontrados tras la extracción")
+
+
+def main():
+    """Ejecutar todos los tests"""
+    print("\n" + "="*70)
+    print("MIA V4.0 - TESTING DEL MATCHER DE KEYWORDS")
+    print("="*70)
+    print(f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    tests = {
+        "Test 1 - Mayúsculas y Acentos": test_accent_and_case_insensitive,
+        "Test 2 - Categorías": test_default_matcher_categories,
+        "Test 3 - Búsqueda Incremental": test_streaming_equivalence,
+        "Test 4 - Acentos Combinantes": test_decomposed_accents,
+    }
+
+    results = {}
+    for name, test in tests.items():
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"❌ {name}: {e}")
+            results[name] = False
+
+    print("\n" + "="*70)
+    print("RESUMEN DE TESTS")
+    print("="*70)
+    for name, ok in results.items():
+        print(f"{'✅ PASS' if ok else '❌ FAIL'} - {name}")
+
+    passed = sum(results.values())
+    print(f"\nRESULTADO FINAL: {passed}/{len(results)} tests pasados")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,526 @@
+"""
+================================================================================
+MIA V4.0 - TESTING DEL MOTOR DE SCRAPING
+================================================================================
+
+OBJETIVO:
+    Validar el motor de escaneo del Scraper sin acceder a internet:
+    - Escaneo concurrente de portales con límite global
+    - Concurrencia por host
+    - Tiempos por portal en portal_stats
+    - Cliente HTTP compartido con conexiones keep-alive
+    - GET condicional con caché de páginas (304 Not Modified)
+    - Descarga en streaming con límite de bytes y prefiltro de triggers
+    - Rate limiting adaptativo por host (429 / Retry-After)
+    - Circuit breaker por portal persistido entre ejecuciones
+
+AUTOR: Water Tech S.A.
+VERSIÓN: 4.0 - Motor de Scraping
+================================================================================
+"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Agregar directorio raíz al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+class _LocalHandler(BaseHTTPRequestHandler):
+    """Handler HTTP/1.1 local que registra el puerto de cada cliente."""
+    protocol_version = "HTTP/1.1"
+    client_ports = set()
+    body = "<html><body><p>Licitación pública de agua</p></body></html>"
+
+    def do_GET(self):
+        _LocalHandler.client_ports.add(self.client_address[1])
+        data = self.body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _start_local_server(handler=_LocalHandler):
+    """Levanta un servidor HTTP local en un thread y retorna (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _make_scraper(portals, parallel=1, per_host=1):
+    """Crea un Scraper con portales y límites de prueba."""
+    from src.scraper import Scraper
+
+    scraper = Scraper()
+    scraper.portals = portals
+    scraper.max_parallel_portals = parallel
+    scraper.per_host_concurrency = per_host
+    scraper.breaker = None  # Sin estado persistido entre tests
+    return scraper
+
+
+def test_concurrent_search_all():
+    """Test 1: search_all concurrente conserva orden y registra tiempos"""
+    print("\n" + "="*70)
+    print("TEST 1: Escaneo Concurrente de Portales")
+    print("="*70)
+
+    portals = [
+        {"name": f"portal{i}", "url": f"https://host{i}.example", "enabled": True}
+        for i in range(6)
+    ]
+    portals.append({"name": "apagado", "url": "https://off.example", "enabled": False})
+    scraper = _make_scraper(portals, parallel=6)
+
+    def fake_scan(portal, report=None):
+        time.sleep(0.2)
+        return [{"portal": portal['name'], "url": portal['url'], "matched_keywords": ["x"],
+                 "content_snippet": "", "full_text": ""}]
+
+    scraper.scan_portal = fake_scan
+
+    start = time.perf_counter()
+    results = scraper.search_all()
+    elapsed = time.perf_counter() - start
+
+    assert [r['portal'] for r in results] == [f"portal{i}" for i in range(6)], "Orden de resultados alterado"
+    assert len(scraper.portal_stats) == 6, "Faltan estadísticas por portal"
+    assert all(s['seconds'] >= 0.2 for s in scraper.portal_stats), "Tiempos por portal incorrectos"
+    assert elapsed < 0.2 * 6 * 0.6, f"El escaneo no fue concurrente ({elapsed:.2f}s)"
+
+    print(f"✅ 6 portales escaneados en {elapsed:.2f}s (serie: ~1.2s)")
+
+
+def test_per_host_politeness():
+    """Test 2: límite de concurrencia por host"""
+    print("\n" + "="*70)
+    print("TEST 2: Cortesía por Host")
+    print("="*70)
+
+    portals = [
+        {"name": f"mismo{i}", "url": f"https://mismo.example/p{i}", "enabled": True}
+        for i in range(3)
+    ]
+    scraper = _make_scraper(portals, parallel=3, per_host=1)
+
+    lock = threading.Lock()
+    state = {"active": 0, "max_active": 0}
+
+    def fake_scan(portal, report=None):
+        with lock:
+            state["active"] += 1
+            state["max_active"] = max(state["max_active"], state["active"])
+        time.sleep(0.05)
+        with lock:
+            state["active"] -= 1
+        return []
+
+    scraper.scan_portal = fake_scan
+    scraper.search_all()
+
+    assert state["max_active"] == 1, "Se superó la concurrencia por host"
+
+    print(f"✅ Concurrencia máxima por host: {state['max_active']}")
+
+
+def test_portal_error_isolated():
+    """Test 3: un portal con error no detiene al resto"""
+    print("\n" + "="*70)
+    print("TEST 3: Aislamiento de Errores por Portal")
+    print("="*70)
+
+    portals = [
+        {"name": "roto", "url": "https://roto.example", "enabled": True},
+        {"name": "sano", "url": "https://sano.example", "enabled": True},
+    ]
+    scraper = _make_scraper(portals, parallel=2)
+
+    def fake_scan(portal, report=None):
+        if portal['name'] == "roto":
+            raise RuntimeError("falla simulada")
+        return [{"portal": portal['name'], "url": portal['url']}]
+
+    scraper.scan_portal = fake_scan
+    results = scraper.search_all()
+
+    stats = {s['portal']: s for s in scraper.portal_stats}
+    assert len(results) == 1 and results[0]['portal'] == "sano"
+    assert stats["roto"]["status"] == "error"
+    assert stats["sano"]["status"] == "ok"
+
+    print("✅ Error aislado y registrado en portal_stats")
+
+
+def test_shared_keep_alive_client():
+    """Test 4: Scraper y PortalSearcher comparten conexiones keep-alive"""
+    print("\n" + "="*70)
+    print("TEST 4: Cliente HTTP Compartido")
+    print("="*70)
+
+    from src.http_client import get_http_client
+    from src.portals.group1 import ContratarSearcher
+
+    server, base_url = _start_local_server()
+    try:
+        _LocalHandler.client_ports.clear()
+        scraper = _make_scraper([])
+        searcher = ContratarSearcher({"name": "local", "url": base_url})
+
+        assert scraper.http is get_http_client() is searcher.http, "Clientes HTTP distintos"
+        if scraper.http.rate_limiter is not None:
+            # Host local robusto: sin la tasa conservadora por defecto
+            scraper.http.rate_limiter.configure(base_url.split("//")[1], rate=100, burst=10)
+
+        for _ in range(3):
+            assert scraper._make_request(base_url).status_code == 200
+            assert searcher.fetch_page(base_url).status_code == 200
+
+        assert len(_LocalHandler.client_ports) == 1, (
+            f"Se abrieron {len(_LocalHandler.client_ports)} conexiones en lugar de 1"
+        )
+        print("✅ 6 requests reutilizaron una única conexión keep-alive")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class _EtagHandler(BaseHTTPRequestHandler):
+    """Handler local que responde 304 si el cliente envía el ETag vigente."""
+    protocol_version = "HTTP/1.1"
+    etag = '"v1"'
+    full_responses = 0
+
+    def do_GET(self):
+        if self.headers.get("If-None-Match") == _EtagHandler.etag:
+            self.send_response(304)
+            self.send_header("ETag", _EtagHandler.etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        _EtagHandler.full_responses += 1
+        data = "<html><body>Licitación pública de agua potable</body></html>".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("ETag", _EtagHandler.etag)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_conditional_get_cache():
+    """Test 5: un 304 evita reprocesar una página sin cambios"""
+    print("\n" + "="*70)
+    print("TEST 5: GET Condicional con Caché de Páginas")
+    print("="*70)
+
+    from src.http_client import HttpClient
+    from src.page_cache import PageCache
+
+    server, base_url = _start_local_server(_EtagHandler)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            scraper = _make_scraper([])
+            scraper.http = HttpClient(page_cache=PageCache(tmp))
+            portal = {"name": "local", "url": base_url + "/licitaciones", "enabled": True}
+
+            # Ejecución cortada antes de escribir resultados: sin commit, los
+            # validadores no se guardan y la próxima descarga es completa
+            assert len(scraper.scan_portal(portal)) == 1
+            scraper.http.discard_validators()
+            assert len(scraper.scan_portal(portal)) == 1
+            assert _EtagHandler.full_responses == 2
+
+            # Con los resultados escritos se guardan: la siguiente recibe un 304
+            scraper.http.commit_validators()
+            report = {}
+            assert scraper.scan_portal(portal, report=report) == []
+            assert report["status"] == "not_modified"
+            assert _EtagHandler.full_responses == 2, "La página se descargó completa otra vez"
+            assert not any(name.endswith(".gz") for name in os.listdir(tmp)), "No se guardan cuerpos"
+
+            # Al invalidar, el próximo GET vuelve a ser completo
+            scraper.http.invalidate(portal["url"])
+            assert len(scraper.scan_portal(portal)) == 1
+            assert _EtagHandler.full_responses == 3
+        print("✅ Segunda ejecución resuelta con 304 sin parseo ni matching")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    """Handler local con páginas grandes, binarias y con/sin triggers."""
+    protocol_version = "HTTP/1.1"
+    filler = "<p>" + "contenido institucional sin interés " * 40 + "</p>\n"
+
+    def do_GET(self):
+        content_type = "text/html; charset=utf-8"
+        if self.path == "/grande-sin-trigger":
+            body = ("<html><body>" + self.filler * 500 + "</body></html>").encode("utf-8")
+        elif self.path == "/grande-con-trigger":
+            body = ("<html><body><p>Licitaci&oacute;n\n  <b>P&uacute;blica</b> N° 7</p>"
+                    + self.filler * 500 + "</body></html>").encode("utf-8")
+        elif self.path == "/menor-que":
+            # '<' suelto antes del trigger (no abre un tag)
+            body = ("<html><body><p>Montos < $1.000.000: Licitación Pública N° 9</p>"
+                    + self.filler * 500 + "</body></html>").encode("utf-8")
+        elif self.path == "/pliego.pdf":
+            content_type = "application/pdf"
+            body = b"%PDF-1.4 licitacion publica" + b"\x00" * 50000
+        else:
+            body = "<html><body>Licitación pública</body></html>".encode("latin-1")
+            content_type = "text/html; charset=iso-8859-1"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente cortó la descarga al alcanzar el límite de bytes
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_streaming_fetch():
+    """Test 6: streaming con límite de bytes, filtro de tipo y prefiltro"""
+    print("\n" + "="*70)
+    print("TEST 6: Descarga en Streaming")
+    print("="*70)
+
+    from src.http_client import HttpClient
+    from src.html_extractor import HtmlTextStream
+
+    server, base_url = _start_local_server(_StreamHandler)
+    try:
+        scraper = _make_scraper([])
+        scraper.streaming = True
+        scraper.http = HttpClient(max_bytes=64 * 1024)
+        parsed = []
+        extract = scraper.extract
+        scraper.extract = lambda resp: parsed.append(resp.url) or extract(resp)
+
+        def scan(path):
+            report = {}
+            ops = scraper.scan_portal({"name": path, "url": base_url + path}, report=report)
+            return ops, report
+
+        # Página grande sin triggers: se corta en el límite y no se parsea
+        ops, report = scan("/grande-sin-trigger")
+        assert ops == [] and report["status"] == "ok" and parsed == []
+
+        # Trigger al inicio (con tags y entidades): se parsea lo descargado
+        ops, report = scan("/grande-con-trigger")
+        assert len(ops) == 1 and "licitación pública" in ops[0]["matched_keywords"]
+        assert len(parsed) == 1
+
+        # Un '<' que no abre un tag es texto: el trigger que lo sigue cuenta
+        ops, report = scan("/menor-que")
+        assert len(ops) == 1 and len(parsed) == 2, "Trigger perdido tras un '<' suelto"
+        stream = HtmlTextStream()
+        text = stream.feed("a <b>x</b> 3 <") + stream.feed(" 4 y <") + stream.feed("i>z</i>") + stream.close()
+        assert text == "a x 3 < 4 y z", text
+
+        # Contenido binario: ni se descarga ni se parsea
+        ops, report = scan("/pliego.pdf")
+        assert ops == [] and report["status"] == "skipped" and len(parsed) == 2
+
+        # Charset declarado distinto de UTF-8
+        ops, report = scan("/latin1")
+        assert len(ops) == 1 and len(parsed) == 3
+
+        resp = scraper.http.get_streamed(base_url + "/grande-sin-trigger")
+        assert resp.stream_info["truncated"] and len(resp.content) == 64 * 1024
+        print("✅ Límite de bytes, filtro de Content-Type y prefiltro de triggers")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class _ThrottleHandler(BaseHTTPRequestHandler):
+    """Handler local que responde 429 con Retry-After al primer request."""
+    protocol_version = "HTTP/1.1"
+    requests_seen = []
+
+    def do_GET(self):
+        _ThrottleHandler.requests_seen.append(time.monotonic())
+        if len(_ThrottleHandler.requests_seen) == 1:
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = b"<html><body>ok</body></html>"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_adaptive_rate_limit():
+    """Test 7: tasa por host, 429 con Retry-After y recuperación"""
+    print("\n" + "="*70)
+    print("TEST 7: Rate Limiting Adaptativo por Host")
+    print("="*70)
+
+    from src.http_client import HttpClient
+    from src.rate_limiter import HostRateLimiter, host_of, parse_retry_after
+
+    assert parse_retry_after("30") == 30
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("mañana") is None
+
+    server, base_url = _start_local_server(_ThrottleHandler)
+    try:
+        limiter = HostRateLimiter(default_rate=20, default_burst=1, recovery_step=5)
+        limiter.configure_portals([{"url": base_url + "/lenta", "requests_per_second": 10}])
+        http = HttpClient(rate_limiter=limiter)
+        host = host_of(base_url)
+
+        # 429 con Retry-After: la tasa baja a la mitad y el host queda en pausa
+        assert http.get(base_url).status_code == 429
+        state = limiter.snapshot()[host]
+        assert state == {"rate": 5.0, "ceiling": 10.0, "throttled": 1}, state
+
+        assert http.get(base_url).status_code == 200
+        paused = _ThrottleHandler.requests_seen[1] - _ThrottleHandler.requests_seen[0]
+        assert paused >= 0.95, f"No se respetó Retry-After ({paused:.2f}s)"
+
+        # Respuestas sanas: la tasa sube hasta el techo del portal, no más
+        for _ in range(3):
+            http.get(base_url)
+        assert limiter.snapshot()[host]["rate"] == 10.0
+
+        seen = _ThrottleHandler.requests_seen[-3:]
+        gaps = [b - a for a, b in zip(seen, seen[1:])]
+        assert all(g >= 0.09 for g in gaps), f"No se respetó la tasa del host: {gaps}"
+        print(f"✅ Pausa por Retry-After: {paused:.2f}s, tasa recuperada a 10 req/s")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_circuit_breaker():
+    """Test 8: portal caído se omite y se prueba con un solo request"""
+    print("\n" + "="*70)
+    print("TEST 8: Circuit Breaker por Portal")
+    print("="*70)
+
+    import json
+    import socket
+    from src.circuit_breaker import CircuitBreaker
+
+    # Puerto local sin servidor: conexión rechazada al instante
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    dead_url = f"http://127.0.0.1:{sock.getsockname()[1]}/"
+    sock.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state_file = os.path.join(tmp, "portal_health.json")
+
+        # Ejecuciones anteriores: 2 fallas seguidas abren el circuito
+        previous = CircuitBreaker(state_file, failure_threshold=2, cooldown_seconds=60)
+        for _ in range(2):
+            assert previous.allow("caido") == "closed"
+            previous.record_failure("caido", "ConnectionError")
+        assert previous.allow("caido") == "open"
+        previous.save()
+
+        portal = {"name": "caido", "url": dead_url, "enabled": True}
+        scraper = _make_scraper([portal])
+        scraper.breaker = CircuitBreaker(state_file, failure_threshold=2, cooldown_seconds=60)
+        calls = []
+        real_get = scraper.http.get
+        scraper.http.get = lambda url, **kw: calls.append(url) or real_get(url, **kw)
+
+        # Circuito abierto (estado leído de disco): ni un request
+        scraper.search_all()
+        assert scraper.portal_stats[0]["status"] == "circuit_open" and calls == []
+
+        # Enfriamiento vencido: un único request de prueba, que falla
+        scraper.breaker.portals["caido"]["open_until"] = time.time() - 1
+        scraper.search_all()
+        assert scraper.portal_stats[0]["status"] == "error"
+        assert len(calls) == 1, f"La prueba hizo {len(calls)} requests"
+        assert scraper.breaker.portals["caido"]["cooldown"] == 120, "El enfriamiento no se duplicó"
+
+        # Portal recuperado: la prueba exitosa cierra el circuito
+        server, base_url = _start_local_server()
+        try:
+            portal["url"] = base_url
+            scraper.breaker.portals["caido"]["open_until"] = time.time() - 1
+            scraper.search_all()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        with open(state_file, encoding="utf-8") as f:
+            saved = json.load(f)["portals"]["caido"]
+        assert saved["state"] == "closed" and saved["failures"] == 0, saved
+
+    print("✅ Circuito abierto omitido, prueba única y cierre al recuperarse")
+
+
+def main():
+    """Ejecutar todos los tests"""
+    print("\n" + "="*70)
+    print("MIA V4.0 - TESTING DEL MOTOR DE SCRAPING")
+    print("="*70)
+    print(f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    tests = {
+        "Test 1 - Escaneo Concurrente": test_concurrent_search_all,
+        "Test 2 - Cortesía por Host": test_per_host_politeness,
+        "Test 3 - Aislamiento de Errores": test_portal_error_isolated,
+        "Test 4 - Cliente HTTP Compartido": test_shared_keep_alive_client,
+        "Test 5 - GET Condicional": test_conditional_get_cache,
+        "Test 6 - Descarga en Streaming": test_streaming_fetch,
+        "Test 7 - Rate Limiting Adaptativo": test_adaptive_rate_limit,
+        "Test 8 - Circuit Breaker": test_circuit_breaker,
+    }
+
+    results = {}
+    for name, test in tests.items():
+        try:
+            test()
+            results[name] = True
+        except Exception as e:
+            print(f"❌ {name}: {e}")
+            results[name] = False
+
+    print("\n" + "="*70)
+    print("RESUMEN DE TESTS")
+    print("="*70)
+    for name, ok in results.items():
+        print(f"{'✅ PASS' if ok else '❌ FAIL'} - {name}")
+
+    passed = sum(results.values())
+    print(f"\nRESULTADO FINAL: {passed}/{len(results)} tests pasados")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())